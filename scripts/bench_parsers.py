@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Compare full-page BeautifulSoup parsing with the targeted src.parser layer
+on saved scraper pages (APKMirror, Uptodown, APKPure HTML).
+
+Usage: python scripts/bench_parsers.py <pages-dir> [repeat]
+"""
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src import parser  # noqa: E402
+
+# Every element lookup the scrapers perform
+QUERIES = [
+    (['title', 'h1', 'h2', 'h3'], {}),
+    ('div', {'class_': 'table-row headerFont'}),
+    ('a', {'class_': 'downloadButton'}),
+    ('a', {'id': 'download-link'}),
+    ('div', {'class_': 'appRow'}),
+    (None, {'id': 'versions-items-list'}),
+    ('h1', {'id': 'detail-app-name'}),
+    ('button', {'id': 'detail-download-button'}),
+    ('div', {'class_': 'ver-top-down'}),
+    ('a', {'id': 'download_link'}),
+]
+
+def current_path(content: bytes, query):
+    # What every scraper step did before: full tree, then search it
+    name, attrs = query
+    soup = BeautifulSoup(content, "html.parser")
+    if name == "text":
+        return soup.get_text()
+    return soup.find_all(name, **attrs)
+
+def targeted_path(content: bytes, query):
+    name, attrs = query
+    if name == "text":
+        return parser.page_text(content)
+    return parser.parse(content, name, **attrs).find_all(name, **attrs)
+
+def measure(function, content: bytes, repeat: int) -> tuple[float, int]:
+    """Mean time of one scraper step (best of repeat) and peak memory"""
+    total = 0.0
+    peak = 0
+    for query in QUERIES + [("text", {})]:
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function(content, query)
+            best = min(best, time.perf_counter() - started)
+        total += best
+
+        tracemalloc.start()
+        function(content, query)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return total / (len(QUERIES) + 1), peak
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python scripts/bench_parsers.py <pages-dir> [repeat]")
+        sys.exit(1)
+
+    pages = sorted(Path(sys.argv[1]).rglob("*.htm*"))
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    if not pages:
+        print(f"No saved .html pages found in {sys.argv[1]}")
+        sys.exit(1)
+
+    print(f"Backend: {parser.features}")
+    print(f"{'page':40} {'size':>9} {'full ms':>9} {'fast ms':>9} {'full MiB':>9} {'fast MiB':>9}")
+    totals = [0.0, 0.0, 0, 0]
+    for page in pages:
+        content = page.read_bytes()
+        full_time, full_peak = measure(current_path, content, repeat)
+        fast_time, fast_peak = measure(targeted_path, content, repeat)
+        totals = [totals[0] + full_time, totals[1] + fast_time, max(totals[2], full_peak), max(totals[3], fast_peak)]
+        print(
+            f"{page.name[:40]:40} {len(content):>9} {full_time * 1000:>9.1f} {fast_time * 1000:>9.1f} "
+            f"{full_peak / 1048576:>9.2f} {fast_peak / 1048576:>9.2f}"
+        )
+
+    print(
+        f"{'total':40} {'':>9} {totals[0] * 1000:>9.1f} {totals[1] * 1000:>9.1f} "
+        f"{totals[2] / 1048576:>9.2f} {totals[3] / 1048576:>9.2f}"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark the scrapers offline against recorded HTTP fixtures.
+
+Resolves the version and download link of every app in apps/<platform>/
+and reports request count, wall time and HTML parse time per scraper.
+Run once with --record against the live mirrors to capture fixtures, then
+replay them as often as needed. Each run starts with an empty cache dir so
+persisted scraper state does not hide requests.
+
+Usage: python scripts/bench_scrapers.py [--record] [fixtures-dir] [platform ...]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PLATFORMS = ["apkmirror", "apkpure", "uptodown", "aptoide"]
+
+class RequestCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def on_request(self, method, url, kwargs):
+        with self._lock:
+            self.count += 1
+        return None
+
+    def on_response(self, method, url, kwargs, response):
+        pass
+
+def main():
+    args = sys.argv[1:]
+    record = "--record" in args
+    args = [arg for arg in args if arg != "--record"]
+    fixtures_dir = Path(args[0]) if args and args[0] not in PLATFORMS else ROOT / "fixtures"
+    platforms = [arg for arg in args if arg in PLATFORMS] or PLATFORMS
+
+    os.environ["HTTP_FIXTURES"] = "record" if record else "replay"
+    os.environ["HTTP_FIXTURES_DIR"] = str(fixtures_dir)
+    os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-scrapers-")
+    if not record:
+        # Replayed responses never change, so neither retries nor pacing help
+        os.environ.setdefault("HTTP_RETRIES", "0")
+        os.environ.setdefault("HTTP_THROTTLE", "false")
+
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+    from src import session, parser, apkmirror, apkpure, uptodown, aptoide  # noqa: E402
+    modules = {"apkmirror": apkmirror, "apkpure": apkpure, "uptodown": uptodown, "aptoide": aptoide}
+
+    counter = RequestCounter()
+    session.hooks.insert(0, counter)
+
+    print(f"{'scraper':12} {'apps':>5} {'found':>6} {'requests':>9} {'wall s':>8} {'parse s':>8}")
+    totals = [0, 0, 0, 0.0, 0.0]
+    for platform in platforms:
+        module = modules[platform]
+        configs = sorted((ROOT / "apps" / platform).glob("*.json"))
+        requests_before = counter.count
+        parse_before = parser.parse_seconds
+        started = time.perf_counter()
+
+        found = 0
+        for config_path in configs:
+            app_name = config_path.stem
+            config = json.loads(config_path.read_text())
+            try:
+                version = config.get("version") or module.get_latest_version(app_name, config)
+                if module.get_download_link(version, app_name, config):
+                    found += 1
+            except Exception as e:
+                print(f"  {platform}/{app_name}: {str(e)[:80]}", file=sys.stderr)
+
+        row = [
+            len(configs),
+            found,
+            counter.count - requests_before,
+            time.perf_counter() - started,
+            parser.parse_seconds - parse_before
+        ]
+        totals = [total + value for total, value in zip(totals, row)]
+        print(f"{platform:12} {row[0]:>5} {row[1]:>6} {row[2]:>9} {row[3]:>8.2f} {row[4]:>8.2f}")
+
+    print(f"{'total':12} {totals[0]:>5} {totals[1]:>6} {totals[2]:>9} {totals[3]:>8.2f} {totals[4]:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Compare ABI stripping with the zip CLI (copy, zip --delete, zip -FF)
+against the single-pass src.apkzip rewriter on a real APK.
+
+Reports wall time and bytes written for each path, and checks that both
+outputs pass a CRC test. Work files live in a temp dir.
+
+Usage: python scripts/bench_zip.py <apk> [abi ...]
+"""
+import sys
+import time
+import shutil
+import zipfile
+import tempfile
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from src import apkzip  # noqa: E402
+
+DEFAULT_ABIS = ["x86", "x86_64", "armeabi-v7a"]
+
+def zip_cli(src: Path, work: Path, abis: list[str]) -> tuple[Path, int]:
+    copy = work / "cli-copy.apk"
+    fixed = work / "cli-fixed.apk"
+    shutil.copyfile(src, copy)
+    written = src.stat().st_size
+    subprocess.run(["zip", "--delete", str(copy), *[f"lib/{abi}/*" for abi in abis]],
+                   check=False, capture_output=True)
+    # zip --delete rewrites the archive through a temp file
+    written += copy.stat().st_size
+    subprocess.run(["zip", "-FF", str(copy), "--out", str(fixed)], check=False, capture_output=True)
+    written += fixed.stat().st_size
+    return fixed, written
+
+def native(src: Path, work: Path, abis: list[str]) -> tuple[Path, int]:
+    dest = work / "apkzip.apk"
+    result = apkzip.rewrite(src, dest, apkzip.abi_filter(abis))
+    return dest, result["size"]
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    src = Path(sys.argv[1])
+    abis = sys.argv[2:] or DEFAULT_ABIS
+
+    print(f"{'method':10} {'seconds':>8} {'written MiB':>12} {'output MiB':>11} {'entries':>8}")
+    with tempfile.TemporaryDirectory(prefix="bench-zip-") as work:
+        for name, method in (("zip cli", zip_cli), ("apkzip", native)):
+            started = time.perf_counter()
+            output, written = method(src, Path(work), abis)
+            elapsed = time.perf_counter() - started
+            with zipfile.ZipFile(output) as archive:
+                entries = len(archive.infolist())
+                if archive.testzip() is not None:
+                    print(f"  {name}: output failed CRC check", file=sys.stderr)
+            print(f"{name:10} {elapsed:>8.2f} {written / 1048576:>12.1f} "
+                  f"{output.stat().st_size / 1048576:>11.1f} {entries:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,9 @@
 import os
 import logging
-from curl_cffi import requests
+from pathlib import Path
 from curl_cffi.requests.impersonate import DEFAULT_CHROME
 from github import Github
-
-session = requests.Session(impersonate=DEFAULT_CHROME)
+from src import client, network
 
 # Logging
 logging.basicConfig(
@@ -21,6 +20,20 @@ access_key_id = os.getenv('AWS_ACCESS_KEY_ID')
 secret_access_key = os.getenv('AWS_SECRET_ACCESS_KEY')
 bucket_name = os.getenv('BUCKET_NAME')
 
+# Persistent state shared between runs (artifact store, scraper memory)
+cache_dir = Path(os.getenv('CACHE_DIR', '.cache'))
+
+# Shared HTTP client: per-host pools, timeouts, retries and throttling (see src/client.py)
+session = client.from_env(DEFAULT_CHROME, cache_dir)
+
+# Per-request timings for the run's network report
+session.hooks.append(network.recorder)
+
+# Record or replay every scraper/API response (see scripts/bench_scrapers.py)
+if os.getenv('HTTP_FIXTURES'):
+    from src.fixtures import HttpFixtures
+    session.hooks.append(HttpFixtures(Path(os.getenv('HTTP_FIXTURES_DIR', 'fixtures')), os.getenv('HTTP_FIXTURES')))
+
 # APKmirror base url
 base_url = "https://www.apkmirror.com"
 gh = Github(github_token) if github_token else Github()
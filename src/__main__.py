@@ -1,18 +1,28 @@
 import json
 import logging
-from sys import exit
+from sys import exit, argv
 from pathlib import Path
 from os import getenv
+import time
+import shutil
+import zipfile
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from src import (
     r2,
     utils,
+    stats,
+    network,
+    apkzip,
     release,
-    downloader
+    scheduler,
+    downloader,
+    sources_lock
 )
+from src.cache import artifacts
 
-def run_build(app_name: str, source: str, arch: str = "universal") -> str:
-    """Build APK for specific architecture"""
+def prepare_build(app_name: str, source: str, arches: list[str] = ("universal",)) -> dict | None:
+    """Acquisition shared by every arch in arches: tools, input APK, merge and repair"""
     download_files, name = downloader.download_required(source)
 
     # Log downloaded files for debugging
@@ -84,36 +94,43 @@ def run_build(app_name: str, source: str, arch: str = "universal") -> str:
     logging.info(f"✅ Using CLI: {cli.name}")
     logging.info(f"✅ Using patches: {patches.name}")
 
-    download_methods = [
-        downloader.download_apkmirror,
-        downloader.download_apkpure,
-        downloader.download_uptodown,
-        downloader.download_aptoide
-    ]
+    # Most reliable platforms for this app first
+    platforms = stats.mirrors.order(app_name, downloader.platforms)
+
+    # ABIs none of the arches ships can be dropped while the APK downloads
+    drop_abis = common_stripped_abis(arches) if stream_strip else None
 
     input_apk = None
     version = None
-    for method in download_methods:
-        input_apk, version = method(app_name, str(cli), str(patches))
-        if input_apk:
-            break
+    if downloader.hedged_acquisition:
+        input_apk, version = downloader.download_hedged(app_name, platforms, str(cli), str(patches), drop_abis=drop_abis)
+    else:
+        for platform in platforms:
+            input_apk, version = downloader.download_platform(
+                app_name, platform, str(cli), str(patches), drop_abis=drop_abis
+            )
+            if input_apk:
+                break
             
     if input_apk is None:
         logging.error(f"❌ Failed to download APK for {app_name}")
         logging.error("All download sources failed. Skipping this app.")
         return None
 
+    # Checked against Content-Length/digest while streaming
+    input_verified = downloader.is_verified(input_apk)
+
     if input_apk.suffix != ".apk":
         logging.warning("Input file is not .apk, using APKEditor to merge")
         apk_editor = downloader.download_apkeditor()
 
         merged_apk = input_apk.with_suffix(".apk")
 
-        utils.run_process([
+        scheduler.jobs.run([
             "java", "-jar", apk_editor, "m",
             "-i", str(input_apk),
             "-o", str(merged_apk)
-        ], silent=True)
+        ], input_apk=input_apk, silent=True)
 
         input_apk.unlink(missing_ok=True)
 
@@ -124,29 +141,12 @@ def run_build(app_name: str, source: str, arch: str = "universal") -> str:
         input_apk = merged_apk
         logging.info(f"Merged APK file generated: {input_apk}")
 
-    # ARCHITECTURE-SPECIFIC PROCESSING
-    if arch != "universal":
-        logging.info(f"Processing APK for {arch} architecture...")
-        
-        # Remove unwanted architectures based on selected arch
-        if arch == "arm64-v8a":
-            # Remove x86, x86_64, and armeabi-v7a
-            utils.run_process([
-                "zip", "--delete", str(input_apk), 
-                "lib/x86/*", "lib/x86_64/*", "lib/armeabi-v7a/*"
-            ], silent=True, check=False)
-        elif arch == "armeabi-v7a":
-            # Remove x86, x86_64, and arm64-v8a
-            utils.run_process([
-                "zip", "--delete", str(input_apk),
-                "lib/x86/*", "lib/x86_64/*", "lib/arm64-v8a/*"
-            ], silent=True, check=False)
+    # FIX: Repair corrupted APK from Uptodown (only when the download could not be verified)
+    if input_verified:
+        logging.info("APK download verified, skipping repair")
     else:
-        # Universal: only remove x86 architectures
-        utils.run_process([
-            "zip", "--delete", str(input_apk), 
-            "lib/x86/*", "lib/x86_64/*"
-        ], silent=True, check=False)
+        logging.info("Checking APK for corruption...")
+        repair_apk(input_apk, app_name, version)
 
     exclude_patches = []
     include_patches = []
@@ -161,26 +161,181 @@ def run_build(app_name: str, source: str, arch: str = "universal") -> str:
                 elif line.startswith('+'):
                     include_patches.extend(["-e", line[1:].strip()])
 
-    # FIX: Repair corrupted APK from Uptodown
-    logging.info("Checking APK for corruption...")
+    return {
+        "name": name,
+        "version": version,
+        "cli": cli,
+        "patches": patches,
+        "is_morphe": is_morphe,
+        "input_apk": input_apk,
+        "patch_args": [*exclude_patches, *include_patches]
+    }
+
+# ABIs each arch build drops; universal only loses x86
+STRIPPED_ABIS = {
+    "arm64-v8a": ["x86", "x86_64", "armeabi-v7a"],
+    "armeabi-v7a": ["x86", "x86_64", "arm64-v8a"],
+    "universal": ["x86", "x86_64"]
+}
+
+# Patch the universal input once and derive every arch from the result
+patch_once = getenv("PATCH_ONCE", "false").lower() == "true"
+# Also checksum every entry of unverified APKs; a rewrite cannot fix bad data, but it gets logged
+check_crc = getenv("APK_CHECK_CRC", "false").lower() == "true"
+# Strip ABIs while the input APK streams in instead of rewriting it afterwards
+stream_strip = getenv("STREAM_STRIP", "false").lower() == "true"
+
+def run_build(app_name: str, source: str, arch: str = "universal", build: dict | None = None) -> str:
+    """Build APK for specific architecture from a private copy of the shared input"""
+    if build is None:
+        # Standalone build: the shared input is ours to clean up
+        build = prepare_build(app_name, source, [arch])
+        if not build:
+            return None
+        try:
+            return run_build(app_name, source, arch, build)
+        finally:
+            build["input_apk"].unlink(missing_ok=True)
+
+    version = build["version"]
+    input_apk = build["input_apk"].with_name(f"{app_name}-{arch}-input-v{version}.apk")
+
+    # ARCHITECTURE-SPECIFIC PROCESSING
+    if arch != "universal":
+        logging.info(f"Processing APK for {arch} architecture...")
+    derive_apk(build["input_apk"], input_apk, arch)
+
+    # Include architecture in output filename
+    output_apk = Path(f"{app_name}-{arch}-patch-v{version}.apk")
+    patch_apk(build, input_apk, output_apk)
+    input_apk.unlink(missing_ok=True)
+
+    # Include architecture in final signed APK name
+    signed_apk = Path(f"{app_name}-{arch}-{build['name']}-v{version}.apk")
+    sign_apk(output_apk, signed_apk)
+
+    output_apk.unlink(missing_ok=True)
+    print(f"✅ APK built: {signed_apk.name}")
+    
+    return str(signed_apk)
+
+def run_fan_out_build(app_name: str, arches: list[str], build: dict) -> list[str] | None:
+    """Patch once and strip/sign every arch from the patched APK.
+
+    Returns None when patches changed native libraries, so the caller
+    falls back to patching each arch separately.
+    """
+    version = build["version"]
+    input_apk = build["input_apk"].with_name(f"{app_name}-universal-input-v{version}.apk")
+    derive_apk(build["input_apk"], input_apk, "universal")
+
+    output_apk = Path(f"{app_name}-universal-patch-v{version}.apk")
+    logging.info(f"🔨 Patching {app_name} once for {', '.join(arches)}...")
+    patch_apk(build, input_apk, output_apk)
+
+    libs_unchanged = native_libs(input_apk) == native_libs(output_apk)
+    input_apk.unlink(missing_ok=True)
+    if not libs_unchanged:
+        logging.warning("Patches changed native libraries, patching each architecture separately")
+        output_apk.unlink(missing_ok=True)
+        return None
+
+    def derive(arch):
+        logging.info(f"✂️ Deriving {arch} from patched APK...")
+        aligned_apk = Path(f"{app_name}-{arch}-patch-v{version}.apk")
+        if not derive_apk(output_apk, aligned_apk, arch):
+            # zip --delete shifted the entries after the deleted ones
+            zipalign = utils.find_build_tool("zipalign")
+            if zipalign:
+                stripped_apk = aligned_apk.with_name(f"{app_name}-{arch}-stripped-v{version}.apk")
+                aligned_apk.rename(stripped_apk)
+                utils.run_process([zipalign, "-p", "-f", "4", str(stripped_apk), str(aligned_apk)], silent=True)
+                stripped_apk.unlink(missing_ok=True)
+
+        signed_apk = Path(f"{app_name}-{arch}-{build['name']}-v{version}.apk")
+        sign_apk(aligned_apk, signed_apk)
+        aligned_apk.unlink(missing_ok=True)
+        print(f"✅ APK built: {signed_apk.name}")
+        return str(signed_apk)
+
+    with ThreadPoolExecutor(max_workers=len(arches)) as executor:
+        built_apks = list(executor.map(derive, arches))
+
+    output_apk.unlink(missing_ok=True)
+    return built_apks
+
+def native_libs(apk: Path) -> dict:
+    """lib/ entries of apk with their CRC and size"""
+    with zipfile.ZipFile(apk) as archive:
+        return {
+            info.filename: (info.CRC, info.file_size)
+            for info in archive.infolist()
+            if info.filename.startswith("lib/")
+        }
+
+def common_stripped_abis(arches: list[str]) -> list[str] | None:
+    """ABIs every arch in arches strips, or None if there are none"""
+    if not arches:
+        return None
+    stripped = set.intersection(*(set(STRIPPED_ABIS.get(arch, [])) for arch in arches))
+    return sorted(stripped) if stripped else None
+
+def derive_apk(src: Path, dest: Path, arch: str) -> bool:
+    """Write src to dest without the ABIs arch does not ship.
+
+    One pass through apkzip, which also keeps entries aligned; returns
+    False if it had to fall back to copy + zip --delete (unaligned).
+    """
+    drop = apkzip.abi_filter(STRIPPED_ABIS.get(arch, []))
+    try:
+        result = apkzip.rewrite(src, dest, drop)
+        logging.info(f"Wrote {dest.name}: {result['entries']} entries, {result['dropped']} dropped")
+        return True
+    except apkzip.ZipRewriteError as e:
+        logging.warning(f"Could not rewrite {src.name} ({e}), using zip --delete")
+
+    shutil.copyfile(src, dest)
+    patterns = [f"lib/{abi}/*" for abi in STRIPPED_ABIS.get(arch, [])]
+    if patterns:
+        utils.run_process(["zip", "--delete", str(dest), *patterns], silent=True, check=False)
+    return False
+
+def repair_apk(apk: Path, app_name: str, version: str) -> None:
+    """Rebuild apk's central directory if it fails apkzip.check, recovering entries from local headers"""
+    started = time.perf_counter()
+    problem = apkzip.check(apk, crc=check_crc)
+    if problem is None:
+        logging.info(f"APK is intact ({time.perf_counter() - started:.2f}s), skipping repair")
+        return
+    logging.warning(f"APK is damaged ({problem}), repairing...")
+
+    try:
+        result = apkzip.rewrite_in_place(apk)
+        if result["recovered"]:
+            logging.info(f"APK fixed successfully ({result['entries']} entries recovered)")
+        return
+    except apkzip.ZipRewriteError as e:
+        logging.warning(f"Could not rewrite APK ({e}), trying zip -FF")
+
     try:
         fixed_apk = Path(f"{app_name}-fixed-v{version}.apk")
         subprocess.run([
-            "zip", "-FF", str(input_apk), "--out", str(fixed_apk)
+            "zip", "-FF", str(apk), "--out", str(fixed_apk)
         ], check=False, capture_output=True)
-        
+
         if fixed_apk.exists() and fixed_apk.stat().st_size > 0:
-            input_apk.unlink(missing_ok=True)
-            fixed_apk.rename(input_apk)
+            apk.unlink(missing_ok=True)
+            fixed_apk.rename(apk)
             logging.info("APK fixed successfully")
     except Exception as e:
         logging.warning(f"Could not fix APK: {e}")
 
-    # Include architecture in output filename
-    output_apk = Path(f"{app_name}-{arch}-patch-v{version}.apk")
+def patch_apk(build: dict, input_apk: Path, output_apk: Path) -> None:
+    cli = build["cli"]
+    patches = build["patches"]
 
     # USE DIFFERENT COMMANDS BASED ON SOURCE TYPE
-    if is_morphe:
+    if build["is_morphe"]:
         logging.info("🔧 Using Morphe patching system...")
         # Morphe CLI might have different arguments - we need to test this
         # Try common patterns
@@ -190,9 +345,9 @@ def run_build(app_name: str, source: str, arch: str = "universal") -> str:
                 "java", "-jar", str(cli),
                 "patch", "--patches", str(patches),
                 "--out", str(output_apk), str(input_apk),
-                *exclude_patches, *include_patches
+                *build["patch_args"]
             ]
-            utils.run_process(morphe_cmd, stream=True)
+            scheduler.jobs.run(morphe_cmd, input_apk=input_apk, stream=True)
         except subprocess.CalledProcessError:
             # Try alternative Morphe arguments
             logging.info("Trying alternative Morphe command format...")
@@ -202,28 +357,24 @@ def run_build(app_name: str, source: str, arch: str = "universal") -> str:
                 "--input", str(input_apk),
                 "--output", str(output_apk)
             ]
-            utils.run_process(morphe_cmd, stream=True)
+            scheduler.jobs.run(morphe_cmd, input_apk=input_apk, stream=True)
     else:
         logging.info("🔧 Using ReVanced patching system...")
         # Standard ReVanced command
-        utils.run_process([
+        scheduler.jobs.run([
             "java", "-jar", str(cli),
             "patch", "--patches", str(patches),
             "--out", str(output_apk), str(input_apk),
-            *exclude_patches, *include_patches
-        ], stream=True)
-
-    input_apk.unlink(missing_ok=True)
-
-    # Include architecture in final signed APK name
-    signed_apk = Path(f"{app_name}-{arch}-{name}-v{version}.apk")
+            *build["patch_args"]
+        ], input_apk=input_apk, stream=True)
 
+def sign_apk(output_apk: Path, signed_apk: Path) -> None:
     apksigner = utils.find_apksigner()
     if not apksigner:
         exit(1)
 
     try:
-        utils.run_process([
+        scheduler.jobs.run([
             str(apksigner), "sign", "--verbose",
             "--ks", "keystore/public.jks",
             "--ks-pass", "pass:public",
@@ -235,7 +386,7 @@ def run_build(app_name: str, source: str, arch: str = "universal") -> str:
         logging.warning(f"Standard signing failed: {e}")
         logging.info("Trying alternative signing method...")
         
-        utils.run_process([
+        scheduler.jobs.run([
             str(apksigner), "sign", "--verbose",
             "--min-sdk-version", "21",
             "--ks", "keystore/public.jks",
@@ -245,12 +396,12 @@ def run_build(app_name: str, source: str, arch: str = "universal") -> str:
             "--in", str(output_apk), "--out", str(signed_apk)
         ], stream=True)
 
-    output_apk.unlink(missing_ok=True)
-    print(f"✅ APK built: {signed_apk.name}")
-    
-    return str(signed_apk)
-
 def main():
+    # `python -m src lock` resolves every source once for the whole run
+    if len(argv) > 1 and argv[1] == "lock":
+        sources_lock.write_lockfile(Path(argv[2] if len(argv) > 2 else "sources.lock"))
+        return
+
     app_name = getenv("APP_NAME")
     source = getenv("SOURCE")
 
@@ -271,14 +422,25 @@ def main():
                 arches = config["arches"]
                 break
         
-        # Build for each architecture
-        built_apks = []
-        for arch in arches:
-            logging.info(f"🔨 Building {app_name} for {arch} architecture...")
-            apk_path = run_build(app_name, source, arch)
-            if apk_path:
-                built_apks.append(apk_path)
-                print(f"✅ Built {arch} version: {Path(apk_path).name}")
+        # Acquire and merge once, then build each architecture from it
+        built_apks = None
+        build = prepare_build(app_name, source, arches)
+        if build and patch_once and len(arches) > 1 and all(arch in STRIPPED_ABIS for arch in arches):
+            built_apks = run_fan_out_build(app_name, arches, build)
+
+        if built_apks is None:
+            def build_arch(arch):
+                logging.info(f"🔨 Building {app_name} for {arch} architecture...")
+                apk_path = run_build(app_name, source, arch, build)
+                if apk_path:
+                    print(f"✅ Built {arch} version: {Path(apk_path).name}")
+                return apk_path
+
+            # Arches build concurrently; the scheduler admits their JVMs as memory allows
+            with ThreadPoolExecutor(max_workers=len(arches)) as executor:
+                built_apks = [apk for apk in executor.map(build_arch, arches if build else []) if apk]
+        if build:
+            build["input_apk"].unlink(missing_ok=True)
         
         # Summary
         print(f"\n🎯 Built {len(built_apks)} APK(s) for {app_name}:")
@@ -288,9 +450,15 @@ def main():
     else:
         # Fallback to single universal build
         logging.warning("arch-config.json not found, building universal only")
-        apk_path = run_build(app_name, source, "universal")
+        build = prepare_build(app_name, source)
+        apk_path = run_build(app_name, source, "universal", build) if build else None
+        if build:
+            build["input_apk"].unlink(missing_ok=True)
         if apk_path:
             print(f"🎯 Final APK path: {apk_path}")
 
+    artifacts.log_stats()
+    network.recorder.write_report(Path(getenv("NETWORK_REPORT", "network-report.json")))
+
 if __name__ == "__main__":
     main()
@@ -1,176 +1,383 @@
+import os
 import re
 import json
+import time
 import logging
-from bs4 import BeautifulSoup
-from src import session
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src import session, parser, cache_dir
+from src.cache import JsonStore
 
 base_url = "https://www.apkmirror.com"
 
-def get_download_link(version: str, app_name: str, config: dict, arch: str = None) -> str: 
-    target_arch = arch if arch else config.get('arch', 'universal')
-    
-    criteria = [config['type'], target_arch, config['dpi']]
-    
-    # --- UNIVERSAL URL FINDER WITH VALIDATION ---
-    version_parts = version.split('.')
-    found_soup = None
-    correct_version_page = False
-    
+# Cap on simultaneous release-page probes against APKMirror
+probe_workers = int(os.getenv("APKMIRROR_CONCURRENCY", "4"))
+_host_slots = threading.BoundedSemaphore(probe_workers)
+
+# Arch cells of variants that ship every ABI
+UNIVERSAL_ARCHES = {"universal", "noarch"}
+
+class ReleasePageMemory:
+    """Per-app winning release URL shape, a TTL'd set of URLs that 404ed and
+    TTL'd variant tables of release pages (keyed by page URL)"""
+
+    def __init__(self, store: JsonStore, negative_ttl: float, index_ttl: float):
+        self.store = store
+        self.negative_ttl = negative_ttl
+        self.index_ttl = index_ttl
+        self._data = None
+
+    def _read(self) -> dict:
+        if self._data is None:
+            self._data = self.store.read()
+        return self._data
+
+    def learned_shape(self, app_key: str) -> dict | None:
+        return self._read().get("shapes", {}).get(app_key)
+
+    def learn_shape(self, app_key: str, shape: dict) -> None:
+        if self.learned_shape(app_key) == shape:
+            return
+        def update(data):
+            data.setdefault("shapes", {})[app_key] = shape
+            return data
+        self._data = self.store.update(update)
+        logging.info(f"Learned APKMirror URL shape for {app_key}: {shape}")
+
+    def is_dead(self, url: str) -> bool:
+        return self._read().get("dead", {}).get(url, 0) > time.time()
+
+    def mark_dead(self, url: str) -> None:
+        def update(data):
+            now = time.time()
+            dead = {u: expiry for u, expiry in data.get("dead", {}).items() if expiry > now}
+            dead[url] = now + self.negative_ttl
+            data["dead"] = dead
+            return data
+        self._data = self.store.update(update)
+
+    def variants(self, app_key: str, version: str) -> list[dict] | None:
+        """Variant table of app_key's release page for version, if indexed recently"""
+        data = self._read()
+        url = data.get("releases", {}).get(f"{app_key}@{version}")
+        index = data.get("indexes", {}).get(url)
+        if not index or index["expires"] < time.time():
+            return None
+        return index["variants"]
+
+    def remember_variants(self, app_key: str, version: str, url: str, variants: list[dict]) -> None:
+        def update(data):
+            now = time.time()
+            indexes = {u: index for u, index in data.get("indexes", {}).items() if index["expires"] > now}
+            indexes[url] = {"variants": variants, "expires": now + self.index_ttl}
+            data["indexes"] = indexes
+            data["releases"] = {
+                key: u for key, u in data.get("releases", {}).items() if u in indexes
+            } | {f"{app_key}@{version}": url}
+            return data
+        self._data = self.store.update(update)
+
+memory = ReleasePageMemory(
+    JsonStore(cache_dir / "apkmirror-memory.json"),
+    # Short: a 404 often just means the mirror has not uploaded the release yet
+    negative_ttl=float(os.getenv("APKMIRROR_NEGATIVE_TTL_HOURS", "3")) * 3600,
+    # Mirrors add variants to a release for a while after it appears
+    index_ttl=float(os.getenv("APKMIRROR_INDEX_TTL_HOURS", "6")) * 3600
+)
+
+def _candidate_urls(config: dict, version_parts: list[str]) -> list[tuple[str, int, dict]]:
+    """Release page URLs in priority order, with the version parts used and URL shape"""
     # Use release_prefix if available, otherwise use app name
     release_name = config.get('release_prefix', config['name'])
-    
+    candidates = []
+    seen = set()
+
     # Loop backwards: Try full version, then strip parts
     for i in range(len(version_parts), 0, -1):
         current_ver_str = "-".join(version_parts[:i])
         
-        # Generate ALL possible URL patterns in priority order
+        # Generate ALL possible URL patterns in priority order: (url, name used, -release suffix)
         url_patterns = []
         
         # Priority 1: With release_name and -release suffix (most specific)
-        url_patterns.append(f"{base_url}/apk/{config['org']}/{config['name']}/{release_name}-{current_ver_str}-release/")
+        url_patterns.append((f"{base_url}/apk/{config['org']}/{config['name']}/{release_name}-{current_ver_str}-release/", "release_prefix", True))
         
         # Priority 2: With app name and -release suffix
         if release_name != config['name']:
-            url_patterns.append(f"{base_url}/apk/{config['org']}/{config['name']}/{config['name']}-{current_ver_str}-release/")
+            url_patterns.append((f"{base_url}/apk/{config['org']}/{config['name']}/{config['name']}-{current_ver_str}-release/", "name", True))
         
         # Priority 3: With release_name without -release
-        url_patterns.append(f"{base_url}/apk/{config['org']}/{config['name']}/{release_name}-{current_ver_str}/")
+        url_patterns.append((f"{base_url}/apk/{config['org']}/{config['name']}/{release_name}-{current_ver_str}/", "release_prefix", False))
         
         # Priority 4: With app name without -release
         if release_name != config['name']:
-            url_patterns.append(f"{base_url}/apk/{config['org']}/{config['name']}/{config['name']}-{current_ver_str}/")
+            url_patterns.append((f"{base_url}/apk/{config['org']}/{config['name']}/{config['name']}-{current_ver_str}/", "name", False))
         
         # Remove duplicate patterns
-        url_patterns = list(dict.fromkeys(url_patterns))
-        
-        for url in url_patterns:
-            logging.info(f"Checking potential release URL: {url}")
-            
-            try:
-                response = session.get(url)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.content, "html.parser")
-                    page_text = soup.get_text()
-                    
-                    # VALIDATION: Check if this page is for our EXACT version
-                    # Check multiple possible version formats
-                    version_checks = [
-                        version,  # 26.1.2.0
-                        version.replace('.', '-'),  # 26-1-2-0
-                        current_ver_str,  # 26-1-2 (if stripped)
-                        ".".join(version_parts[:i])  # 26.1.2 (if stripped)
-                    ]
-                    
-                    # Also check page title and headings for version
-                    title_tag = soup.find('title')
-                    headings = soup.find_all(['h1', 'h2', 'h3'])
-                    
-                    is_correct_page = False
-                    
-                    # Check in page text
-                    for check in version_checks:
-                        if check and check in page_text:
-                            # Additional check: make sure it's not just in a list of other versions
-                            # Look for the version in a context that suggests it's the main version
-                            if check == version or check == version.replace('.', '-'):
-                                is_correct_page = True
-                                break
-                    
-                    # Check in title and headings
-                    if not is_correct_page:
-                        for heading in headings:
-                            heading_text = heading.get_text()
-                            for check in version_checks:
-                                if check and check in heading_text:
-                                    is_correct_page = True
-                                    break
-                            if is_correct_page:
-                                break
-                    
-                    if not is_correct_page and title_tag:
-                        title_text = title_tag.get_text()
-                        for check in version_checks:
-                            if check and check in title_text:
-                                is_correct_page = True
-                                break
-                    
-                    if is_correct_page:
-                        content_size = len(response.content)
-                        logging.info(f"✓ Correct version page found: {response.url}")
-                        found_soup = soup
-                        correct_version_page = True
-                        break  # Found correct page!
-                    else:
-                        # Page exists but doesn't have our version as primary
-                        logging.warning(f"Page found but not for version {version}: {url}")
-                        # Save as fallback ONLY if we haven't found any page yet
-                        if found_soup is None:
-                            found_soup = soup
-                            logging.warning(f"Saved as fallback page (may list multiple versions)")
-                        continue
-                        
-                elif response.status_code == 404:
-                    continue
-                else:
-                    logging.warning(f"URL {url} returned status {response.status_code}")
-                    continue
-                    
-            except Exception as e:
-                logging.warning(f"Error checking {url}: {str(e)[:50]}")
+        for url, prefix, release in url_patterns:
+            if url not in seen:
+                seen.add(url)
+                candidates.append((url, i, {"prefix": prefix, "release": release, "parts": i}))
+
+    return candidates
+
+def _matches_shape(shape: dict, learned: dict, version_parts: list[str]) -> bool:
+    return (
+        shape["prefix"] == learned["prefix"]
+        and shape["release"] == learned["release"]
+        and shape["parts"] == min(learned["parts"], len(version_parts))
+    )
+
+def _find_release_page(candidates: list, version: str, version_parts: list[str]) -> tuple[bytes | None, bool, dict | None, str | None]:
+    """First exact-version page in priority order, else the first page that exists"""
+    found_page = None
+    found_shape = None
+    found_url = None
+
+    # Probe every candidate concurrently, but consume results in priority order
+    executor = ThreadPoolExecutor(max_workers=probe_workers)
+    try:
+        futures = [
+            executor.submit(_probe_release_page, url, version, version_parts, i)
+            for url, i, _ in candidates
+        ]
+        for (url, _, shape), future in zip(candidates, futures):
+            page, is_correct_page = future.result()
+            if page is None:
                 continue
+
+            if is_correct_page:
+                return page, True, shape, url  # Found correct page!
+
+            # Page exists but doesn't have our version as primary
+            logging.warning(f"Page found but not for version {version}: {url}")
+            # Save as fallback ONLY if we haven't found any page yet
+            if found_page is None:
+                found_page = page
+                found_shape = shape
+                found_url = url
+                logging.warning(f"Saved as fallback page (may list multiple versions)")
+    finally:
+        # First exact hit wins; drop probes that have not started yet
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return found_page, False, found_shape, found_url
+
+def _probe_release_page(url: str, version: str, version_parts: list[str], i: int) -> tuple[bytes | None, bool]:
+    """Fetch a candidate release page and check it is for our EXACT version"""
+    with _host_slots:
+        logging.info(f"Checking potential release URL: {url}")
+        
+        try:
+            response = session.get(url)
+        except Exception as e:
+            logging.warning(f"Error checking {url}: {str(e)[:50]}")
+            return None, False
+
+    if response.status_code == 404:
+        memory.mark_dead(url)
+        return None, False
+    if response.status_code != 200:
+        logging.warning(f"URL {url} returned status {response.status_code}")
+        return None, False
+
+    try:
+        page_text = parser.page_text(response.content)
+        current_ver_str = "-".join(version_parts[:i])
+        
+        # VALIDATION: Check if this page is for our EXACT version
+        # Check multiple possible version formats
+        version_checks = [
+            version,  # 26.1.2.0
+            version.replace('.', '-'),  # 26-1-2-0
+            current_ver_str,  # 26-1-2 (if stripped)
+            ".".join(version_parts[:i])  # 26.1.2 (if stripped)
+        ]
+        
+        # Also check page title and headings for version
+        soup = parser.parse(response.content, ['title', 'h1', 'h2', 'h3'])
+        title_tag = soup.find('title')
+        headings = soup.find_all(['h1', 'h2', 'h3'])
+        
+        is_correct_page = False
         
-        if correct_version_page:
-            break  # Found correct page for this version part
+        # Check in page text
+        for check in version_checks:
+            if check and check in page_text:
+                # Additional check: make sure it's not just in a list of other versions
+                # Look for the version in a context that suggests it's the main version
+                if check == version or check == version.replace('.', '-'):
+                    is_correct_page = True
+                    break
+        
+        # Check in title and headings
+        if not is_correct_page:
+            for heading in headings:
+                heading_text = heading.get_text()
+                for check in version_checks:
+                    if check and check in heading_text:
+                        is_correct_page = True
+                        break
+                if is_correct_page:
+                    break
+        
+        if not is_correct_page and title_tag:
+            title_text = title_tag.get_text()
+            for check in version_checks:
+                if check and check in title_text:
+                    is_correct_page = True
+                    break
+
+        if is_correct_page:
+            logging.info(f"✓ Correct version page found: {response.url}")
+        return response.content, is_correct_page
+
+    except Exception as e:
+        logging.warning(f"Error checking {url}: {str(e)[:50]}")
+        return None, False
+
+def _index_release_page(version: str, app_name: str, config: dict) -> list[dict] | None:
+    """Find the release page for version and parse its variant table"""
+    # --- UNIVERSAL URL FINDER WITH VALIDATION ---
+    version_parts = version.split('.')
+    found_page = None
+    found_url = None
+    correct_version_page = False
+    app_key = f"{config['org']}/{config['name']}"
+
+    # Skip URLs that recently returned 404
+    candidates = [c for c in _candidate_urls(config, version_parts) if not memory.is_dead(c[0])]
+
+    # Try the URL shape that worked for this app last time on its own first
+    learned = memory.learned_shape(app_key)
+    learned_candidate = next((c for c in candidates if learned and _matches_shape(c[2], learned, version_parts)), None)
+    if learned_candidate:
+        candidates.remove(learned_candidate)
+        found_url, i, shape = learned_candidate
+        found_page, correct_version_page = _probe_release_page(found_url, version, version_parts, i)
+        if found_page and not correct_version_page:
+            logging.warning(f"Page found but not for version {version}: {found_url}")
+
+    if not correct_version_page:
+        page, correct_version_page, shape, url = _find_release_page(candidates, version, version_parts)
+        if page:
+            found_page, found_url = page, url
+
+    if correct_version_page:
+        memory.learn_shape(app_key, shape)
     
     # If we didn't find the exact version page but found a fallback
-    if not correct_version_page and found_soup:
+    if not correct_version_page and found_page:
         logging.warning(f"Using fallback page for {app_name} {version} (may contain multiple versions)")
     
-    if not found_soup:
+    if not found_page:
         logging.error(f"Could not find any release page for {app_name} {version}")
         return None
-    
-    # --- VARIANT FINDER (works with both exact pages and fallback pages) ---
-    rows = found_soup.find_all('div', class_='table-row headerFont')
-    download_page_url = None
-    
-    # Try to find exact version match first
+
+    variants = parse_variants(found_page)
+    if correct_version_page:
+        # Fallback pages list other versions; only exact ones are worth reusing
+        memory.remember_variants(app_key, version, found_url, variants)
+    return variants
+
+def parse_variants(page: bytes) -> list[dict]:
+    """Structured rows of a release page's variant table"""
+    rows = parser.parse(page, 'div', class_='table-row headerFont').find_all('div', class_='table-row headerFont')
+    variants = []
     for row in rows:
+        sub_url = row.find('a', class_='accent_color')
+        if not sub_url:
+            continue  # Header row
+
         row_text = row.get_text()
-        
-        # Check if row contains our exact version
-        if version in row_text or version.replace('.', '-') in row_text:
-            # Check criteria
-            if all(criterion in row_text for criterion in criteria):
-                sub_url = row.find('a', class_='accent_color')
-                if sub_url:
-                    download_page_url = base_url + sub_url['href']
-                    break
+        cells = [cell.get_text(" ", strip=True) for cell in row.find_all('div', class_='table-cell', recursive=False)]
+        match = re.search(r'(\d+(\.\d+)+(\.\w+)*)', cells[0] if cells else row_text)
+        arch_text = cells[1] if len(cells) > 1 else ""
+        variants.append({
+            "version": match.group(1) if match else None,
+            "type": "BUNDLE" if "BUNDLE" in (cells[0] if cells else row_text) else "APK",
+            "arches": _split_arches(arch_text),
+            "min_sdk": cells[2] if len(cells) > 2 else None,
+            "dpi": cells[3] if len(cells) > 3 else None,
+            "url": base_url + sub_url['href'],
+            "text": row_text
+        })
+    return variants
+
+def _split_arches(text: str) -> list[str]:
+    """ABIs of an arch cell or config value ("arm64-v8a + armeabi-v7a", "x86, x86_64")"""
+    return [arch.strip() for arch in re.split(r'[+,]', text) if arch.strip()]
+
+def _variant_rank(variant: dict, type_: str, arch: str, dpi: str) -> tuple[int, int] | None:
+    """How well variant fits the criteria (lower is better), or None if it does not"""
+    if variant["dpi"] is None:
+        # Unrecognised table layout: fall back to matching the row text
+        return (0, 0) if all(criterion in variant["text"] for criterion in [type_, arch, dpi]) else None
+    if variant["type"] != type_ or dpi not in variant["dpi"]:
+        return None
+
+    wanted = set(_split_arches(arch))
+    offered = set(variant["arches"])
+    if wanted <= offered:
+        arch_rank = 0
+    elif offered & UNIVERSAL_ARCHES:
+        # A fat APK carries every ABI, including the ones asked for
+        arch_rank = 1
+    else:
+        return None
+    # Density-specific splits miss resources on other screens; prefer nodpi when dpi is open
+    return arch_rank, 0 if "nodpi" in variant["dpi"] else 1
+
+def _best_variant(variants: list[dict], type_: str, arch: str, dpi: str) -> dict | None:
+    ranked = [
+        (rank, i) for i, variant in enumerate(variants)
+        if (rank := _variant_rank(variant, type_, arch, dpi)) is not None
+    ]
+    return variants[min(ranked)[1]] if ranked else None
+
+def select_variant(variants: list[dict], version: str, type_: str, arch: str, dpi: str) -> dict | None:
+    """Best variant for exactly this version if listed, else the best of any version.
+
+    An exact arch match beats a universal/noarch APK, and a nodpi APK
+    beats density-specific ones; page order breaks ties.
+    """
+    dashed = version.replace('.', '-')
+    exact = [
+        variant for variant in variants
+        if variant["version"] == version or version in variant["text"] or dashed in variant["text"]
+    ]
+    variant = _best_variant(exact, type_, arch, dpi)
+    if variant:
+        return variant
+
+    variant = _best_variant([variant for variant in variants if variant["version"]], type_, arch, dpi)
+    if variant:
+        logging.warning(f"Using variant {variant['version']} (criteria match)")
+    return variant
+
+def get_download_link(version: str, app_name: str, config: dict, arch: str = None) -> str: 
+    target_arch = arch if arch else config.get('arch', 'universal')
     
-    # If exact version not found, try to find any variant matching criteria
-    if not download_page_url:
-        for row in rows:
-            row_text = row.get_text()
-            if all(criterion in row_text for criterion in criteria):
-                # Check if this looks like a variant row (has version numbers)
-                if re.search(r'\d+(\.\d+)+', row_text):
-                    sub_url = row.find('a', class_='accent_color')
-                    if sub_url:
-                        download_page_url = base_url + sub_url['href']
-                        # Extract version for logging
-                        match = re.search(r'(\d+(\.\d+)+(\.\w+)*)', row_text)
-                        if match:
-                            actual_version = match.group(1)
-                            logging.warning(f"Using variant {actual_version} (criteria match)")
-                        break
+    criteria = [config['type'], target_arch, config['dpi']]
     
-    if not download_page_url:
+    # A release page indexed recently (another run, source or arch) needs no fetch
+    variants = memory.variants(f"{config['org']}/{config['name']}", version)
+    if variants is None:
+        variants = _index_release_page(version, app_name, config)
+        if variants is None:
+            return None
+
+    # --- VARIANT FINDER (works with both exact pages and fallback pages) ---
+    variant = select_variant(variants, version, config['type'], target_arch, config['dpi'])
+    if not variant:
         logging.error(f"No variant found for {app_name} {version} with criteria {criteria}")
         # Debug: log what rows we found
-        logging.debug(f"Found {len(rows)} rows total")
-        for idx, row in enumerate(rows[:5]):  # First 5 rows
-            logging.debug(f"Row {idx}: {row.get_text()[:100]}...")
+        logging.debug(f"Found {len(variants)} rows total")
+        for idx, row in enumerate(variants[:5]):  # First 5 rows
+            logging.debug(f"Row {idx}: {row['text'][:100]}...")
         return None
+
+    download_page_url = variant["url"]
     
     # --- STANDARD DOWNLOAD FLOW ---
     try:
@@ -178,18 +385,14 @@ def get_download_link(version: str, app_name: str, config: dict, arch: str = Non
         response.raise_for_status()
         content_size = len(response.content)
         logging.info(f"URL:{response.url} [{content_size}/{content_size}] -> Variant Page")
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        sub_url = soup.find('a', class_='downloadButton')
+        sub_url = parser.find(response.content, 'a', class_='downloadButton')
         if sub_url:
             final_download_page_url = base_url + sub_url['href']
             response = session.get(final_download_page_url)
             response.raise_for_status()
             content_size = len(response.content)
             logging.info(f"URL:{response.url} [{content_size}/{content_size}] -> Download Page")
-            soup = BeautifulSoup(response.content, "html.parser")
-
-            button = soup.find('a', id='download-link')
+            button = parser.find(response.content, 'a', id='download-link')
             if button:
                 return base_url + button['href']
     except Exception as e:
@@ -197,28 +400,6 @@ def get_download_link(version: str, app_name: str, config: dict, arch: str = Non
     
     return None
 
-    # --- STANDARD DOWNLOAD FLOW (Page 2 -> Page 3 -> Link) ---
-    response = session.get(download_page_url)
-    response.raise_for_status()
-    content_size = len(response.content)
-    logging.info(f"URL:{response.url} [{content_size}/{content_size}] -> Variant Page")
-    soup = BeautifulSoup(response.content, "html.parser")
-
-    sub_url = soup.find('a', class_='downloadButton')
-    if sub_url:
-        final_download_page_url = base_url + sub_url['href']
-        response = session.get(final_download_page_url)
-        response.raise_for_status()
-        content_size = len(response.content)
-        logging.info(f"URL:{response.url} [{content_size}/{content_size}] -> Download Page")
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        button = soup.find('a', id='download-link')
-        if button:
-            return base_url + button['href']
-
-    return None
-
 def get_architecture_criteria(arch: str) -> dict:
     """Map architecture names to APKMirror criteria"""
     arch_mapping = {
@@ -234,9 +415,8 @@ def get_latest_version(app_name: str, config: dict) -> str:
         main_url = f"{base_url}/apk/{config['org']}/{config['name']}/"
         response = session.get(main_url)
         if response.status_code == 200:
-            soup = BeautifulSoup(response.content, "html.parser")
             # Try to find version in the page
-            version_elem = soup.find('span', string=re.compile(r'\d+\.\d+'))
+            version_elem = parser.parse(response.content, 'span').find('span', string=re.compile(r'\d+\.\d+'))
             if version_elem:
                 version_text = version_elem.text.strip()
                 match = re.search(r'(\d+(\.\d+)+)', version_text)
@@ -252,9 +432,7 @@ def get_latest_version(app_name: str, config: dict) -> str:
     response.raise_for_status()
     content_size = len(response.content)
     logging.info(f"URL:{response.url} [{content_size}/{content_size}] -> \"-\" [1]")
-    soup = BeautifulSoup(response.content, "html.parser")
-
-    app_rows = soup.find_all("div", class_="appRow")
+    app_rows = parser.parse(response.content, "div", class_="appRow").find_all("div", class_="appRow")
     version_pattern = re.compile(r'\d+(\.\d+)*(-[a-zA-Z0-9]+(\.\d+)*)*')
 
     for row in app_rows:
@@ -1,8 +1,7 @@
 import json
 import logging 
 
-from src import session 
-from bs4 import BeautifulSoup
+from src import session, parser
 
 # Define a standard browser User-Agent to avoid 403 Forbidden errors
 HEADERS = {
@@ -22,8 +21,7 @@ def get_latest_version(app_name: str, config: str) -> str:
         content_size = len(response.content)
         logging.info(f"URL:{response.url} [{content_size}/{content_size}] -> \"-\" [1]")
         
-        soup = BeautifulSoup(response.content, "html.parser")
-        version_info = soup.find('div', class_='ver-top-down')
+        version_info = parser.find(response.content, 'div', class_='ver-top-down')
 
         if version_info and 'data-dt-version' in version_info.attrs:
             return version_info['data-dt-version']
@@ -44,10 +42,8 @@ def get_download_link(version: str, app_name: str, config: str) -> str:
         content_size = len(response.content)
         logging.info(f"URL:{response.url} [{content_size}/{content_size}] -> \"-\" [1]")
         
-        soup = BeautifulSoup(response.content, "html.parser")
-        
         # Look for the download link; APKPure sometimes uses 'download_link' or 'fast-download'
-        download_link = soup.find('a', id='download_link')
+        download_link = parser.find(response.content, 'a', id='download_link')
         if download_link:
             return download_link['href']
             
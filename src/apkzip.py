@@ -0,0 +1,493 @@
+import os
+import mmap
+import zlib
+import struct
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+LOCAL_SIG = b"PK\x03\x04"
+CENTRAL_SIG = b"PK\x01\x02"
+EOCD_SIG = b"PK\x05\x06"
+DESCRIPTOR_SIG = b"PK\x07\x08"
+
+LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<4sHHHHHHIIIHHHHHII")
+EOCD = struct.Struct("<4sHHHHIIH")
+
+# Android's extra field for alignment padding (what zipalign/apksigner write)
+ALIGNMENT_EXTRA_ID = 0xD935
+# Uncompressed entries start on 4 bytes, native libraries on a (16 KiB) page
+DEFAULT_ALIGNMENT = 4
+LIBRARY_ALIGNMENT = 16384
+COPY_CHUNK = 1 << 20
+
+class ZipRewriteError(Exception):
+    pass
+
+def _find_eocd(data) -> int:
+    # The EOCD record sits in the last 22 bytes plus up to 64 KiB of comment
+    start = max(0, len(data) - EOCD.size - 0xFFFF)
+    position = data.rfind(EOCD_SIG, start)
+    while position >= 0:
+        if position + EOCD.size <= len(data):
+            _, _, _, _, _, cd_size, cd_offset, _ = EOCD.unpack_from(data, position)
+            if cd_offset + cd_size <= position:
+                return position
+        position = data.rfind(EOCD_SIG, start, position)
+    return -1
+
+def _central_records(data, position: int, total: int) -> list[dict]:
+    records = []
+    for _ in range(total):
+        if data[position:position + 4] != CENTRAL_SIG:
+            raise ZipRewriteError(f"Bad central directory record at {position}")
+        (_, made_by, needed, flags, method, mtime, mdate, crc, csize, usize,
+         name_len, extra_len, comment_len, _, int_attr, ext_attr, offset) = CENTRAL_HEADER.unpack_from(data, position)
+        name_start = position + CENTRAL_HEADER.size
+        name = bytes(data[name_start:name_start + name_len])
+        position = name_start + name_len + extra_len + comment_len
+        if 0xFFFFFFFF in (csize, usize, offset):
+            raise ZipRewriteError("ZIP64 archives are not supported")
+
+        records.append({
+            "name": name, "made_by": made_by, "needed": needed, "flags": flags, "method": method,
+            "mtime": mtime, "mdate": mdate, "crc": crc, "csize": csize, "usize": usize,
+            "int_attr": int_attr, "ext_attr": ext_attr, "offset": offset,
+            "extra": bytes(data[name_start + name_len:name_start + name_len + extra_len]),
+            "comment": bytes(data[name_start + name_len + extra_len:position])
+        })
+    return records
+
+def _entries_from_central_directory(data) -> list[dict]:
+    eocd = _find_eocd(data)
+    if eocd < 0:
+        raise ZipRewriteError("End of central directory not found")
+    _, _, _, _, total, cd_size, cd_offset, _ = EOCD.unpack_from(data, eocd)
+    if total == 0xFFFF or cd_offset == 0xFFFFFFFF:
+        raise ZipRewriteError("ZIP64 archives are not supported")
+
+    entries = _central_records(data, cd_offset, total)
+    for entry in entries:
+        offset = entry.pop("offset")
+        if data[offset:offset + 4] != LOCAL_SIG:
+            raise ZipRewriteError(f"Bad local header for {entry['name']!r}")
+        local = LOCAL_HEADER.unpack_from(data, offset)
+        local_extra_start = offset + LOCAL_HEADER.size + local[9]
+        data_offset = local_extra_start + local[10]
+        if data_offset + entry["csize"] > len(data):
+            raise ZipRewriteError(f"Data of {entry['name']!r} is truncated")
+        entry["local_extra"] = bytes(data[local_extra_start:data_offset])
+        entry["data_offset"] = data_offset
+    return entries
+
+def _deflated_length(data, start: int) -> tuple[int, int, int]:
+    """Compressed length, CRC and size of the raw deflate stream at start"""
+    decompressor = zlib.decompressobj(-15)
+    crc = 0
+    size = 0
+    position = start
+    while not decompressor.eof:
+        if position >= len(data):
+            raise ZipRewriteError("Deflate stream is truncated")
+        chunk = data[position:position + COPY_CHUNK]
+        output = decompressor.decompress(chunk)
+        crc = zlib.crc32(output, crc)
+        size += len(output)
+        position += len(chunk)
+    return position - len(decompressor.unused_data) - start, crc, size
+
+def _entries_from_local_headers(data) -> list[dict]:
+    """Recover entries by walking local headers (corrupt or missing central directory)"""
+    entries = []
+    position = 0
+    while data[position:position + 4] == LOCAL_SIG and position + LOCAL_HEADER.size <= len(data):
+        (_, needed, flags, method, mtime, mdate, crc, csize, usize,
+         name_len, extra_len) = LOCAL_HEADER.unpack_from(data, position)
+        name_start = position + LOCAL_HEADER.size
+        name = bytes(data[name_start:name_start + name_len])
+        data_offset = name_start + name_len + extra_len
+
+        try:
+            end = data_offset + csize
+            if flags & 0x08:
+                # Sizes follow the data in a descriptor; find where the data ends
+                if method == 8:
+                    csize, crc, usize = _deflated_length(data, data_offset)
+                    end = data_offset + csize
+                else:
+                    end = data.find(DESCRIPTOR_SIG, data_offset)
+                    if end < 0:
+                        break
+                    csize = end - data_offset
+                    crc, _, usize = struct.unpack_from("<III", data, end + 4)
+                descriptor = end + (16 if data[end:end + 4] == DESCRIPTOR_SIG else 12)
+            else:
+                descriptor = end
+        except (ZipRewriteError, zlib.error, struct.error):
+            break
+        if end > len(data):
+            break
+
+        entries.append({
+            "name": name, "made_by": 20, "needed": needed, "flags": flags, "method": method,
+            "mtime": mtime, "mdate": mdate, "crc": crc, "csize": csize, "usize": usize,
+            "int_attr": 0, "ext_attr": 0, "extra": b"", "comment": b"",
+            "local_extra": bytes(data[name_start + name_len:data_offset]), "data_offset": data_offset
+        })
+        position = descriptor
+    if not entries:
+        raise ZipRewriteError("No recoverable entries")
+    return entries
+
+def _clean_extra(extra: bytes) -> bytes:
+    """Extra field without alignment padding; b"" if it is not well formed"""
+    records = []
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, size = struct.unpack_from("<HH", extra, position)
+        if position + 4 + size > len(extra):
+            return b""
+        if header_id != ALIGNMENT_EXTRA_ID:
+            records.append(extra[position:position + 4 + size])
+        position += 4 + size
+    return b"".join(records) if position == len(extra) else b""
+
+def _aligned_extra(extra: bytes, header_offset: int, name_len: int, alignment: int) -> bytes:
+    data_offset = header_offset + LOCAL_HEADER.size + name_len + len(extra)
+    if data_offset % alignment == 0:
+        return extra
+    padding = -(data_offset + 6) % alignment
+    return extra + struct.pack("<HHH", ALIGNMENT_EXTRA_ID, 2 + padding, alignment) + b"\0" * padding
+
+def _check_local_header(data, entry: dict) -> str | None:
+    header_offset = entry["data_offset"] - len(entry["local_extra"]) - len(entry["name"]) - LOCAL_HEADER.size
+    (_, _, flags, method, _, _, crc, csize, usize,
+     name_len, _) = LOCAL_HEADER.unpack_from(data, header_offset)
+    name = entry["name"]
+    if bytes(data[header_offset + LOCAL_HEADER.size:header_offset + LOCAL_HEADER.size + name_len]) != name:
+        return f"Local header name differs from central directory for {name!r}"
+    if method != entry["method"]:
+        return f"Compression method mismatch for {name!r}"
+    # With a data descriptor the local header may carry zeros instead of sizes
+    if not flags & 0x08 and (crc, csize, usize) != (entry["crc"], entry["csize"], entry["usize"]):
+        return f"Local header sizes differ from central directory for {name!r}"
+    if method not in (0, 8):
+        return f"Unsupported compression method {method} for {name!r}"
+    if method == 0 and entry["csize"] != entry["usize"]:
+        return f"Stored entry {name!r} has mismatching sizes"
+    return None
+
+def _check_crc(data, entry: dict) -> str | None:
+    start = entry["data_offset"]
+    end = start + entry["csize"]
+    decompressor = zlib.decompressobj(-15) if entry["method"] == 8 else None
+    crc = 0
+    size = 0
+    try:
+        for position in range(start, end, COPY_CHUNK):
+            chunk = data[position:min(position + COPY_CHUNK, end)]
+            if decompressor:
+                chunk = decompressor.decompress(chunk)
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+        if decompressor:
+            chunk = decompressor.flush()
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+    except zlib.error as e:
+        return f"Corrupt data in {entry['name']!r}: {e}"
+    if (crc, size) != (entry["crc"], entry["usize"]):
+        return f"CRC mismatch for {entry['name']!r}"
+    return None
+
+def check(apk: Path, crc: bool = False, workers: int | None = None) -> str | None:
+    """First problem found in apk's structure, or None when it is intact.
+
+    Reads the central directory through an mmap and cross-checks every
+    entry against its local header. With crc, every entry is also
+    decompressed and checksummed, one entry per task on `workers` threads
+    (zlib releases the GIL on large buffers).
+    """
+    with open(apk, "rb") as apk_file:
+        if os.fstat(apk_file.fileno()).st_size == 0:
+            return f"{apk} is empty"
+        with mmap.mmap(apk_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            try:
+                entries = _entries_from_central_directory(data)
+                for entry in entries:
+                    problem = _check_local_header(data, entry)
+                    if problem:
+                        return problem
+            except (ZipRewriteError, struct.error) as e:
+                return str(e)
+            if not crc:
+                return None
+
+            # Largest entries first so one big dex or library does not finish last
+            entries.sort(key=lambda entry: entry["csize"], reverse=True)
+            with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 2) as executor:
+                for problem in executor.map(lambda entry: _check_crc(data, entry), entries):
+                    if problem:
+                        executor.shutdown(wait=True, cancel_futures=True)
+                        return problem
+    return None
+
+def _write_local_header(out, entry: dict) -> int:
+    """Write entry's local header (sizes inline, data aligned) at out's position"""
+    offset = out.tell()
+    extra = _clean_extra(entry["local_extra"])
+    if entry["method"] == 0:
+        alignment = LIBRARY_ALIGNMENT if entry["name"].endswith(b".so") else DEFAULT_ALIGNMENT
+        extra = _aligned_extra(extra, offset, len(entry["name"]), alignment)
+    out.write(LOCAL_HEADER.pack(
+        LOCAL_SIG, entry["needed"], entry["flags"] & ~0x08, entry["method"], entry["mtime"], entry["mdate"],
+        entry["crc"], entry["csize"], entry["usize"], len(entry["name"]), len(extra)
+    ))
+    out.write(entry["name"])
+    out.write(extra)
+    return offset
+
+def _central_record(entry: dict, offset: int) -> bytes:
+    return CENTRAL_HEADER.pack(
+        CENTRAL_SIG, entry["made_by"], entry["needed"], entry["flags"] & ~0x08, entry["method"],
+        entry["mtime"], entry["mdate"], entry["crc"], entry["csize"], entry["usize"],
+        len(entry["name"]), len(entry["extra"]), len(entry["comment"]), 0,
+        entry["int_attr"], entry["ext_attr"], offset
+    ) + entry["name"] + entry["extra"] + entry["comment"]
+
+def _write_central_directory(out, central: list[bytes]) -> int:
+    cd_offset = out.tell()
+    if cd_offset > 0xFFFFFFFF or len(central) > 0xFFFF:
+        raise ZipRewriteError("Archive too large for a non-ZIP64 archive")
+    for record in central:
+        out.write(record)
+    cd_size = out.tell() - cd_offset
+    out.write(EOCD.pack(EOCD_SIG, 0, 0, len(central), len(central), cd_size, cd_offset, 0))
+    return out.tell()
+
+def read_entries(data) -> tuple[list[dict], bool]:
+    """Entries of the archive in data and whether they had to be recovered"""
+    try:
+        return _entries_from_central_directory(data), False
+    except (ZipRewriteError, struct.error) as e:
+        logging.warning(f"Central directory unusable ({e}), recovering from local headers")
+        return _entries_from_local_headers(data), True
+
+def rewrite(src: Path, dest: Path, drop=None) -> dict:
+    """Copy src to dest in one pass, leaving out entries for which drop(name) is true.
+
+    Entry data is copied raw, without recompression. Local headers get
+    their sizes inline (no data descriptors), uncompressed entries are
+    aligned like zipalign -p and the central directory is rebuilt, which
+    also repairs archives whose directory is damaged or missing.
+    """
+    with open(src, "rb") as src_file:
+        if os.fstat(src_file.fileno()).st_size == 0:
+            raise ZipRewriteError(f"{src} is empty")
+        with mmap.mmap(src_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            entries, recovered = read_entries(data)
+            kept = [entry for entry in entries if not (drop and drop(entry["name"].decode("utf-8", "replace")))]
+
+            central = []
+            with memoryview(data) as view, open(dest, "wb") as out:
+                for entry in kept:
+                    offset = _write_local_header(out, entry)
+                    start = entry["data_offset"]
+                    for chunk_start in range(start, start + entry["csize"], COPY_CHUNK):
+                        out.write(view[chunk_start:min(chunk_start + COPY_CHUNK, start + entry["csize"])])
+                    central.append(_central_record(entry, offset))
+                size = _write_central_directory(out, central)
+
+    return {"entries": len(kept), "dropped": len(entries) - len(kept), "recovered": recovered, "size": size}
+
+class StreamRewriter:
+    """rewrite() for an archive that arrives as a stream of chunks.
+
+    Used like a file: local entries are parsed as chunks are written; kept entries go straight
+    to `out` (which must be seekable) with aligned headers, dropped ones
+    are skipped without being buffered. Everything after the last local
+    entry (the source central directory) is held until finish(), which
+    cross-checks it against the entries seen and writes the rebuilt
+    directory; entries it lists that never streamed past (after a gap
+    between local entries) raise ZipRewriteError. Stored entries with
+    data descriptors cannot be delimited while streaming and raise
+    ZipRewriteError.
+    """
+
+    def __init__(self, out, drop=None):
+        self.out = out
+        self.drop = drop
+        self.entries = []
+        self.dropped = 0
+        # Names of every local entry seen, kept or dropped
+        self._names = []
+        self._buffer = bytearray()
+        self._tail = bytearray()
+        self._entry = None
+        self._remaining = 0
+        self._decompressor = None
+        self._state = "header"
+        # Input offset of the first byte in _buffer (then _tail)
+        self._offset = 0
+
+    def write(self, chunk: bytes) -> None:
+        if self._state == "tail":
+            self._tail += chunk
+            return
+        self._buffer += chunk
+        position = 0
+        with memoryview(self._buffer) as view:
+            while position < len(view) and self._state != "tail":
+                # Handlers return the bytes they consumed, or None until more arrive
+                with view[position:] as data:
+                    consumed = getattr(self, f"_{self._state}")(data)
+                if consumed is None:
+                    break
+                position += consumed
+        self._offset += position
+        if self._state == "tail":
+            self._tail += self._buffer[position:]
+            position = len(self._buffer)
+        del self._buffer[:position]
+
+    def _header(self, data) -> int | None:
+        if len(data) < 4:
+            return None
+        if data[:4] != LOCAL_SIG:
+            # APK signing block or central directory
+            self._state = "tail"
+            return 0
+        if len(data) < LOCAL_HEADER.size:
+            return None
+        (_, needed, flags, method, mtime, mdate, crc, csize, usize,
+         name_len, extra_len) = LOCAL_HEADER.unpack_from(data)
+        data_offset = LOCAL_HEADER.size + name_len + extra_len
+        if len(data) < data_offset:
+            return None
+        if flags & 0x08 and method != 8:
+            raise ZipRewriteError("Stored entries with data descriptors cannot be streamed")
+        if 0xFFFFFFFF in (csize, usize):
+            raise ZipRewriteError("ZIP64 archives are not supported")
+
+        name = bytes(data[LOCAL_HEADER.size:LOCAL_HEADER.size + name_len])
+        self._names.append(name)
+        entry = {
+            "name": name, "made_by": 20, "needed": needed, "flags": flags, "method": method,
+            "mtime": mtime, "mdate": mdate, "crc": crc, "csize": csize, "usize": usize,
+            "int_attr": 0, "ext_attr": 0, "extra": b"", "comment": b"",
+            "local_extra": bytes(data[LOCAL_HEADER.size + name_len:data_offset]), "offset": None
+        }
+        if not (self.drop and self.drop(name.decode("utf-8", "replace"))):
+            entry["offset"] = _write_local_header(self.out, entry)
+            self.entries.append(entry)
+        else:
+            self.dropped += 1
+
+        self._entry = entry
+        if flags & 0x08:
+            self._decompressor = zlib.decompressobj(-15)
+            entry["crc"] = entry["csize"] = entry["usize"] = 0
+            self._state = "deflated"
+        else:
+            self._remaining = csize
+            self._state = "data"
+        return data_offset
+
+    def _data(self, data) -> int:
+        size = min(self._remaining, len(data))
+        if self._entry["offset"] is not None:
+            self.out.write(data[:size])
+        self._remaining -= size
+        if self._remaining == 0:
+            self._state = "header"
+        return size
+
+    def _deflated(self, data) -> int | None:
+        entry = self._entry
+        try:
+            output = self._decompressor.decompress(data)
+        except zlib.error as e:
+            raise ZipRewriteError(f"Corrupt data in {entry['name']!r}: {e}")
+        entry["crc"] = zlib.crc32(output, entry["crc"])
+        entry["usize"] += len(output)
+        size = len(data) - len(self._decompressor.unused_data)
+        entry["csize"] += size
+        if entry["offset"] is not None:
+            self.out.write(data[:size])
+        if self._decompressor.eof:
+            self._decompressor = None
+            self._state = "descriptor"
+        return size
+
+    def _descriptor(self, data) -> int | None:
+        if len(data) < 4:
+            return None
+        length = 16 if data[:4] == DESCRIPTOR_SIG else 12
+        if len(data) < length:
+            return None
+        entry = self._entry
+        crc, csize, usize = struct.unpack_from("<III", data, length - 12)
+        if (crc, csize, usize) != (entry["crc"], entry["csize"], entry["usize"]):
+            raise ZipRewriteError(f"Data descriptor of {entry['name']!r} does not match its data")
+        if entry["offset"] is not None:
+            # Sizes are known now; put them in the header written before the data
+            end = self.out.tell()
+            self.out.seek(entry["offset"] + 14)
+            self.out.write(struct.pack("<III", crc, csize, usize))
+            self.out.seek(end)
+        self._state = "header"
+        return length
+
+    def finish(self) -> dict:
+        """Write the central directory once the whole archive was written"""
+        if self._state != "tail":
+            raise ZipRewriteError("Archive ended inside a local entry")
+        try:
+            central_records = self._central_directory()
+        except (ZipRewriteError, struct.error) as e:
+            logging.warning(f"Central directory unusable ({e}), keeping local header metadata")
+            central_records = []
+        # Bytes between local entries end the stream early; entries after them would be lost
+        if central_records and sorted(record["name"] for record in central_records) != sorted(self._names):
+            raise ZipRewriteError(
+                f"Central directory lists {len(central_records)} entries, the stream had {len(self._names)}"
+            )
+        central = {record["name"]: record for record in central_records}
+
+        records = []
+        for entry in self.entries:
+            source = central.get(entry["name"])
+            if source:
+                if (source["crc"], source["csize"], source["usize"]) != (entry["crc"], entry["csize"], entry["usize"]):
+                    raise ZipRewriteError(f"Central directory disagrees with local data for {entry['name']!r}")
+                for key in ("made_by", "int_attr", "ext_attr", "extra", "comment"):
+                    entry[key] = source[key]
+            records.append(_central_record(entry, entry["offset"]))
+        size = _write_central_directory(self.out, records)
+        return {"entries": len(self.entries), "dropped": self.dropped, "recovered": not central, "size": size}
+
+    def _central_directory(self) -> list[dict]:
+        # The tail starts at input offset self._offset; EOCD offsets are absolute
+        eocd = self._tail.rfind(EOCD_SIG)
+        if eocd < 0 or eocd + EOCD.size > len(self._tail):
+            raise ZipRewriteError("End of central directory not found")
+        _, _, _, _, total, cd_size, cd_offset, _ = EOCD.unpack_from(self._tail, eocd)
+        start = cd_offset - self._offset
+        if start < 0 or start + cd_size > eocd:
+            raise ZipRewriteError("Central directory is outside the archive")
+        return _central_records(self._tail, start, total)
+
+def abi_filter(abis: list[str]):
+    """drop predicate for rewrite() removing native libraries of abis"""
+    prefixes = tuple(f"lib/{abi}/" for abi in abis)
+    return lambda name: name.startswith(prefixes)
+
+def rewrite_in_place(apk: Path, drop=None) -> dict:
+    tmp_path = apk.with_name(f".{apk.name}.rewrite")
+    try:
+        result = rewrite(apk, tmp_path, drop)
+        os.replace(tmp_path, apk)
+        return result
+    finally:
+        tmp_path.unlink(missing_ok=True)
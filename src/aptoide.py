@@ -1,44 +1,112 @@
+import os
+import time
 import base64
+import logging
+import threading
 from typing import Dict
-from src import session
+from urllib.parse import urlencode
+from src import session, cache_dir
+from src.cache import JsonStore
 
 BASE_URL = "https://ws75.aptoide.com/api/7/"
+VERSIONS_PAGE_SIZE = 50
+
+class AptoideClient:
+    """Aptoide API client caching responses per (package, cpu filter) with a TTL.
+
+    Each entry holds the latest release, the vercodes seen while paging
+    listAppVersions (and where paging stopped) and download paths per
+    version, so repeated lookups for a package cost no requests.
+    """
+
+    def __init__(self, store: JsonStore, ttl: float):
+        self.store = store
+        self.ttl = ttl
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, package: str, q: str) -> dict:
+        key = f"{package}{q}"
+        with self._lock:
+            entry = self._memo.get(key) or self.store.read().get(key)
+            if not entry or entry["fetched_at"] + self.ttl < time.time():
+                entry = {"fetched_at": time.time(), "latest": None, "versions": {}, "next_offset": 0, "paths": {}}
+            self._memo[key] = entry
+            return entry
+
+    def _save(self, package: str, q: str, entry: dict) -> None:
+        def update(data):
+            data[f"{package}{q}"] = entry
+        self.store.update(update)
+
+    def _get(self, endpoint: str, q: str, **params) -> dict:
+        url = f"{BASE_URL}{endpoint}?{urlencode(params)}{q}"
+        response = session.get(url)
+        response.raise_for_status()
+        return response.json()
+
+    def latest(self, package: str, q: str) -> dict:
+        entry = self._entry(package, q)
+        if entry["latest"] is None:
+            res = self._get("apps/search", q, query=package, limit=1, trusted="true")
+            if not res['datalist']['list']:
+                raise ValueError(f"No version found for {package}")
+            file = res['datalist']['list'][0]['file']
+            entry["latest"] = {"vername": file['vername'], "path": file['path']}
+            self._save(package, q, entry)
+        return entry["latest"]
+
+    def vercode(self, package: str, q: str, version: str) -> int | None:
+        """vercode of version, paging listAppVersions only as far as needed"""
+        entry = self._entry(package, q)
+        versions = entry["versions"]
+        pages = 0
+        while version not in versions and entry["next_offset"] is not None:
+            res = self._get(
+                "listAppVersions", q,
+                package_name=package, limit=VERSIONS_PAGE_SIZE, offset=entry["next_offset"]
+            )
+            datalist = res['datalist']
+            for app in datalist['list']:
+                versions.setdefault(app['file']['vername'], app['file']['vercode'])
+            next_offset = datalist.get('next')
+            has_more = datalist['list'] and next_offset and next_offset > entry["next_offset"]
+            entry["next_offset"] = next_offset if has_more else None
+            pages += 1
+
+        if pages:
+            logging.info(f"Aptoide {package}: {len(versions)} versions indexed ({pages} page request(s))")
+            self._save(package, q, entry)
+        return versions.get(version)
+
+    def download_path(self, package: str, q: str, version: str) -> str:
+        entry = self._entry(package, q)
+        if version not in entry["paths"]:
+            vercode = self.vercode(package, q, version)
+            if not vercode:
+                raise ValueError(f"Version {version} not found for {package}")
+            res_meta = self._get("getAppMeta", q, package_name=package, vercode=vercode)
+            entry["paths"][version] = res_meta['data']['file']['path']
+            self._save(package, q, entry)
+        return entry["paths"][version]
+
+client = AptoideClient(
+    JsonStore(cache_dir / "aptoide.json"),
+    ttl=float(os.getenv("APTOIDE_CACHE_TTL_MINUTES", "60")) * 60
+)
 
 def get_latest_version(app_name: str, config: Dict) -> str:
-    package = config['package']
     arch = config.get('arch', 'universal')
-    q = _get_q_param(arch)
-    url = f"{BASE_URL}apps/search?query={package}&limit=1&trusted=true{q}"
-    res = session.get(url).json()
-    if res['datalist']['list']:
-        return res['datalist']['list'][0]['file']['vername']
-    raise ValueError(f"No version found for {package}")
+    return client.latest(config['package'], _get_q_param(arch))['vername']
 
 def get_download_link(version: str, app_name: str, config: Dict) -> str:
     package = config['package']
-    arch = config.get('arch', 'universal')
-    q = _get_q_param(arch)
+    q = _get_q_param(config.get('arch', 'universal'))
 
     if version.lower() == "latest":
-        url = f"{BASE_URL}apps/search?query={package}&limit=1&trusted=true{q}"
-        res = session.get(url).json()
-        return res['datalist']['list'][0]['file']['path']
-
-    # Find vercode for specific version
-    url_versions = f"{BASE_URL}listAppVersions?package_name={package}&limit=50{q}"
-    res_v = session.get(url_versions).json()
-    vercode = None
-    for app in res_v['datalist']['list']:
-        if app['file']['vername'] == version:
-            vercode = app['file']['vercode']
-            break
-    if not vercode:
-        raise ValueError(f"Version {version} not found for {package}")
-
-    # Get meta with download path
-    url_meta = f"{BASE_URL}getAppMeta?package_name={package}&vercode={vercode}{q}"
-    res_meta = session.get(url_meta).json()
-    return res_meta['data']['file']['path']
+        return client.latest(package, q)['path']
+
+    return client.download_path(package, q, version)
 
 def _get_q_param(arch: str) -> str:
     if arch == 'universal':
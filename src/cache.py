@@ -0,0 +1,183 @@
+import os
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from src import cache_dir, utils
+
+# FICLONE ioctl: copy-on-write clone on btrfs/xfs
+FICLONE = 0x40049409
+
+class ArtifactCache:
+    """Content-addressed store for downloaded artifacts.
+
+    Entries are keyed by URL plus a validator (ETag, Last-Modified, GitHub
+    asset id, ...) and point at blobs named by their sha256, so the same
+    bytes fetched from different URLs are stored once. Blobs are evicted
+    least-recently-used once the store grows beyond max_bytes.
+
+    Materialised files may share an inode with the blob, so callers must
+    replace them rather than edit them in place. URLs starting with one of
+    the exclude prefixes are never cached.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, enabled: bool = True, exclude: tuple[str, ...] = ()):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.exclude = exclude
+        self.index_path = root / "index.json"
+        self.lock_path = root / ".lock"
+        self.blob_dir = root / "blobs"
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    @staticmethod
+    def make_key(url: str, validator: str) -> str:
+        return hashlib.sha256(f"{url}\n{validator}".encode()).hexdigest()
+
+    def _blob_path(self, sha256: str) -> Path:
+        return self.blob_dir / sha256[:2] / sha256
+
+    def _load_index(self) -> dict:
+        return utils.load_json(self.index_path, {"entries": {}})
+
+    def lookup(self, url: str, validator: str | None) -> dict | None:
+        if not self.enabled or not validator or url.startswith(self.exclude):
+            return None
+
+        key = self.make_key(url, validator)
+        with self._lock, utils.file_lock(self.lock_path):
+            index = self._load_index()
+            entry = index["entries"].get(key)
+            if entry is None:
+                return None
+            if not self._blob_path(entry["sha256"]).exists():
+                del index["entries"][key]
+                utils.save_json(self.index_path, index)
+                return None
+            entry["last_used"] = time.time()
+            utils.save_json(self.index_path, index)
+            return dict(entry)
+
+    def materialize(self, entry: dict, dest: Path) -> Path:
+        """Place a cached blob at dest via hardlink, reflink or copy"""
+        blob = self._blob_path(entry["sha256"])
+        _link_or_copy(blob, dest)
+
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += entry["size"]
+        logging.info(f"Cache hit: {entry['url']} -> \"{dest}\" [{entry['size']} bytes]")
+        return dest
+
+    def store(self, url: str, validator: str | None, filepath: Path, sha256: str, verified: bool = False) -> None:
+        with self._lock:
+            self.misses += 1
+        if not self.enabled or not validator or url.startswith(self.exclude):
+            return
+
+        try:
+            blob = self._blob_path(sha256)
+            with self._lock, utils.file_lock(self.lock_path):
+                if not blob.exists():
+                    blob.parent.mkdir(parents=True, exist_ok=True)
+                    tmp_blob = blob.with_name(f".{sha256}.{os.getpid()}.tmp")
+                    _link_or_copy(filepath, tmp_blob)
+                    os.replace(tmp_blob, blob)
+
+                index = self._load_index()
+                index["entries"][self.make_key(url, validator)] = {
+                    "url": url,
+                    "validator": validator,
+                    "name": filepath.name,
+                    "sha256": sha256,
+                    "size": filepath.stat().st_size,
+                    "verified": verified,
+                    "last_used": time.time()
+                }
+                self._evict(index)
+                utils.save_json(self.index_path, index)
+        except OSError as e:
+            logging.warning(f"Could not store {filepath} in artifact cache: {e}")
+
+    def _evict(self, index: dict) -> None:
+        # Group entries by blob: a blob is as recent as its most recent key
+        blobs = {}
+        for key, entry in index["entries"].items():
+            blob = blobs.setdefault(entry["sha256"], {"size": entry["size"], "last_used": 0, "keys": []})
+            blob["last_used"] = max(blob["last_used"], entry["last_used"])
+            blob["keys"].append(key)
+
+        total_size = sum(blob["size"] for blob in blobs.values())
+        for sha256, blob in sorted(blobs.items(), key=lambda item: item[1]["last_used"]):
+            if total_size <= self.max_bytes:
+                break
+            self._blob_path(sha256).unlink(missing_ok=True)
+            for key in blob["keys"]:
+                del index["entries"][key]
+            total_size -= blob["size"]
+            logging.info(f"Evicted {sha256[:12]} from artifact cache [{blob['size']} bytes]")
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes_saved": self.bytes_saved
+        }
+
+    def log_stats(self) -> None:
+        if not self.enabled:
+            return
+        logging.info(
+            f"📦 Artifact cache: {self.hits} hit(s), {self.misses} miss(es), "
+            f"{self.bytes_saved / 1024 / 1024:.1f} MiB saved"
+        )
+
+class JsonStore:
+    """Small JSON document under the cache dir, shared by threads and processes"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock_path = path.with_name(f"{path.name}.lock")
+        self._lock = threading.Lock()
+
+    def read(self) -> dict:
+        return utils.load_json(self.path, {})
+
+    def update(self, function):
+        """Apply function to the stored dict and persist it, returning its result"""
+        with self._lock, utils.file_lock(self.lock_path):
+            data = self.read()
+            result = function(data)
+            utils.save_json(self.path, data)
+            return result
+
+def _link_or_copy(src: Path, dest: Path) -> None:
+    # An existing dest may share its inode with a blob; opening it for writing would corrupt both
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+        return
+    except OSError:
+        pass
+
+    with src.open("rb") as src_file, dest.open("wb") as dest_file:
+        try:
+            fcntl.ioctl(dest_file.fileno(), FICLONE, src_file.fileno())
+            return
+        except OSError:
+            shutil.copyfileobj(src_file, dest_file, 1024 * 1024)
+
+artifacts = ArtifactCache(
+    cache_dir / "artifacts",
+    max_bytes=int(os.getenv("ARTIFACT_CACHE_MAX_MB", "4096")) * 1024 * 1024,
+    enabled=os.getenv("ARTIFACT_CACHE", "true").lower() != "false",
+    # e.g. "apk://" keeps mirror APKs out of a cache shared by many jobs
+    exclude=tuple(prefix for prefix in os.getenv("ARTIFACT_CACHE_EXCLUDE", "").split(",") if prefix)
+)
@@ -0,0 +1,157 @@
+import os
+import time
+import random
+import logging
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+from curl_cffi import CurlInfo, requests
+from curl_cffi.requests.exceptions import ConnectionError, Timeout
+from src import throttle
+
+# Statuses worth another attempt; anything else goes straight back to the caller
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+# Longest Retry-After we are willing to sit out
+MAX_RETRY_AFTER = 60.0
+
+class HttpClient:
+    """Shared HTTP client used by every scraper and downloader.
+
+    Each host gets its own curl_cffi session, so connections (HTTP/2 where
+    the server negotiates it) are pooled and reused per host. Sessions are
+    safe to share between threads. Requests get connect/read timeouts
+    unless the caller passes its own, and idempotent requests are retried
+    with jittered exponential backoff on 5xx/429 and dropped connections.
+    Concurrency and pacing per host follow the AIMD controller, if any.
+
+    Hooks see every request: `on_request(method, url, kwargs)` may return a
+    response to use instead of going to the network (later hooks' on_request
+    is then skipped), and `on_response(method, url, kwargs, response)` is
+    told about every result.
+    """
+
+    def __init__(
+        self,
+        impersonate: str,
+        connect_timeout: float,
+        read_timeout: float,
+        retries: int,
+        backoff: float,
+        controller: throttle.AimdController | None = None
+    ):
+        self.impersonate = impersonate
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.controller = controller
+        self.hooks = []
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, url: str) -> requests.Session:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._sessions:
+                # Time to first byte as curl measured it, for the network report
+                self._sessions[host] = requests.Session(
+                    impersonate=self.impersonate, curl_infos=[CurlInfo.STARTTRANSFER_TIME]
+                )
+            return self._sessions[host]
+
+    def _delay(self, attempt: int, response=None) -> float:
+        retry_after = _retry_after(response)
+        if retry_after is not None:
+            return retry_after
+        # Full jitter: spread retries of concurrent callers apart
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def request(self, method: str, url: str, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        session = self.session_for(url)
+        retries = self.retries if method.upper() in IDEMPOTENT_METHODS else 0
+
+        for attempt in range(retries + 1):
+            try:
+                response = self._send(session, method, url, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                if attempt == retries:
+                    raise
+                delay = self._delay(attempt)
+                logging.warning(f"🔁 {method} {url} failed ({str(e)[:60]}), retrying in {delay:.1f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    return response
+                delay = self._delay(attempt, response)
+                response.close()
+                logging.warning(f"🔁 {method} {url} returned {response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+    def _send(self, session: requests.Session, method: str, url: str, **kwargs):
+        response = None
+        for hook in self.hooks:
+            response = hook.on_request(method, url, kwargs)
+            if response is not None:
+                break
+
+        if response is None:
+            response = self._transmit(session, method, url, **kwargs)
+        for hook in self.hooks:
+            hook.on_response(method, url, kwargs, response)
+        return response
+
+    def _transmit(self, session: requests.Session, method: str, url: str, **kwargs):
+        if self.controller is None:
+            return session.request(method, url, **kwargs)
+
+        # Slots are held until headers arrive, not for a whole streamed body
+        host = urlsplit(url).netloc.lower()
+        self.controller.acquire(host)
+        for hook in self.hooks:
+            # Optional: lets hooks tell time queued in the throttle from time on the wire
+            on_send = getattr(hook, "on_send", None)
+            if on_send:
+                on_send(method, url, kwargs)
+        try:
+            response = session.request(method, url, **kwargs)
+        except Exception:
+            self.controller.release(host, throttled=False, failed=True)
+            raise
+        throttled = throttle.is_throttled(response, streamed=kwargs.get("stream", False))
+        self.controller.release(host, throttled, _retry_after(response) if throttled else None)
+        return response
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def head(self, url: str, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+def _retry_after(response) -> float | None:
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), MAX_RETRY_AFTER)
+    return None
+
+def from_env(impersonate: str, cache_dir: Path) -> HttpClient:
+    controller = None
+    if os.getenv("HTTP_THROTTLE", "true").lower() == "true":
+        shared = os.getenv("HTTP_THROTTLE_SHARED", "false").lower() == "true"
+        controller = throttle.AimdController(
+            initial=float(os.getenv("HTTP_THROTTLE_INITIAL", "4")),
+            max_concurrency=float(os.getenv("HTTP_THROTTLE_MAX", "16")),
+            max_interval=float(os.getenv("HTTP_THROTTLE_MAX_INTERVAL", "30")),
+            state_dir=cache_dir / "throttle" if shared else None
+        )
+
+    return HttpClient(
+        impersonate,
+        connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "15")),
+        read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "60")),
+        retries=int(os.getenv("HTTP_RETRIES", "3")),
+        backoff=float(os.getenv("HTTP_BACKOFF", "1")),
+        controller=controller
+    )
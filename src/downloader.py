@@ -1,16 +1,108 @@
+import os
 import json
+import time
+import hashlib
 import logging
 from pathlib import Path
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from src import (
     utils,
     apkpure,
     session,
     uptodown,
+    stats,
     aptoide,
-    apkmirror
+    transfer,
+    apkzip,
+    apkmirror,
+    sources_lock
 )
+from src.cache import artifacts
+
+# Parallel GitHub/bundle downloads while acquiring tools
+download_workers = int(os.getenv("DOWNLOAD_WORKERS", "8"))
+# Default platform priority; stats.mirrors reorders it per app
+platforms = ["apkmirror", "apkpure", "uptodown", "aptoide"]
+# Resolve the input APK on all platforms concurrently instead of one by one
+hedged_acquisition = os.getenv("HEDGED_ACQUISITION", "false").lower() == "true"
+
+class IntegrityError(Exception):
+    pass
+
+# Downloads whose bytes were checked against a digest or Content-Length
+verified_files: set[Path] = set()
+
+def is_verified(filepath: Path) -> bool:
+    return filepath.resolve() in verified_files
+
+def download_resource(url: str, name: str = None, validator: str = None, cache_key: str = None, digest: str = None,
+                      drop_abis: list[str] = None) -> Path:
+    """Download url, reusing the artifact cache when a validator is known.
+
+    cache_key replaces the URL in the cache key for links that change on
+    every request (signed mirror URLs) but identify the same artifact.
+    digest ("sha256:<hex>") is checked while streaming; a mismatching or
+    truncated download is retried once before IntegrityError is raised.
+    With drop_abis, an .apk is rewritten without those native libraries
+    as it streams in; archives that cannot be are downloaded whole.
+    """
+    expected_sha256 = _parse_digest(digest)
+    for attempt in range(2):
+        try:
+            if drop_abis:
+                try:
+                    return _download_resource(url, name, validator, cache_key or url, expected_sha256, drop_abis)
+                except apkzip.ZipRewriteError as e:
+                    logging.warning(f"Could not strip {url} while streaming ({e}), downloading it whole")
+                    drop_abis = None
+            return _download_resource(url, name, validator, cache_key or url, expected_sha256)
+        except IntegrityError as e:
+            if attempt:
+                raise
+            logging.warning(f"{e}, retrying download once")
+
+def _parse_digest(digest: str | None) -> str | None:
+    if not digest:
+        return None
+    algorithm, _, value = digest.partition(":")
+    if algorithm.lower() != "sha256" or not value:
+        logging.warning(f"Ignoring unsupported digest: {digest}")
+        return None
+    return value.lower()
+
+def _from_cache(cache_key: str, validator: str | None, dest: Path | None, expected_sha256: str = None) -> Path | None:
+    entry = artifacts.lookup(cache_key, validator)
+    if entry is None or (expected_sha256 and entry["sha256"] != expected_sha256):
+        return None
+    filepath = artifacts.materialize(entry, dest or Path(entry["name"]))
+    if entry.get("verified"):
+        verified_files.add(filepath.resolve())
+    return filepath
+
+def _verify(filepath: Path, size: int, total_size: int, sha256: str, expected_sha256: str | None) -> bool:
+    """Check a finished download, returning whether anything could be checked"""
+    problem = None
+    if expected_sha256 and sha256 != expected_sha256:
+        problem = f"sha256 mismatch ({sha256[:12]} != {expected_sha256[:12]})"
+    elif total_size and size != total_size:
+        problem = f"size mismatch ({size} != {total_size} bytes)"
+
+    if problem:
+        filepath.unlink(missing_ok=True)
+        raise IntegrityError(f"Corrupt download \"{filepath}\": {problem}")
+
+    verified = bool(expected_sha256 or total_size)
+    if verified:
+        verified_files.add(filepath.resolve())
+    return verified
+
+def _download_resource(url: str, name: str | None, validator: str | None, cache_key: str, expected_sha256: str | None,
+                       drop_abis: list[str] = None) -> Path:
+    cached = _from_cache(cache_key, validator, Path(name) if name else None, expected_sha256)
+    if cached:
+        return cached
 
-def download_resource(url: str, name: str = None) -> Path:
     res = session.get(url, stream=True)
     res.raise_for_status()
     final_url = res.url
@@ -18,22 +110,91 @@ def download_resource(url: str, name: str = None) -> Path:
     if not name:
         name = utils.extract_filename(res, fallback_url=final_url)
 
+    if not validator:
+        validator = utils.response_validator(res)
+        cached = _from_cache(cache_key, validator, Path(name), expected_sha256)
+        if cached:
+            res.close()
+            return cached
+
     filepath = Path(name)
     total_size = int(res.headers.get('content-length', 0))
+    # Bundles (.xapk, .apkm) are merged by APKEditor first and stripped afterwards
+    strip = bool(drop_abis) and filepath.suffix == ".apk"
+
+    # Segments land out of order, which streaming rewrites cannot take
+    if not strip and transfer.supports_segments(res, total_size):
+        res.close()
+        try:
+            transfer.download_segmented(final_url, filepath, total_size, f"{cache_key}|{validator}" if validator else None)
+            # Segments land out of order, so hash the finished file (still in page cache)
+            with filepath.open("rb") as file:
+                sha256 = hashlib.file_digest(file, "sha256").hexdigest()
+            verified = _verify(filepath, filepath.stat().st_size, total_size, sha256, expected_sha256)
+            artifacts.store(cache_key, validator, filepath, sha256, verified)
+            return filepath
+        except transfer.RangeNotSupported as e:
+            logging.warning(f"{e}, falling back to a single stream")
+            res = session.get(final_url, stream=True)
+            res.raise_for_status()
+
     downloaded_size = 0
+    sha256 = hashlib.sha256()
+    started = time.monotonic()
 
-    with filepath.open("wb") as file:
-        for chunk in res.iter_content(chunk_size=8192):
-            if chunk:
-                file.write(chunk)
-                downloaded_size += len(chunk)
+    # filepath may be a hardlink into the artifact cache: replace it, never write through it
+    tmp_path = filepath.with_name(f".{filepath.name}.{os.getpid()}.download")
+    try:
+        with tmp_path.open("wb") as file:
+            writer = apkzip.StreamRewriter(file, apkzip.abi_filter(drop_abis)) if strip else file
+            try:
+                for chunk in res.iter_content(chunk_size=transfer.chunk_size):
+                    if chunk:
+                        writer.write(chunk)
+                        sha256.update(chunk)
+                        downloaded_size += len(chunk)
+            finally:
+                res.close()
+            result = writer.finish() if strip else None
+        os.replace(tmp_path, filepath)
+    finally:
+        tmp_path.unlink(missing_ok=True)
 
+    throughput = downloaded_size / max(time.monotonic() - started, 1e-6)
     logging.info(
-        f"URL: {final_url} [{downloaded_size}/{total_size}] -> \"{filepath}\" [1]"
+        f"URL: {final_url} [{downloaded_size}/{total_size}] -> \"{filepath}\" [1] "
+        f"{throughput / 1024 / 1024:.2f} MiB/s"
     )
 
+    verified = _verify(filepath, downloaded_size, total_size, sha256.hexdigest(), expected_sha256)
+    if result:
+        logging.info(f"✂️ Stripped {result['dropped']} entries while streaming, wrote {result['size']} bytes")
+        # The cache stores blobs by content, which is no longer what was downloaded
+        with filepath.open("rb") as file:
+            sha256 = hashlib.file_digest(file, "sha256")
+    artifacts.store(cache_key, validator, filepath, sha256.hexdigest(), verified)
     return filepath
 
+def github_asset_validator(asset: dict) -> str:
+    """Cache validator for a GitHub release asset (changes on re-upload)"""
+    return f"github:{asset['id']}:{asset.get('updated_at', '')}"
+
+def download_asset(asset: dict) -> Path:
+    return download_resource(
+        asset["browser_download_url"],
+        name=asset["name"],
+        validator=github_asset_validator(asset),
+        digest=asset.get("digest")
+    )
+
+def download_all(jobs: list) -> list[Path]:
+    """Run download callables concurrently, returning paths in job order"""
+    if not jobs:
+        return []
+    with ThreadPoolExecutor(max_workers=min(download_workers, len(jobs))) as executor:
+        futures = [executor.submit(job) for job in jobs]
+        return [future.result() for future in futures]
+
 def download_required(source: str) -> tuple[list[Path], str]:
     source_path = Path("sources") / f"{source}.json"
     with source_path.open() as json_file:
@@ -45,15 +206,18 @@ def download_required(source: str) -> tuple[list[Path], str]:
     
     # Handle old list format
     name = repos_info[0]["name"]
-    downloaded_files = []
 
-    for repo_info in repos_info[1:]:
-        user = repo_info['user']
+    # Resolve every repo's release at once; order follows the source file
+    with ThreadPoolExecutor(max_workers=download_workers) as executor:
+        releases = list(executor.map(
+            lambda repo_info: utils.detect_github_release(repo_info['user'], repo_info['repo'], repo_info['tag']),
+            repos_info[1:]
+        ))
+
+    selected_assets = {}
+    for repo_info, release in zip(repos_info[1:], releases):
         repo = repo_info['repo']
-        tag = repo_info['tag']
 
-        release = utils.detect_github_release(user, repo, tag)
-        
         # Special handling for Morphe files
         if repo == "morphe-patches" or repo == "morphe-cli":
             for asset in release["assets"]:
@@ -61,16 +225,17 @@ def download_required(source: str) -> tuple[list[Path], str]:
                     continue
                 # Download .mpp patches or morphe-cli.jar
                 if asset["name"].endswith(".mpp") or ("morphe-cli" in asset["name"] and asset["name"].endswith(".jar")):
-                    filepath = download_resource(asset["browser_download_url"])
-                    downloaded_files.append(filepath)
+                    selected_assets.setdefault(asset["name"], asset)
         else:
             # Original logic for ReVanced files
             for asset in release["assets"]:
                 if asset["name"].endswith(".asc"):
                     continue
-                filepath = download_resource(asset["browser_download_url"])
-                downloaded_files.append(filepath)
+                selected_assets.setdefault(asset["name"], asset)
 
+    downloaded_files = download_all([
+        partial(download_asset, asset) for asset in selected_assets.values()
+    ])
     return downloaded_files, name
 
 def download_from_bundle(bundle_info: dict) -> tuple[list[Path], str]:
@@ -79,93 +244,172 @@ def download_from_bundle(bundle_info: dict) -> tuple[list[Path], str]:
     name = bundle_info.get("name", "bundle-patches")
     
     logging.info(f"Downloading bundle from {bundle_url}")
-    
-    # Download the bundle JSON
-    with session.get(bundle_url) as res:
-        res.raise_for_status()
-        bundle_data = res.json()
-    
-    downloaded_files = []
-    
-    # Check API version and structure
-    if "patches" in bundle_data:
-        # API v4 format
-        patches = bundle_data.get("patches", [])
-        integrations = bundle_data.get("integrations", [])
-        
-        # Download patches (JAR files)
-        for patch in patches:
-            if "url" in patch:
-                filepath = download_resource(patch["url"])
-                downloaded_files.append(filepath)
-                logging.info(f"Downloaded patch: {patch.get('name', 'unknown')}")
-        
-        # Download integrations (APK files)
-        for integration in integrations:
-            if "url" in integration:
-                filepath = download_resource(integration["url"])
-                downloaded_files.append(filepath)
-                logging.info(f"Downloaded integration: {integration.get('name', 'unknown')}")
-    
-    # Also download CLI (still needed) - try ReVanced CLI first
+
+    with ThreadPoolExecutor(max_workers=download_workers) as executor:
+        # CLI (still needed) resolves while the bundle JSON downloads - try ReVanced CLI first
+        cli_release = executor.submit(utils.detect_github_release, "revanced", "revanced-cli", "latest")
+
+        # Download the bundle JSON
+        bundle_data = sources_lock.locked_bundle(bundle_url)
+        if bundle_data is None:
+            res = session.get(bundle_url)
+            res.raise_for_status()
+            bundle_data = res.json()
+
+        jobs = []
+
+        # Check API version and structure
+        if "patches" in bundle_data:
+            # API v4 format
+            patches = bundle_data.get("patches", [])
+            integrations = bundle_data.get("integrations", [])
+
+            # Patches (JAR files) then integrations (APK files)
+            for kind, items in (("patch", patches), ("integration", integrations)):
+                for item in items:
+                    if "url" in item:
+                        jobs.append(partial(_download_bundle_item, kind, item))
+
+        try:
+            for asset in cli_release.result()["assets"]:
+                if asset["name"].endswith(".asc"):
+                    continue
+                if asset["name"].endswith(".jar") and "cli" in asset["name"].lower():
+                    jobs.append(partial(_download_cli, asset))
+                    break
+        except Exception as e:
+            logging.warning(f"Could not download ReVanced CLI: {e}")
+
+    downloaded_files = [file for file in download_all(jobs) if file]
+    return downloaded_files, name
+
+def _download_bundle_item(kind: str, item: dict) -> Path:
+    filepath = download_resource(item["url"])
+    logging.info(f"Downloaded {kind}: {item.get('name', 'unknown')}")
+    return filepath
+
+def _download_cli(asset: dict) -> Path | None:
     try:
-        cli_release = utils.detect_github_release("revanced", "revanced-cli", "latest")
-        for asset in cli_release["assets"]:
-            if asset["name"].endswith(".asc"):
-                continue
-            if asset["name"].endswith(".jar") and "cli" in asset["name"].lower():
-                filepath = download_resource(asset["browser_download_url"])
-                downloaded_files.append(filepath)
-                logging.info("Downloaded ReVanced CLI")
-                break
+        filepath = download_asset(asset)
+        logging.info("Downloaded ReVanced CLI")
+        return filepath
     except Exception as e:
         logging.warning(f"Could not download ReVanced CLI: {e}")
-    
-    return downloaded_files, name
+        return None
 
-def download_platform(app_name: str, platform: str, cli: str, patches: str, arch: str = None) -> tuple[Path | None, str | None]:
-    try:
-        config_path = Path("apps") / platform / f"{app_name}.json"
-        if not config_path.exists():
-            raise FileNotFoundError(f"Config file not found: {config_path}")
-
-        with config_path.open() as json_file:
-            config = json.load(json_file)
-        
-        # Override arch if specified
-        if arch:
-            config['arch'] = arch
-
-        version = config.get("version") or utils.get_supported_version(config['package'], cli, patches)
-        platform_module = globals()[platform]
-        version = version or platform_module.get_latest_version(app_name, config)
-        
-        download_link = platform_module.get_download_link(version, app_name, config)
-        filepath = download_resource(download_link)
-        return filepath, version 
+def resolve_platform(app_name: str, platform: str, cli: str, patches: str, arch: str = None, drop_abis: list[str] = None) -> dict:
+    """Find the version and download link (or cached file) on one platform"""
+    config_path = Path("apps") / platform / f"{app_name}.json"
+    if not config_path.exists():
+        raise FileNotFoundError(f"Config file not found: {config_path}")
+
+    with config_path.open() as json_file:
+        config = json.load(json_file)
+
+    # Override arch if specified
+    if arch:
+        config['arch'] = arch
 
+    version = config.get("version") or utils.get_supported_version(config['package'], cli, patches)
+    platform_module = globals()[platform]
+    version = version or platform_module.get_latest_version(app_name, config)
+
+    # Mirror links are signed per request, so key the cache on what they point at
+    cache_key = f"apk://{platform}/{config['package']}/{config.get('type', '')}/{config.get('arch', 'universal')}"
+    resolution = {"platform": platform, "version": version, "cache_key": cache_key, "link": None, "filepath": None,
+                  "drop_abis": drop_abis}
+    if drop_abis:
+        # A stripped download is a different artifact from the whole APK
+        resolution["cache_key"] = f"{cache_key}|strip:{','.join(sorted(drop_abis))}"
+
+    resolution["filepath"] = _from_cache(resolution["cache_key"], version, None)
+    if not resolution["filepath"] and drop_abis:
+        # A cached whole APK works too; the build strips it later
+        resolution["filepath"] = _from_cache(cache_key, version, None)
+    if not resolution["filepath"]:
+        resolution["link"] = platform_module.get_download_link(version, app_name, config)
+        if not resolution["link"]:
+            raise ValueError(f"No download link found on {platform} for {app_name} {version}")
+    return resolution
+
+def _fetch_resolution(app_name: str, resolution: dict) -> Path:
+    if resolution["filepath"]:
+        return resolution["filepath"]
+
+    started = time.monotonic()
+    filepath = download_resource(
+        resolution["link"],
+        validator=resolution["version"],
+        cache_key=resolution["cache_key"],
+        drop_abis=resolution["drop_abis"]
+    )
+    stats.mirrors.record_download(app_name, resolution["platform"], filepath.stat().st_size, time.monotonic() - started)
+    return filepath
+
+def download_platform(app_name: str, platform: str, cli: str, patches: str, arch: str = None,
+                      drop_abis: list[str] = None) -> tuple[Path | None, str | None]:
+    resolution = _timed_resolve(app_name, platform, cli, patches, arch, drop_abis)
+    if not resolution:
+        return None, None
+
+    try:
+        return _fetch_resolution(app_name, resolution), resolution["version"]
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         return None, None
 
-# Update the specific download functions
-def download_apkmirror(app_name: str, cli: str, patches: str, arch: str = None) -> tuple[Path | None, str | None]:
-    return download_platform(app_name, "apkmirror", cli, patches, arch)
+def _timed_resolve(app_name: str, platform: str, cli: str, patches: str, arch: str = None,
+                   drop_abis: list[str] = None) -> dict | None:
+    started = time.monotonic()
+    try:
+        resolution = resolve_platform(app_name, platform, cli, patches, arch, drop_abis)
+    except FileNotFoundError as e:
+        # Not hosted on this platform at all; nothing worth learning
+        logging.info(f"⏱️ {platform}: {e}")
+        return None
+    except Exception as e:
+        latency = time.monotonic() - started
+        logging.info(f"⏱️ {platform}: failed after {latency:.2f}s ({e})")
+        stats.mirrors.record_resolution(app_name, platform, False, latency)
+        return None
 
-def download_apkpure(app_name: str, cli: str, patches: str, arch: str = None) -> tuple[Path | None, str | None]:
-    return download_platform(app_name, "apkpure", cli, patches, arch)
+    latency = time.monotonic() - started
+    logging.info(f"⏱️ {platform}: resolved {app_name} {resolution['version']} in {latency:.2f}s")
+    stats.mirrors.record_resolution(app_name, platform, True, latency)
+    return resolution
 
-def download_aptoide(app_name: str, cli: str, patches: str, arch: str = None) -> tuple[Path | None, str | None]:
-    return download_platform(app_name, "aptoide", cli, patches, arch)
+def download_hedged(app_name: str, platforms: list[str], cli: str, patches: str, arch: str = None,
+                    drop_abis: list[str] = None) -> tuple[Path | None, str | None]:
+    """Resolve on every platform at once and download from the preferred hit.
 
-def download_uptodown(app_name: str, cli: str, patches: str, arch: str = None) -> tuple[Path | None, str | None]:
-    return download_platform(app_name, "uptodown", cli, patches, arch)
+    Platforms keep their priority: a later platform is only used once every
+    earlier one has failed to resolve (or download). Outstanding losers are
+    cancelled; resolutions already running finish in the background.
+    """
+    executor = ThreadPoolExecutor(max_workers=len(platforms))
+    try:
+        futures = [
+            executor.submit(_timed_resolve, app_name, platform, cli, patches, arch, drop_abis)
+            for platform in platforms
+        ]
+        for future in futures:
+            resolution = future.result()
+            if not resolution:
+                continue
+            try:
+                filepath = _fetch_resolution(app_name, resolution)
+                return filepath, resolution["version"]
+            except Exception as e:
+                logging.error(f"Download from {resolution['platform']} failed: {e}")
+        return None, None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 def download_apkeditor() -> Path:
     release = utils.detect_github_release("REAndroid", "APKEditor", "latest")
 
     for asset in release["assets"]:
         if asset["name"].startswith("APKEditor") and asset["name"].endswith(".jar"):
-            return download_resource(asset["browser_download_url"])
+            return download_asset(asset)
 
     raise RuntimeError("APKEditor .jar file not found in the latest release")
@@ -0,0 +1,87 @@
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+from curl_cffi.requests.exceptions import HTTPError
+from src import utils
+
+class FixtureMissing(Exception):
+    pass
+
+class FixtureResponse:
+    """Replayed response with the parts of the curl_cffi Response API we use"""
+
+    replayed = True
+
+    def __init__(self, meta: dict, content: bytes):
+        self.status_code = meta["status"]
+        self.headers = meta["headers"]
+        self.url = meta["url"]
+        self.content = content
+        self.ok = self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            raise HTTPError(f"HTTP Error {self.status_code}: {self.url}", 0, self)
+
+    def iter_content(self, chunk_size: int = 65536):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def close(self) -> None:
+        pass
+
+class HttpFixtures:
+    """Client hook that records responses to disk or replays them.
+
+    Fixtures are keyed by method, URL and request body. Streamed requests
+    (file downloads) are never recorded; everything the scrapers and the
+    GitHub lookups fetch is.
+    """
+
+    def __init__(self, root: Path, mode: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"HTTP_FIXTURES must be record or replay, not {mode}")
+        self.root = root
+        self.mode = mode
+        self._lock = threading.Lock()
+        logging.info(f"📼 HTTP fixtures: {mode} ({root})")
+
+    def _path(self, method: str, url: str, kwargs: dict) -> Path:
+        body = json.dumps(kwargs.get("json"), sort_keys=True) + str(kwargs.get("data"))
+        key = hashlib.sha256(f"{method} {url} {body}".encode()).hexdigest()[:24]
+        return self.root / urlsplit(url).netloc.replace(":", "_") / f"{key}.json"
+
+    def on_request(self, method: str, url: str, kwargs: dict):
+        if self.mode != "replay":
+            return None
+        path = self._path(method, url, kwargs)
+        meta = utils.load_json(path)
+        if meta is None:
+            raise FixtureMissing(f"No fixture for {method} {url}")
+        return FixtureResponse(meta, path.with_suffix(".body").read_bytes())
+
+    def on_response(self, method: str, url: str, kwargs: dict, response) -> None:
+        if self.mode != "record" or kwargs.get("stream"):
+            return
+        path = self._path(method, url, kwargs)
+        meta = {
+            "method": method,
+            "request_url": url,
+            "url": str(response.url),
+            "status": response.status_code,
+            "headers": {k.lower(): v for k, v in response.headers.items()}
+        }
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.with_suffix(".body").write_bytes(response.content)
+            utils.save_json(path, meta)
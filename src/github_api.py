@@ -0,0 +1,95 @@
+import hashlib
+import logging
+import threading
+from urllib.parse import urlencode
+from src import cache_dir, github_token, session, utils
+
+API_URL = "https://api.github.com"
+RELEASES_PER_PAGE = 50
+
+class ConditionalCache:
+    """On-disk ETag cache for GitHub API responses.
+
+    Revalidating with If-None-Match turns unchanged responses into 304s,
+    which GitHub does not count against the rate limit. Responses are also
+    memoised for the lifetime of the process.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._memo = {}
+        self._lock = threading.Lock()
+        self.revalidated = 0
+        self.fetched = 0
+
+    def _path(self, url: str):
+        return self.root / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+
+    def get_json(self, url: str):
+        with self._lock:
+            if url in self._memo:
+                return self._memo[url]
+
+        headers = {
+            "Accept": "application/vnd.github+json",
+            "X-GitHub-Api-Version": "2022-11-28"
+        }
+        if github_token:
+            headers["Authorization"] = f"Bearer {github_token}"
+
+        cached = utils.load_json(self._path(url))
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+
+        response = session.get(url, headers=headers)
+        if response.status_code == 304 and cached:
+            data = cached["data"]
+            self.revalidated += 1
+            logging.debug(f"GitHub API 304: {url}")
+        else:
+            response.raise_for_status()
+            data = response.json()
+            self.fetched += 1
+            if response.headers.get("etag"):
+                utils.save_json(self._path(url), {"etag": response.headers["etag"], "data": data})
+
+        with self._lock:
+            self._memo[url] = data
+        return data
+
+responses = ConditionalCache(cache_dir / "github")
+
+def get_latest_release(user: str, repo: str) -> dict:
+    return responses.get_json(f"{API_URL}/repos/{user}/{repo}/releases/latest")
+
+def get_release_by_tag(user: str, repo: str, tag: str) -> dict:
+    return responses.get_json(f"{API_URL}/repos/{user}/{repo}/releases/tags/{tag}")
+
+def iter_release_pages(user: str, repo: str):
+    page = 1
+    while True:
+        query = urlencode({"per_page": RELEASES_PER_PAGE, "page": page})
+        releases = responses.get_json(f"{API_URL}/repos/{user}/{repo}/releases?{query}")
+        if releases:
+            yield releases
+        if len(releases) < RELEASES_PER_PAGE:
+            return
+        page += 1
+
+def find_newest_release(user: str, repo: str, predicate) -> dict | None:
+    """Newest release (by created_at) matching predicate.
+
+    GitHub lists releases newest first, so paging stops as soon as a page
+    reaches releases older than the best candidate found so far instead of
+    walking the repository's whole history.
+    """
+    best = None
+    for releases in iter_release_pages(user, repo):
+        for release in releases:
+            if predicate(release) and (best is None or release["created_at"] > best["created_at"]):
+                best = release
+
+        oldest = min(release["created_at"] for release in releases)
+        if best is not None and oldest < best["created_at"]:
+            break
+    return best
@@ -0,0 +1,140 @@
+import time
+import logging
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+from curl_cffi import CurlInfo
+
+# CDN headers that say whether a response came from an edge cache
+CDN_CACHE_HEADERS = ("cf-cache-status", "x-cache", "x-cache-status")
+
+class NetworkRecorder:
+    """Client hook recording every request for the run's network report.
+
+    Each record has method, host, URL, status, bytes, time queued in the
+    client's throttle, time to first byte, total time and cache status.
+    Timings start once the request leaves the queue; streamed bodies are
+    measured as they are consumed. Time to first byte comes from curl, or
+    from when headers arrived for streamed requests; it is None when
+    neither is known (replayed fixtures).
+    """
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def on_request(self, method: str, url: str, kwargs: dict):
+        self._local.queued = time.perf_counter()
+        self._local.started = None
+        return None
+
+    def on_send(self, method: str, url: str, kwargs: dict) -> None:
+        self._local.started = time.perf_counter()
+
+    def on_response(self, method: str, url: str, kwargs: dict, response) -> None:
+        now = time.perf_counter()
+        queued = getattr(self._local, "queued", None) or now
+        # Without a throttle (or for replayed fixtures) there is no send event
+        started = getattr(self._local, "started", None) or queued
+        # A non-streamed response arrives whole, so only curl knows when its first byte did
+        ttfb = getattr(response, "infos", {}).get(CurlInfo.STARTTRANSFER_TIME)
+        if ttfb is None and kwargs.get("stream"):
+            ttfb = now - started
+        record = {
+            "method": method,
+            "host": urlsplit(url).netloc.lower(),
+            "url": url,
+            "status": response.status_code,
+            "bytes": 0,
+            "queued": started - queued,
+            "ttfb": ttfb,
+            "total": now - started,
+            "cache": _cache_status(response)
+        }
+        with self._lock:
+            self.records.append(record)
+
+        if not kwargs.get("stream"):
+            record["bytes"] = len(response.content)
+            return
+
+        iter_content = response.iter_content
+        def measured_iter_content(*args, **kw):
+            try:
+                for chunk in iter_content(*args, **kw):
+                    record["bytes"] += len(chunk)
+                    yield chunk
+            finally:
+                record["total"] = time.perf_counter() - started
+        response.iter_content = measured_iter_content
+
+    def report(self, top: int = 10) -> dict:
+        with self._lock:
+            records = list(self.records)
+
+        hosts = {}
+        for record in records:
+            host = hosts.setdefault(
+                record["host"], {"requests": 0, "bytes": 0, "seconds": 0.0, "queued_seconds": 0.0, "statuses": {}}
+            )
+            host["requests"] += 1
+            host["bytes"] += record["bytes"]
+            host["seconds"] += record["total"]
+            host["queued_seconds"] += record["queued"]
+            status = str(record["status"])
+            host["statuses"][status] = host["statuses"].get(status, 0) + 1
+
+        not_found = [record for record in records if record["status"] == 404]
+        return {
+            "requests": len(records),
+            "bytes": sum(record["bytes"] for record in records),
+            "seconds": sum(record["total"] for record in records),
+            "queued_seconds": sum(record["queued"] for record in records),
+            "cache": _count(record["cache"] or "none" for record in records),
+            "top_hosts": sorted(
+                ({"host": name, **host} for name, host in hosts.items()),
+                key=lambda host: host["seconds"],
+                reverse=True
+            )[:top],
+            "slowest": sorted(records, key=lambda record: record["total"], reverse=True)[:top],
+            "wasted_404s": {
+                "requests": len(not_found),
+                "seconds": sum(record["total"] for record in not_found),
+                "by_host": _count(record["host"] for record in not_found),
+                "urls": [record["url"] for record in not_found]
+            }
+        }
+
+    def write_report(self, path: Path) -> None:
+        # Late import; this module loads while src.session is still being built
+        from src import utils
+        report = self.report()
+        utils.save_json(path, report)
+
+        logging.info(
+            f"🌐 {report['requests']} requests, {report['bytes'] / 1048576:.1f} MiB, "
+            f"{report['seconds']:.1f}s on the wire, {report['queued_seconds']:.1f}s throttled "
+            f"({report['wasted_404s']['requests']} 404s) -> {path}"
+        )
+        for host in report["top_hosts"][:5]:
+            logging.info(f"🌐   {host['host']}: {host['requests']} requests, {host['seconds']:.1f}s")
+
+def _cache_status(response) -> str | None:
+    if getattr(response, "replayed", False):
+        return "fixture"
+    if response.status_code == 304:
+        return "revalidated"
+    for header in CDN_CACHE_HEADERS:
+        value = response.headers.get(header)
+        if value:
+            return value.lower()
+    return None
+
+def _count(values) -> dict:
+    counts = {}
+    for value in values:
+        counts[value] = counts.get(value, 0) + 1
+    return counts
+
+recorder = NetworkRecorder()
@@ -0,0 +1,52 @@
+import os
+import re
+import html
+import time
+import threading
+from bs4 import BeautifulSoup, SoupStrainer
+
+# lxml is much faster than the stdlib parser; use it when installed
+try:
+    import lxml  # noqa: F401
+    default_features = "lxml"
+except ImportError:
+    default_features = "html.parser"
+
+features = os.getenv("HTML_PARSER", default_features)
+
+# Comments and script/style bodies are not page text (matches soup.get_text())
+_HIDDEN = re.compile(rb"<!--.*?-->|<(script|style)\b[^>]*>.*?</\1\s*>", re.DOTALL | re.IGNORECASE)
+_TAG = re.compile(rb"<[^>]*>")
+
+_lock = threading.Lock()
+parse_seconds = 0.0
+parse_count = 0
+
+def _timed(function, *args, **kwargs):
+    global parse_seconds, parse_count
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed = time.perf_counter() - started
+    with _lock:
+        parse_seconds += elapsed
+        parse_count += 1
+    return result
+
+def parse(content: bytes, name=None, **attrs) -> BeautifulSoup:
+    """Build a tree of only the elements matching name/attrs.
+
+    Everything outside the matching elements is discarded while parsing,
+    so large pages cost a fraction of a full BeautifulSoup tree.
+    """
+    strainer = SoupStrainer(name, **attrs) if name or attrs else None
+    return _timed(BeautifulSoup, content, features, parse_only=strainer)
+
+def find(content: bytes, name=None, **attrs):
+    """First element matching name/attrs, parsing nothing else"""
+    return parse(content, name, **attrs).find(name, **attrs)
+
+def page_text(content: bytes) -> str:
+    """Text of a page without building a tree (like soup.get_text())"""
+    def strip(data):
+        return html.unescape(_TAG.sub(b"", _HIDDEN.sub(b"", data)).decode("utf-8", "replace"))
+    return _timed(strip, content)
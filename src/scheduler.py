@@ -0,0 +1,163 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from src import utils
+
+# JVM footprint beyond the heap (metaspace, code cache, thread stacks)
+JVM_OVERHEAD = 1.3
+MIN_HEAP_MB = 1024
+MAX_HEAP_MB = int(os.getenv("JVM_MAX_HEAP_MB", "6144"))
+# Heap per MiB of input APK; patching resolves every class of the dex files
+HEAP_PER_APK_MB = float(os.getenv("JVM_HEAP_PER_APK_MB", "12"))
+# Reservation for tools we do not size (apksigner, zipalign)
+DEFAULT_JOB_MB = 512
+
+def _meminfo_mb(field: str, default: int) -> int:
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return default
+
+def mem_available_mb() -> int:
+    """MemAvailable from /proc/meminfo, in MiB"""
+    return _meminfo_mb("MemAvailable", 4096)
+
+def default_heap_mb() -> int:
+    """Max heap a JVM picks without -Xmx: a quarter of physical memory"""
+    return _meminfo_mb("MemTotal", 16384) // 4
+
+def heap_for(apk: Path) -> int:
+    """Smallest -Xmx in MiB a JVM working on apk is capped to when memory is tight"""
+    apk_mb = apk.stat().st_size / 1048576 if apk.exists() else 0
+    return int(min(MAX_HEAP_MB, max(MIN_HEAP_MB, 512 + apk_mb * HEAP_PER_APK_MB)))
+
+def _process_start(pid: int) -> int | None:
+    """Start time of pid in clock ticks, which tells a reused pid apart"""
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            # Field 22; the command name before it may contain spaces
+            return int(stat.read().rsplit(")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+class JobScheduler:
+    """Admits heavy build processes only while their memory and cores fit.
+
+    Each job reserves memory in a JSON file shared by every build process
+    on the machine, under the pid of the process that runs it. A JVM
+    reserves its default heap (plus overhead) and starts without -Xmx when
+    that fits in `memory_fraction` of available memory (plus what running
+    jobs already took from it) and fewer jobs than cores are running. When
+    only a smaller heap fits, it starts capped to what is left, but never
+    below heap_for(input_apk). A job is always admitted with its full
+    reservation when nothing else runs.
+    """
+
+    def __init__(self, state_path: Path, memory_fraction: float, cores: int):
+        self.state_path = state_path
+        self.lock_path = state_path.with_name(f"{state_path.name}.lock")
+        self.memory_fraction = memory_fraction
+        self.cores = cores
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _alive(self, pid: int, started: int | None) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        # A dead build's pid may have been reused by an unrelated process
+        return started is None or _process_start(pid) in (None, started)
+
+    def _load(self) -> dict:
+        """Reservations by pid, without those of processes that died without releasing"""
+        processes = utils.load_json(self.state_path, {})
+        return {
+            pid: process for pid, process in processes.items()
+            if process.get("jobs") and self._alive(int(pid), process.get("started"))
+        }
+
+    def _try_admit(self, job_id: str, memory_mb: int, min_memory_mb: int = None) -> int | None:
+        """Reserve memory_mb (or at least min_memory_mb) for job_id; the MiB reserved, or None"""
+        with self._lock, utils.file_lock(self.lock_path):
+            processes = self._load()
+            jobs = [job for process in processes.values() for job in process["jobs"].values()]
+
+            available = mem_available_mb()
+            reserved = sum(job["memory_mb"] for job in jobs)
+            # Memory running jobs already took out of MemAvailable counts towards their reservation
+            baseline = max((job["available_mb"] for job in jobs), default=available)
+            used = min(reserved, max(0, baseline - available))
+            headroom = int((available + used) * self.memory_fraction - reserved)
+
+            granted = None
+            if not jobs or (len(jobs) < self.cores and memory_mb <= headroom):
+                granted = memory_mb
+            elif len(jobs) < self.cores and min_memory_mb is not None and min_memory_mb <= headroom:
+                granted = headroom
+
+            if granted is not None:
+                process = processes.setdefault(str(os.getpid()), {"started": _process_start(os.getpid()), "jobs": {}})
+                process["jobs"][job_id] = {"memory_mb": granted, "available_mb": available}
+            utils.save_json(self.state_path, processes)
+            return granted
+
+    def _release(self, job_id: str) -> None:
+        with self._lock, utils.file_lock(self.lock_path):
+            processes = self._load()
+            process = processes.get(str(os.getpid()))
+            if process:
+                process["jobs"].pop(job_id, None)
+                if not process["jobs"]:
+                    del processes[str(os.getpid())]
+            utils.save_json(self.state_path, processes)
+
+    def run(self, command: list[str], input_apk: Path | None = None, **kwargs):
+        """utils.run_process once admitted; java gets -Xmx only when its default heap does not fit"""
+        command = list(command)
+        java = command[0] == "java"
+        memory_mb = min_memory_mb = DEFAULT_JOB_MB
+        if java:
+            memory_mb = int(default_heap_mb() * JVM_OVERHEAD)
+            min_memory_mb = memory_mb
+            if input_apk is not None:
+                min_memory_mb = min(memory_mb, int(heap_for(input_apk) * JVM_OVERHEAD))
+
+        with self._lock:
+            self._next_id += 1
+            job_id = str(self._next_id)
+
+        waiting = False
+        while (granted := self._try_admit(job_id, memory_mb, min_memory_mb)) is None:
+            if not waiting:
+                target = f" on {input_apk.name}" if input_apk else ""
+                logging.info(f"⏳ Waiting for {min_memory_mb} MiB to start {Path(command[0]).name}{target}...")
+                waiting = True
+            time.sleep(1.0)
+
+        if java and granted < memory_mb:
+            heap_mb = int(granted / JVM_OVERHEAD)
+            command.insert(1, f"-Xmx{heap_mb}m")
+            target = f" on {input_apk.name}" if input_apk else ""
+            logging.info(f"🧠 Capping JVM heap at {heap_mb} MiB{target} to fit next to running jobs")
+
+        try:
+            return utils.run_process(command, **kwargs)
+        finally:
+            self._release(job_id)
+
+# Not under cache_dir: reservations must not outlive the machine's processes
+jobs = JobScheduler(
+    Path(os.getenv("JOB_STATE_DIR", tempfile.gettempdir())) / "apk-build-jobs.json",
+    memory_fraction=float(os.getenv("JOB_MEMORY_FRACTION", "0.8")),
+    cores=int(os.getenv("JOB_SLOTS", str(os.cpu_count() or 2)))
+)
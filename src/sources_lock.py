@@ -0,0 +1,248 @@
+import os
+import json
+import logging
+from pathlib import Path
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from src import github_token, session, utils
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+# Repositories per GraphQL query; keeps each query well under the node limit
+GRAPHQL_BATCH = 20
+RELEASES_WINDOW = 50
+
+# Extra tools fetched by run_build outside of sources/*.json
+EXTRA_REPOS = [("REAndroid", "APKEditor", "latest")]
+BUNDLE_CLI = ("revanced", "revanced-cli", "latest")
+
+# databaseId and digest match the REST asset id and digest; if the schema
+# rejects them, batches are retried with the node id and no digest
+ASSET_FIELDS = "databaseId name size downloadUrl updatedAt digest"
+BASIC_ASSET_FIELDS = "id name size downloadUrl updatedAt"
+
+RELEASE_FRAGMENT = """
+fragment rel on Release {
+  tagName
+  name
+  isPrerelease
+  isDraft
+  createdAt
+  releaseAssets(first: 100) {
+    nodes { %s }
+  }
+}
+"""
+
+class GraphQLSchemaError(Exception):
+    pass
+
+def lock_key(user: str, repo: str, tag: str) -> str:
+    return f"{user}/{repo}@{tag}"
+
+def collect_sources(sources_dir: Path = Path("sources")) -> tuple[list[tuple[str, str, str]], list[str]]:
+    """Every (user, repo, tag) and bundle URL referenced by sources/*.json"""
+    repos = []
+    bundles = []
+    for source_path in sorted(sources_dir.glob("*.json")):
+        with source_path.open() as json_file:
+            repos_info = json.load(json_file)
+
+        if isinstance(repos_info, dict) and "bundle_url" in repos_info:
+            bundles.append(repos_info["bundle_url"])
+            repos.append(BUNDLE_CLI)
+            continue
+
+        for repo_info in repos_info[1:]:
+            repos.append((repo_info['user'], repo_info['repo'], repo_info['tag']))
+
+    repos.extend(EXTRA_REPOS)
+    return list(dict.fromkeys(repos)), list(dict.fromkeys(bundles))
+
+def _release_from_graphql(node: dict) -> dict:
+    """Reshape a GraphQL Release into the REST fields the builder reads"""
+    return {
+        "tag_name": node["tagName"],
+        "name": node["name"],
+        "prerelease": node["isPrerelease"],
+        "draft": node["isDraft"],
+        "created_at": node["createdAt"],
+        "assets": [
+            {
+                "id": asset.get("databaseId") or asset["id"],
+                "name": asset["name"],
+                "size": asset["size"],
+                "browser_download_url": asset["downloadUrl"],
+                "updated_at": asset["updatedAt"],
+                "digest": asset.get("digest")
+            }
+            for asset in node["releaseAssets"]["nodes"]
+        ]
+    }
+
+def _select_release(releases: list[dict], tag: str) -> dict | None:
+    # Same selection rules as utils.detect_github_release
+    if tag == "dev":
+        releases = [r for r in releases if 'dev' in r["tag_name"].lower()]
+    elif tag == "prerelease":
+        releases = [r for r in releases if r["prerelease"]]
+    return max(releases, key=lambda r: r["created_at"], default=None)
+
+def _graphql_field(user: str, repo: str, tag: str) -> str:
+    owner = json.dumps(user)
+    name = json.dumps(repo)
+    if tag == "latest":
+        selection = "latestRelease { ...rel }"
+    elif tag in ["", "dev", "prerelease"]:
+        selection = f"releases(first: {RELEASES_WINDOW}, orderBy: {{field: CREATED_AT, direction: DESC}}) {{ nodes {{ ...rel }} }}"
+    else:
+        selection = f"release(tagName: {json.dumps(tag)}) {{ ...rel }}"
+    return f"repository(owner: {owner}, name: {name}) {{ {selection} }}"
+
+def _resolve_graphql_batch(batch: list[tuple[str, str, str]], asset_fields: str = ASSET_FIELDS) -> dict:
+    fields = "\n".join(f"r{i}: {_graphql_field(*repo)}" for i, repo in enumerate(batch))
+    query = f"query {{\n{fields}\n}}\n{RELEASE_FRAGMENT % asset_fields}"
+
+    response = session.post(
+        GRAPHQL_URL,
+        json={"query": query},
+        headers={"Authorization": f"Bearer {github_token}"}
+    )
+    response.raise_for_status()
+    payload = response.json()
+    errors = payload.get("errors") or []
+    # GraphQL reports problems with HTTP 200; a missing repo only nulls its alias
+    for error in errors:
+        logging.warning(f"GraphQL error: {error.get('message', error)}")
+    if any((error.get("extensions") or {}).get("code") == "undefinedField" for error in errors):
+        raise GraphQLSchemaError(errors[0].get("message", "Unknown field"))
+    if errors and not payload.get("data"):
+        raise RuntimeError(errors[0].get("message", "GraphQL error"))
+
+    resolved = {}
+    for i, (user, repo, tag) in enumerate(batch):
+        repository = (payload.get("data") or {}).get(f"r{i}")
+        if not repository:
+            continue
+        if tag == "latest":
+            node = repository.get("latestRelease")
+            release = _release_from_graphql(node) if node else None
+        elif tag in ["", "dev", "prerelease"]:
+            nodes = repository["releases"]["nodes"]
+            release = _select_release([_release_from_graphql(node) for node in nodes], tag)
+        else:
+            node = repository.get("release")
+            release = _release_from_graphql(node) if node else None
+        if release:
+            resolved[lock_key(user, repo, tag)] = release
+    return resolved
+
+def resolve_releases(repos: list[tuple[str, str, str]]) -> dict:
+    """Resolve all repos, batched over GraphQL when a token is available.
+
+    Anything GraphQL could not answer (no token, errors, a matching release
+    outside the first RELEASES_WINDOW) is resolved over REST concurrently.
+    """
+    resolved = {}
+    if github_token:
+        asset_fields = ASSET_FIELDS
+        for start in range(0, len(repos), GRAPHQL_BATCH):
+            batch = repos[start:start + GRAPHQL_BATCH]
+            try:
+                try:
+                    resolved.update(_resolve_graphql_batch(batch, asset_fields))
+                except GraphQLSchemaError:
+                    asset_fields = BASIC_ASSET_FIELDS
+                    logging.warning("Retrying GraphQL without asset databaseId/digest")
+                    resolved.update(_resolve_graphql_batch(batch, asset_fields))
+            except Exception as e:
+                logging.warning(f"GraphQL batch failed, falling back to REST: {e}")
+
+    remaining = [repo for repo in repos if lock_key(*repo) not in resolved]
+    if github_token:
+        logging.info(f"🔒 GraphQL resolved {len(repos) - len(remaining)}/{len(repos)} repos, {len(remaining)} left for REST")
+    if remaining:
+        def resolve(repo):
+            try:
+                return utils.detect_github_release(*repo)
+            except Exception as e:
+                logging.error(f"Could not lock {lock_key(*repo)}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for repo, release in zip(remaining, executor.map(resolve, remaining)):
+                if release:
+                    resolved[lock_key(*repo)] = release
+
+    return resolved
+
+def _trim_release(release: dict) -> dict:
+    return {
+        "tag_name": release["tag_name"],
+        "prerelease": release.get("prerelease", False),
+        "created_at": release.get("created_at"),
+        "assets": [
+            {
+                "id": asset["id"],
+                "name": asset["name"],
+                "size": asset.get("size"),
+                "browser_download_url": asset["browser_download_url"],
+                "updated_at": asset.get("updated_at"),
+                "digest": asset.get("digest")
+            }
+            for asset in release["assets"]
+        ]
+    }
+
+def write_lockfile(path: Path) -> dict:
+    repos, bundle_urls = collect_sources()
+    logging.info(f"Locking {len(repos)} repositories and {len(bundle_urls)} bundle(s)")
+
+    releases = resolve_releases(repos)
+
+    bundles = {}
+    for bundle_url in bundle_urls:
+        try:
+            response = session.get(bundle_url)
+            response.raise_for_status()
+            bundles[bundle_url] = response.json()
+        except Exception as e:
+            logging.error(f"Could not lock bundle {bundle_url}: {e}")
+
+    lock = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "releases": {key: _trim_release(release) for key, release in sorted(releases.items())},
+        "bundles": bundles
+    }
+    utils.save_json(path, lock)
+
+    for key, release in lock["releases"].items():
+        logging.info(f"🔒 {key} -> {release['tag_name']}")
+    logging.info(f"Wrote {path} ({len(lock['releases'])}/{len(repos)} releases)")
+    return lock
+
+_lock_path = os.getenv("SOURCES_LOCK")
+_lock = None
+
+def _load() -> dict | None:
+    global _lock
+    if _lock is None and _lock_path:
+        _lock = utils.load_json(Path(_lock_path))
+        if _lock is None:
+            raise FileNotFoundError(f"SOURCES_LOCK points at a missing lockfile: {_lock_path}")
+        logging.info(f"Using sources lockfile {_lock_path} from {_lock['generated_at']}")
+    return _lock
+
+def locked_release(user: str, repo: str, tag: str) -> dict | None:
+    lock = _load()
+    if not lock:
+        return None
+    release = lock["releases"].get(lock_key(user, repo, tag))
+    if release is None:
+        logging.warning(f"{lock_key(user, repo, tag)} missing from lockfile, querying GitHub")
+    return release
+
+def locked_bundle(bundle_url: str) -> dict | None:
+    lock = _load()
+    if not lock:
+        return None
+    return lock["bundles"].get(bundle_url)
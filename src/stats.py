@@ -0,0 +1,82 @@
+import os
+import random
+import logging
+from pathlib import Path
+from src import cache_dir
+from src.cache import JsonStore
+
+# Weight of the newest sample in the latency/throughput moving averages
+EWMA_ALPHA = 0.3
+
+class MirrorStats:
+    """Persisted per (app, platform) success rate, latency and throughput.
+
+    Used to try the platforms that actually host an app first instead of
+    paying for scrapers that always fail for it.
+    """
+
+    def __init__(self, path: Path, exploration: float = 0.1):
+        self.store = JsonStore(path)
+        self.exploration = exploration
+
+    def _update(self, app_name: str, platform: str, update) -> None:
+        def apply(data):
+            update(data.setdefault(app_name, {}).setdefault(platform, {
+                "attempts": 0,
+                "successes": 0,
+                "latency": None,
+                "throughput": None
+            }))
+        self.store.update(apply)
+
+    def record_resolution(self, app_name: str, platform: str, success: bool, latency: float) -> None:
+        def update(entry):
+            entry["attempts"] += 1
+            entry["successes"] += int(success)
+            entry["latency"] = _ewma(entry["latency"], latency)
+        self._update(app_name, platform, update)
+
+    def record_download(self, app_name: str, platform: str, size: int, seconds: float) -> None:
+        def update(entry):
+            entry["throughput"] = _ewma(entry["throughput"], size / max(seconds, 1e-6))
+        self._update(app_name, platform, update)
+
+    def order(self, app_name: str, platforms: list[str]) -> list[str]:
+        """Reorder platforms by smoothed success rate, then speed.
+
+        Among equally reliable platforms the one that downloaded fastest
+        wins, then the one that resolved fastest. Platforms without history
+        keep their configured position relative to each other. With
+        probability `exploration` a random non-leading platform is promoted
+        so stale statistics get refreshed.
+        """
+        app_stats = self.store.read().get(app_name, {})
+        if not app_stats:
+            return list(platforms)
+
+        def score(platform):
+            entry = app_stats.get(platform)
+            if not entry:
+                return (-0.5, 0.0, 0.0)
+            success_rate = (entry["successes"] + 1) / (entry["attempts"] + 2)
+            return (-success_rate, -(entry["throughput"] or 0.0), entry["latency"] or 0.0)
+
+        ordered = sorted(platforms, key=score)
+        if len(ordered) > 1 and random.random() < self.exploration:
+            explored = ordered.pop(random.randrange(1, len(ordered)))
+            ordered.insert(0, explored)
+            logging.info(f"Exploring {explored} first for {app_name}")
+
+        if ordered != list(platforms):
+            logging.info(f"Platform order for {app_name}: {', '.join(ordered)}")
+        return ordered
+
+def _ewma(previous: float | None, sample: float) -> float:
+    if previous is None:
+        return sample
+    return EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * previous
+
+mirrors = MirrorStats(
+    cache_dir / "mirror-stats.json",
+    exploration=float(os.getenv("MIRROR_EXPLORATION", "0.1"))
+)
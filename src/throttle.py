@@ -0,0 +1,104 @@
+import time
+import logging
+import threading
+from pathlib import Path
+
+# Cloudflare and friends answer throttled clients with these
+THROTTLE_STATUSES = {403, 429}
+CHALLENGE_MARKERS = (b"challenge-platform", b"cf-chl", b"Just a moment...")
+
+class AimdController:
+    """Additive-increase/multiplicative-decrease limits per host.
+
+    Every host starts at `initial` concurrent requests and no delay between
+    them. Each healthy response adds roughly one slot per window of
+    requests and shortens the delay; a 403/429 or challenge page halves
+    the concurrency and doubles the delay. With a state_dir the limit and
+    pacing are shared by every process on the machine through a locked
+    JSON file per host; concurrency slots are counted per process.
+    """
+
+    def __init__(self, initial: float, max_concurrency: float, max_interval: float, state_dir: Path | None = None):
+        self.initial = initial
+        self.max_concurrency = max_concurrency
+        self.max_interval = max_interval
+        self.state_dir = state_dir
+        self._states = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _default(self) -> dict:
+        return {"limit": self.initial, "interval": 0.0, "next_start": 0.0}
+
+    def _update(self, host: str, update) -> dict:
+        """Apply update to the host's state (shared or in-process) and return a copy"""
+        if self.state_dir is None:
+            with self._lock:
+                state = self._states.setdefault(host, self._default())
+                update(state)
+                return dict(state)
+
+        # Imported here: src.utils needs the shared session, which needs this module
+        from src import utils
+        path = self.state_dir / f"{host.replace(':', '_')}.json"
+        with self._lock, utils.file_lock(path.with_name(f"{path.name}.lock")):
+            state = utils.load_json(path) or self._default()
+            update(state)
+            utils.save_json(path, state)
+            return state
+
+    def _host(self, host: str) -> dict:
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = {"in_flight": 0, "limit": self.initial, "cond": threading.Condition()}
+            return self._hosts[host]
+
+    def acquire(self, host: str) -> None:
+        """Block until host has a free slot and its pacing allows another request"""
+        slots = self._host(host)
+        with slots["cond"]:
+            slots["cond"].wait_for(lambda: slots["in_flight"] < max(1, int(slots["limit"])))
+            slots["in_flight"] += 1
+
+        reserved = {}
+        def reserve(state):
+            reserved["start"] = max(time.time(), state["next_start"])
+            state["next_start"] = reserved["start"] + state["interval"]
+        self._update(host, reserve)
+        delay = reserved["start"] - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def release(self, host: str, throttled: bool, retry_after: float | None = None, failed: bool = False) -> None:
+        """Return host's slot and adjust its limits from the response (none if failed)"""
+        def feedback(state):
+            if failed:
+                return
+            if throttled:
+                state["limit"] = max(1.0, state["limit"] / 2)
+                state["interval"] = min(self.max_interval, max(state["interval"] * 2, 0.5))
+                state["next_start"] = max(state["next_start"], time.time() + (retry_after or state["interval"]))
+            else:
+                state["limit"] = min(self.max_concurrency, state["limit"] + 1 / state["limit"])
+                state["interval"] = state["interval"] * 0.9 if state["interval"] > 0.05 else 0.0
+        state = self._update(host, feedback)
+        if throttled:
+            logging.warning(
+                f"🐢 {host} is throttling: {state['limit']:.1f} concurrent, {state['interval']:.2f}s apart"
+            )
+
+        slots = self._host(host)
+        with slots["cond"]:
+            slots["in_flight"] -= 1
+            slots["limit"] = state["limit"]
+            slots["cond"].notify_all()
+
+def is_throttled(response, streamed: bool) -> bool:
+    if response.status_code in THROTTLE_STATUSES:
+        return True
+    if response.headers.get("cf-mitigated") == "challenge":
+        return True
+    # Challenge pages can come back as 503; only peek at bodies already read
+    return not streamed and response.status_code == 503 and any(
+        marker in response.content[:65536] for marker in CHALLENGE_MARKERS
+    )
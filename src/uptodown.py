@@ -1,95 +1,237 @@
-import logging 
-from src import session 
-from bs4 import BeautifulSoup
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src import session, parser, cache_dir, utils
+from src.cache import JsonStore
 
-def get_latest_version(app_name: str, config: dict) -> str:
-    # Generate all possible Uptodown names
+# Cap on simultaneous slug probes against Uptodown
+probe_workers = int(os.getenv("UPTODOWN_CONCURRENCY", "6"))
+
+# Versions API pages fetched ahead concurrently while walking the list
+readahead = int(os.getenv("UPTODOWN_READAHEAD", "4"))
+
+# package -> {"slug", "data_code"}, persisted between runs
+slugs = JsonStore(cache_dir / "uptodown-slugs.json")
+# data-code -> {"versions": {version: [versionURL, ...]}, "next_page": int | None}
+version_indexes = JsonStore(cache_dir / "uptodown-versions.json")
+_resolved = {}
+_resolve_locks = {}
+_resolved_lock = threading.Lock()
+
+def _versions_url(slug: str) -> str:
+    return f"https://{slug}.en.uptodown.com/android/versions"
+
+def _probe_slug(slug: str) -> tuple[bytes, str] | None:
+    """Versions page and data-code if slug is a real Uptodown app page"""
+    url = _versions_url(slug)
+    try:
+        response = session.get(url)
+    except Exception as e:
+        logging.debug(f"Failed for {url}: {str(e)[:50]}...")
+        return None
+
+    if response.status_code != 200:
+        logging.debug(f"✗ Not found: {url}")
+        return None
+    app_name_tag = parser.find(response.content, 'h1', id='detail-app-name')
+    if not app_name_tag or not app_name_tag.get('data-code'):
+        return None
+    return response.content, app_name_tag['data-code']
+
+def _discover_slug(app_name: str, config: dict) -> tuple[str, bytes, str] | None:
     possible_names = generate_possible_uptodown_names(config)
-    
     logging.info(f"Trying {len(possible_names)} possible Uptodown names for {app_name}")
-    
-    for uptodown_name in possible_names:
-        url = f"https://{uptodown_name}.en.uptodown.com/android/versions"
-        try:
-            response = session.get(url)
-            if response.status_code == 200:
-                content_size = len(response.content)
-                logging.info(f"✓ Found: {response.url}")
-                soup = BeautifulSoup(response.content, "html.parser")
-                version_spans = soup.select('#versions-items-list .version')
-                versions = [span.text for span in version_spans]
-                
-                if versions:
-                    highest_version = max(versions)
-                    logging.info(f"Found version {highest_version} for {app_name}")
-                    return highest_version
-            elif response.status_code == 404:
-                logging.debug(f"✗ Not found: {url}")
-                continue
+
+    # Probe concurrently, but take the most likely valid candidate
+    executor = ThreadPoolExecutor(max_workers=probe_workers)
+    try:
+        futures = [executor.submit(_probe_slug, slug) for slug in possible_names]
+        for slug, future in zip(possible_names, futures):
+            result = future.result()
+            if result:
+                return slug, *result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return None
+
+def resolve_app(app_name: str, config: dict, need_page: bool = False) -> dict | None:
+    """Uptodown slug and data-code for an app, with its versions page if asked.
+
+    The result is remembered per package for the rest of the run and on
+    disk, so later lookups skip candidate probing entirely.
+    """
+    package = config['package']
+    with _resolved_lock:
+        key_lock = _resolve_locks.setdefault(package, threading.Lock())
+
+    with key_lock:
+        app = _resolved.get(package)
+        if app is None:
+            app = slugs.read().get(package)
+            if app:
+                app = _resolved[package] = dict(app, page=None)
+
+        if app and need_page and app["page"] is None:
+            result = _probe_slug(app["slug"])
+            if result:
+                app["page"], app["data_code"] = result
             else:
-                response.raise_for_status()
-        except Exception as e:
-            logging.debug(f"Failed for {url}: {str(e)[:50]}...")
+                logging.warning(f"Cached Uptodown slug {app['slug']} for {package} is stale")
+                app = None
+
+        if app is None:
+            discovered = _discover_slug(app_name, config)
+            if not discovered:
+                _forget(package)
+                return None
+            slug, page, data_code = discovered
+            app = _resolved[package] = {"slug": slug, "data_code": data_code, "page": page}
+            logging.info(f"✓ Found: {_versions_url(slug)}")
+
+        _remember(package, app)
+        return app
+
+def _remember(package: str, app: dict) -> None:
+    entry = {"slug": app["slug"], "data_code": app["data_code"]}
+    if slugs.read().get(package) == entry:
+        return
+    def update(data):
+        data[package] = entry
+    slugs.update(update)
+
+def _forget(package: str) -> None:
+    _resolved.pop(package, None)
+    if package in slugs.read():
+        slugs.update(lambda data: data.pop(package, None))
+
+def get_latest_version(app_name: str, config: dict) -> str:
+    app = resolve_app(app_name, config, need_page=True)
+    if not app:
+        raise Exception(f"Could not find Uptodown page for {app_name}")
+
+    soup = parser.parse(app["page"], id='versions-items-list')
+    version_spans = soup.select('#versions-items-list .version')
+    versions = [span.text for span in version_spans]
+    if not versions:
+        raise Exception(f"Could not find Uptodown versions for {app_name}")
+
+    highest_version = utils.get_highest_version(versions)
+    logging.info(f"Found version {highest_version} for {app_name}")
+    return highest_version
+
+def _fetch_versions_page(base_url: str, data_code: str, page: int) -> list[dict]:
+    response = session.get(f"{base_url}/apps/{data_code}/versions/{page}")
+    response.raise_for_status()
+    return response.json().get('data', [])
+
+def _walk_pages(base_url: str, data_code: str, first_page: int):
+    """Yield (page, entries) in order until an empty page.
+
+    Pages are read ahead concurrently; the window starts at one page and
+    doubles up to `readahead`, so short walks cost no extra requests.
+    """
+    page = first_page
+    window = 1
+    with ThreadPoolExecutor(max_workers=readahead) as executor:
+        while True:
+            pages = range(page, page + window)
+            for page, entries in zip(pages, executor.map(lambda p: _fetch_versions_page(base_url, data_code, p), pages)):
+                yield page, entries
+                if not entries:
+                    return
+            page += 1
+            window = min(window * 2, readahead)
+
+def _older_than(entries: list[dict], version: str) -> bool:
+    target = utils.normalize_version(version)
+    return all(utils.normalize_version(entry["version"]) < target for entry in entries)
+
+def _add_entries(known: dict, entries: list[dict]) -> None:
+    for entry in entries:
+        candidates = known.setdefault(entry["version"], [])
+        if entry["versionURL"] not in candidates:
+            candidates.append(entry["versionURL"])
+
+def find_version(base_url: str, data_code: str, version: str) -> list[dict]:
+    """versionURL parts of every listing of version, from the persisted per-app index.
+
+    Releases newer than the index are merged from page 1 until a page holds
+    an indexed version. Older pages are only walked, and remembered, until
+    the requested version turns up, so a known version costs one request.
+    """
+    index = version_indexes.read().get(data_code) or {"versions": {}, "next_page": 1}
+    # Indexes written before every listing was kept hold a single versionURL
+    known = index["versions"] = {
+        ver: urls if isinstance(urls, list) else [urls] for ver, urls in index["versions"].items()
+    }
+    fetched = 0
+
+    if known:
+        for page, entries in _walk_pages(base_url, data_code, 1):
+            fetched += 1
+            caught_up = any(entry["version"] in known for entry in entries)
+            _add_entries(known, entries)
+            if caught_up:
+                break
+            if not entries:
+                index["next_page"] = None
+
+    if version not in known and index["next_page"] is not None:
+        for page, entries in _walk_pages(base_url, data_code, index["next_page"]):
+            fetched += 1
+            _add_entries(known, entries)
+            index["next_page"] = page + 1 if entries else None
+            if version in known or _older_than(entries, version):
+                break
+
+    logging.info(f"Uptodown version index {data_code}: {len(known)} versions, {fetched} page request(s)")
+    def update(data):
+        data[data_code] = index
+    version_indexes.update(update)
+    return known.get(version, [])
+
+def _download_link(app: dict, version: str) -> str | None:
+    base_url = f"https://{app['slug']}.en.uptodown.com/android"
+    # A version may be listed more than once; not every listing has a download button
+    for version_url_parts in find_version(base_url, app["data_code"], version):
+        version_url = f"{version_url_parts['url']}/{version_url_parts['extraURL']}/{version_url_parts['versionID']}"
+        version_page = session.get(version_url)
+        version_page.raise_for_status()
+        button = parser.find(version_page.content, 'button', id='detail-download-button')
+        if not button:
             continue
-    
-    raise Exception(f"Could not find Uptodown page for {app_name}")
+
+        onclick = button.get('onclick', '')
+        if onclick and "download-link-deeplink" in onclick:
+            version_url += '-x'
+            version_page = session.get(version_url)
+            version_page.raise_for_status()
+            button = parser.find(version_page.content, 'button', id='detail-download-button')
+
+        if button and 'data-url' in button.attrs:
+            download_url = button['data-url']
+            return f"https://dw.uptodown.com/dwn/{download_url}"
+    return None
 
 def get_download_link(version: str, app_name: str, config: dict) -> str:
-    # Generate all possible Uptodown names
-    possible_names = generate_possible_uptodown_names(config)
-    
-    logging.info(f"Searching {len(possible_names)} possible Uptodown names for {app_name} v{version}")
-    
-    for uptodown_name in possible_names:
-        base_url = f"https://{uptodown_name}.en.uptodown.com/android"
+    # A remembered slug or data-code may have gone stale; rediscover it once
+    for attempt in range(2):
+        app = resolve_app(app_name, config)
+        if not app:
+            logging.error(f"Could not find Uptodown page for {app_name}")
+            return None
+
+        logging.info(f"Searching Uptodown {app['slug']} for {app_name} v{version}")
         try:
-            response = session.get(f"{base_url}/versions")
-            if response.status_code != 200:
-                continue
-                
-            soup = BeautifulSoup(response.content, "html.parser")
-            data_code = soup.find('h1', id='detail-app-name')['data-code']
-
-            page = 1
-            while True:
-                response = session.get(f"{base_url}/apps/{data_code}/versions/{page}")
-                response.raise_for_status()
-                version_data = response.json().get('data', [])
-                
-                if not version_data:
-                    break
-                    
-                for entry in version_data:
-                    if entry["version"] == version:
-                        version_url_parts = entry["versionURL"]
-                        version_url = f"{version_url_parts['url']}/{version_url_parts['extraURL']}/{version_url_parts['versionID']}"
-                        version_page = session.get(version_url)
-                        version_page.raise_for_status()
-                        soup = BeautifulSoup(version_page.content, "html.parser")
-                        
-                        button = soup.find('button', id='detail-download-button')
-                        if not button:
-                            continue
-                            
-                        onclick = button.get('onclick', '')
-                        if onclick and "download-link-deeplink" in onclick:
-                            version_url += '-x'
-                            version_page = session.get(version_url)
-                            version_page.raise_for_status()
-                            soup = BeautifulSoup(version_page.content, "html.parser")
-                            button = soup.find('button', id='detail-download-button')
-                        
-                        if button and 'data-url' in button.attrs:
-                            download_url = button['data-url']
-                            return f"https://dw.uptodown.com/dwn/{download_url}"
-                
-                if all(entry["version"] < version for entry in version_data):
-                    break
-                page += 1
+            download_link = _download_link(app, version)
+            if download_link:
+                return download_link
+            break
         except Exception as e:
-            logging.debug(f"Pattern {uptodown_name} failed: {str(e)[:50]}...")
-            continue
-    
+            logging.warning(f"Uptodown lookup via {app['slug']} failed: {str(e)[:50]}...")
+            _forget(config['package'])
+
     logging.error(f"Version {version} not found for {app_name}")
     return None
 
@@ -98,45 +240,46 @@ def generate_possible_uptodown_names(config: dict) -> list:
     app_name = config.get('name', '')
     package = config.get('package', '')
     
-    possible_names = set()
+    # dict keeps insertion order, so candidates are probed most likely first
+    possible_names = {}
     
     # 1. Basic variations
-    possible_names.add(app_name)
-    possible_names.add(app_name.replace('-', ''))
-    possible_names.add(app_name.replace('-plus', 'plus'))
-    possible_names.add(app_name.replace('-', '_'))
+    possible_names[app_name] = None
+    possible_names[app_name.replace('-', '')] = None
+    possible_names[app_name.replace('-plus', 'plus')] = None
+    possible_names[app_name.replace('-', '_')] = None
     
     # 2. Package name variations
     package_dash = package.replace('.', '-')
-    possible_names.add(package_dash)
+    possible_names[package_dash] = None
     
     # Common TLD patterns (com-, org-, net-)
     if package.startswith('com.'):
-        possible_names.add(package_dash)
-        possible_names.add(package_dash.replace('com-', ''))
+        possible_names[package_dash] = None
+        possible_names[package_dash.replace('com-', '')] = None
         
         # com-package variations
         parts = package.split('.')
         if len(parts) >= 2:
             # com-appname
-            possible_names.add(f"com-{parts[1]}")
+            possible_names[f"com-{parts[1]}"] = None
             # com-appname-lastpart
-            possible_names.add(f"com-{parts[1]}-{parts[-1]}")
+            possible_names[f"com-{parts[1]}-{parts[-1]}"] = None
             # appname only
-            possible_names.add(parts[1])
-            possible_names.add(parts[-1])
+            possible_names[parts[1]] = None
+            possible_names[parts[-1]] = None
             
             # For multi-part packages like com.disney.disneyplus
             if len(parts) >= 3:
-                possible_names.add(f"com-{parts[1]}{parts[2]}")
-                possible_names.add(f"com-{parts[1]}{parts[2]}-mea")
-                possible_names.add(f"com-{'-'.join(parts[1:])}")
+                possible_names[f"com-{parts[1]}{parts[2]}"] = None
+                possible_names[f"com-{parts[1]}{parts[2]}-mea"] = None
+                possible_names[f"com-{'-'.join(parts[1:])}"] = None
     
     # 3. Common suffixes (these cover 99% of cases)
     suffixes = ['', '-android', '-mobile', '-mea', '-plus', '-pro', '-lite', '-hd', '-apk']
     for suffix in suffixes:
-        possible_names.add(app_name + suffix)
-        possible_names.add(package_dash + suffix)
+        possible_names[app_name + suffix] = None
+        possible_names[package_dash + suffix] = None
     
     # 4. Company/app combinations
     # Extract company name from package (first meaningful part after TLD)
@@ -144,25 +287,25 @@ def generate_possible_uptodown_names(config: dict) -> list:
     if len(parts) >= 2:
         company = parts[1]
         app_basename = parts[-1]
-        possible_names.add(f"{company}-{app_basename}")
-        possible_names.add(f"{company}-{app_name}")
+        possible_names[f"{company}-{app_basename}"] = None
+        possible_names[f"{company}-{app_name}"] = None
         
         # For apps like Adobe
         if 'adobe' in package.lower():
-            possible_names.add(f"adobe-{app_basename}")
-            possible_names.add(f"adobe-{app_basename}-mobile")
+            possible_names[f"adobe-{app_basename}"] = None
+            possible_names[f"adobe-{app_basename}-mobile"] = None
     
     # 5. Remove common words and try variations
     clean_name = app_name
     for word in ['plus', 'pro', 'lite', 'free', 'paid', 'mod']:
         if word in clean_name:
             clean = clean_name.replace(f'-{word}', '').replace(word, '')
-            possible_names.add(clean)
-            possible_names.add(f"{clean}-{word}")
+            possible_names[clean] = None
+            possible_names[f"{clean}-{word}"] = None
     
     # 6. All lowercase
-    lowercase_names = {name.lower() for name in possible_names}
-    possible_names.update(lowercase_names)
+    for name in list(possible_names):
+        possible_names[name.lower()] = None
     
     # Clean up: remove None/empty, deduplicate
     return [name for name in possible_names if name and len(name) > 1]
@@ -1,7 +1,13 @@
+import os
 import re
+import json
+import fcntl
 import logging
+import tempfile
+import threading
 from typing import List, Optional
-from src import gh
+from contextlib import contextmanager
+from src import github_api, sources_lock
 from sys import exit
 import subprocess
 from pathlib import Path
@@ -38,6 +44,38 @@ def parse_header(line):
             pdict[name] = value
     return key, pdict
 
+def load_json(path: Path, default=None):
+    """Load a JSON file, returning default if it is missing or unreadable"""
+    try:
+        with path.open() as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+def save_json(path: Path, data) -> None:
+    """Atomically write JSON so concurrent readers never see a partial file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A unique temp file per call; threads of one process write the same stores
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+@contextmanager
+def file_lock(path: Path):
+    """Exclusive advisory lock shared between processes on the same machine"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
 def find_file(files: list[Path], prefix: str = None, suffix: str = None, contains: str = None, exclude: list = None) -> Path | None:
     """Find a file with various matching criteria"""
     if exclude is None:
@@ -82,7 +120,8 @@ def find_file(files: list[Path], prefix: str = None, suffix: str = None, contain
     
     return None
 
-def find_apksigner() -> str | None:
+def find_build_tool(tool: str) -> str | None:
+    """Newest Android SDK build-tools binary called tool"""
     sdk_root = Path("/usr/local/lib/android/sdk")
     build_tools_dir = sdk_root / "build-tools"
 
@@ -92,13 +131,16 @@ def find_apksigner() -> str | None:
 
     versions = sorted(build_tools_dir.iterdir(), reverse=True)
     for version_dir in versions:
-        apksigner_path = version_dir / "apksigner"
-        if apksigner_path.exists() and apksigner_path.is_file():
-            return str(apksigner_path)
+        tool_path = version_dir / tool
+        if tool_path.exists() and tool_path.is_file():
+            return str(tool_path)
 
-    logging.error("No apksigner found in build-tools")
+    logging.error(f"No {tool} found in build-tools")
     return None
 
+def find_apksigner() -> str | None:
+    return find_build_tool("apksigner")
+
 def run_process(
     command: List[str],
     cwd: Optional[Path] = None,
@@ -161,7 +203,21 @@ def get_highest_version(versions: list[str]) -> str | None:
             highest_version = v
     return highest_version
 
+_supported_versions = {}
+_supported_version_locks = {}
+_supported_versions_lock = threading.Lock()
+
 def get_supported_version(package_name: str, cli: str, patches: str) -> Optional[str]:
+    # Platforms resolving concurrently share one list-versions run
+    key = (package_name, cli, patches)
+    with _supported_versions_lock:
+        key_lock = _supported_version_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        if key not in _supported_versions:
+            _supported_versions[key] = _get_supported_version(package_name, cli, patches)
+        return _supported_versions[key]
+
+def _get_supported_version(package_name: str, cli: str, patches: str) -> Optional[str]:
     output = run_process([
         'java', '-jar', cli,
         'list-versions',
@@ -211,39 +267,48 @@ def extract_filename(response, fallback_url=None) -> str:
     path = urlparse(fallback_url or response.url).path
     return unquote(Path(path).name)
 
+def response_validator(response) -> str | None:
+    """Return the strongest cache validator a response advertises"""
+    etag = response.headers.get('etag')
+    if etag:
+        return f"etag:{etag}"
+    last_modified = response.headers.get('last-modified')
+    if last_modified:
+        return f"last-modified:{last_modified}"
+    return None
+
 def detect_github_release(user: str, repo: str, tag: str) -> dict:
-    repo_obj = gh.get_repo(f"{user}/{repo}")
+    release = sources_lock.locked_release(user, repo, tag)
+    if release:
+        logging.info(f"Locked release: {release['tag_name']}")
+        return release
 
     if tag == "latest":
-        release = repo_obj.get_latest_release()
-        logging.info(f"Fetched latest release: {release.tag_name}")
-        return release.raw_data
+        release = github_api.get_latest_release(user, repo)
+        logging.info(f"Fetched latest release: {release['tag_name']}")
+        return release
 
     if tag in ["", "dev", "prerelease"]:
-        releases = list(repo_obj.get_releases())
-        if not releases:
-            raise ValueError(f"No releases found for {user}/{repo}")
-
         if tag == "":
-            release = max(releases, key=lambda x: x.created_at)
+            release = github_api.find_newest_release(user, repo, lambda r: True)
+            if not release:
+                raise ValueError(f"No releases found for {user}/{repo}")
         elif tag == "dev":
-            devs = [r for r in releases if 'dev' in r.tag_name.lower()]
-            if not devs:
+            release = github_api.find_newest_release(user, repo, lambda r: 'dev' in r["tag_name"].lower())
+            if not release:
                 raise ValueError(f"No dev release found for {user}/{repo}")
-            release = max(devs, key=lambda x: x.created_at)
         else:
-            pres = [r for r in releases if r.prerelease]
-            if not pres:
+            release = github_api.find_newest_release(user, repo, lambda r: r["prerelease"])
+            if not release:
                 raise ValueError(f"No prerelease found for {user}/{repo}")
-            release = max(pres, key=lambda x: x.created_at)
 
-        logging.info(f"Fetched release: {release.tag_name}")
-        return release.raw_data
+        logging.info(f"Fetched release: {release['tag_name']}")
+        return release
 
     try:
-        release = repo_obj.get_release(tag)
-        logging.info(f"Fetched release: {release.tag_name}")
-        return release.raw_data
+        release = github_api.get_release_by_tag(user, repo, tag)
+        logging.info(f"Fetched release: {release['tag_name']}")
+        return release
     except Exception as e:
         logging.error(f"Error fetching release {tag} for {user}/{repo}: {e}")
         raise
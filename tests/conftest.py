@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# src builds its HTTP client and state paths at import time; keep tests off .cache
+os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="tests-cache-")
+os.environ.setdefault("HTTP_THROTTLE", "false")
+os.environ.setdefault("HTTP_RETRIES", "0")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
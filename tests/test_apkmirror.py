@@ -0,0 +1,95 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from src import apkmirror
+
+FIXTURE = Path(__file__).parent / "fixtures" / "apkmirror_variants.html"
+RELEASE = "/apk/google-inc/youtube/youtube-19-16-39-release/"
+
+@pytest.fixture(scope="module")
+def variants():
+    return apkmirror.parse_variants(FIXTURE.read_bytes())
+
+def slug(variant):
+    return variant["url"].rsplit("/", 2)[-2] if variant else None
+
+def test_parse_variants(variants):
+    assert [(v["type"], v["arches"], v["dpi"]) for v in variants] == [
+        ("BUNDLE", ["arm64-v8a", "armeabi-v7a", "x86", "x86_64"], "nodpi"),
+        ("APK", ["universal"], "nodpi"),
+        ("APK", ["arm64-v8a"], "120-640dpi"),
+        ("APK", ["arm64-v8a"], "nodpi"),
+        ("APK", ["armeabi-v7a"], "nodpi"),
+    ]
+    assert {v["version"] for v in variants} == {"19.16.39"}
+    assert {v["min_sdk"] for v in variants} == {"Android 8.0+"}
+    assert variants[3]["url"] == f"{apkmirror.base_url}{RELEASE}youtube-19-16-39-android-apk-download/"
+
+@pytest.mark.parametrize("type_, arch, dpi, expected", [
+    # Exact arch beats the universal row listed above it, and nodpi beats 120-640dpi
+    ("APK", "arm64-v8a", "nodpi", "youtube-19-16-39-android-apk-download"),
+    ("APK", "arm64-v8a", "", "youtube-19-16-39-android-apk-download"),
+    ("APK", "arm64-v8a", "120-640dpi", "youtube-19-16-39-2-android-apk-download"),
+    ("APK", "armeabi-v7a", "nodpi", "youtube-19-16-39-5-android-apk-download"),
+    ("APK", "universal", "nodpi", "youtube-19-16-39-3-android-apk-download"),
+    # No x86 APK: the universal one carries it
+    ("APK", "x86", "nodpi", "youtube-19-16-39-3-android-apk-download"),
+    ("APK", "arm64-v8a + armeabi-v7a", "nodpi", "youtube-19-16-39-3-android-apk-download"),
+    ("APK", "", "nodpi", "youtube-19-16-39-3-android-apk-download"),
+    ("BUNDLE", "arm64-v8a + armeabi-v7a", "nodpi", "youtube-19-16-39-4-android-apk-download"),
+    ("APK", "arm64-v8a", "480dpi", None),
+])
+def test_select_variant(variants, type_, arch, dpi, expected):
+    assert slug(apkmirror.select_variant(variants, "19.16.39", type_, arch, dpi)) == expected
+
+def test_noarch_stands_in_for_universal(variants):
+    noarch = [dict(variant, arches=["noarch"]) for variant in variants if variant["arches"] == ["universal"]]
+    assert apkmirror.select_variant(noarch, "19.16.39", "APK", "universal", "nodpi") == noarch[0]
+    assert apkmirror.select_variant(noarch, "19.16.39", "APK", "arm64-v8a", "nodpi") == noarch[0]
+
+def test_bundle_only_page_has_no_apk(variants):
+    bundles = [variant for variant in variants if variant["type"] == "BUNDLE"]
+    assert apkmirror.select_variant(bundles, "19.16.39", "APK", "universal", "nodpi") is None
+    assert apkmirror.select_variant(bundles, "19.16.39", "BUNDLE", "arm64-v8a", "nodpi") == bundles[0]
+
+def test_other_version_only_when_version_is_not_listed(variants):
+    older = [dict(variant, version="19.15.36", text=variant["text"].replace("19.16.39", "19.15.36")) for variant in variants]
+    assert apkmirror.select_variant(older + variants, "19.16.39", "APK", "arm64-v8a", "nodpi")["version"] == "19.16.39"
+    assert apkmirror.select_variant(older, "19.16.39", "APK", "arm64-v8a", "nodpi")["version"] == "19.15.36"
+
+def test_candidate_urls_in_priority_order():
+    config = {"org": "google-inc", "name": "youtube", "release_prefix": "yt"}
+    urls = [url for url, _, _ in apkmirror._candidate_urls(config, ["19", "16", "39"])]
+    prefix = f"{apkmirror.base_url}/apk/google-inc/youtube/"
+    assert urls[:5] == [
+        f"{prefix}yt-19-16-39-release/",
+        f"{prefix}youtube-19-16-39-release/",
+        f"{prefix}yt-19-16-39/",
+        f"{prefix}youtube-19-16-39/",
+        f"{prefix}yt-19-16-release/",
+    ]
+    assert len(urls) == len(set(urls)) == 12
+
+@pytest.mark.parametrize("pages, expected", [
+    # url: (delay before answering, page exists, page is for the exact version)
+    ({"a": (0.3, True, True), "b": (0.0, True, True)}, ("a", True)),
+    ({"a": (0.0, False, False), "b": (0.2, True, False), "c": (0.0, True, True)}, ("c", True)),
+    ({"a": (0.0, True, False), "b": (0.1, True, False), "c": (0.0, False, False)}, ("a", False)),
+    ({"a": (0.0, False, False), "b": (0.0, False, False)}, (None, False)),
+])
+def test_find_release_page_follows_priority_not_speed(monkeypatch, pages, expected):
+    def probe(url, version, version_parts, i):
+        delay, exists, exact = pages[url]
+        threading.Event().wait(delay)
+        return (url.encode() if exists else None), exact
+
+    monkeypatch.setattr(apkmirror, "_probe_release_page", probe)
+    candidates = [(url, 3, {"url": url}) for url in pages]
+
+    page, exact, shape, url = apkmirror._find_release_page(candidates, "19.16.39", ["19", "16", "39"])
+
+    assert (url, exact) == expected
+    if url:
+        assert page == url.encode() and shape == {"url": url}
@@ -0,0 +1,200 @@
+import io
+import os
+import struct
+import zipfile
+
+import pytest
+
+from src import apkzip
+
+ABIS = ["x86", "x86_64", "armeabi-v7a", "arm64-v8a"]
+
+def make_apk(path):
+    """Small APK: deflated dex/manifest, stored resources and one library per ABI"""
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("AndroidManifest.xml", b"<manifest/>" * 50, zipfile.ZIP_DEFLATED)
+        archive.writestr("classes.dex", os.urandom(20000), zipfile.ZIP_DEFLATED)
+        for abi in ABIS:
+            archive.writestr(f"lib/{abi}/libfoo.so", os.urandom(3000 + len(abi)), zipfile.ZIP_STORED)
+        archive.writestr("resources.arsc", b"r" * 777, zipfile.ZIP_STORED)
+        archive.writestr("res/empty.xml", b"", zipfile.ZIP_STORED)
+    return path
+
+def data_offsets(path):
+    """Offset of each entry's data, from its local header"""
+    data = path.read_bytes()
+    with zipfile.ZipFile(path) as archive:
+        offsets = {}
+        for info in archive.infolist():
+            name_len, extra_len = struct.unpack_from("<HH", data, info.header_offset + 26)
+            offsets[info.filename] = (info.header_offset + 30 + name_len + extra_len, info.compress_type)
+        return offsets
+
+def contents(path):
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        return {info.filename: archive.read(info) for info in archive.infolist()}
+
+def test_rewrite_drops_abis_and_keeps_everything_else(tmp_path):
+    src = make_apk(tmp_path / "in.apk")
+    dest = tmp_path / "out.apk"
+
+    result = apkzip.rewrite(src, dest, apkzip.abi_filter(["x86", "x86_64"]))
+
+    expected = {name: data for name, data in contents(src).items() if not name.startswith(("lib/x86/", "lib/x86_64/"))}
+    assert contents(dest) == expected
+    assert result == {"entries": len(expected), "dropped": 2, "recovered": False, "size": dest.stat().st_size}
+
+def test_rewrite_aligns_stored_entries(tmp_path):
+    src = make_apk(tmp_path / "in.apk")
+    dest = tmp_path / "out.apk"
+    apkzip.rewrite(src, dest)
+
+    for name, (offset, method) in data_offsets(dest).items():
+        if method != zipfile.ZIP_STORED:
+            continue
+        alignment = apkzip.LIBRARY_ALIGNMENT if name.endswith(".so") else apkzip.DEFAULT_ALIGNMENT
+        assert offset % alignment == 0, name
+
+def test_rewrite_is_idempotent(tmp_path):
+    src = make_apk(tmp_path / "in.apk")
+    once = tmp_path / "once.apk"
+    twice = tmp_path / "twice.apk"
+    apkzip.rewrite(src, once)
+    apkzip.rewrite(once, twice)
+    assert once.read_bytes() == twice.read_bytes()
+
+def test_rewrite_recovers_missing_central_directory(tmp_path):
+    src = make_apk(tmp_path / "in.apk")
+    data = src.read_bytes()
+    cd_offset, = struct.unpack_from("<I", data, len(data) - 22 + 16)
+    # Cut the archive after its last local entry: no central directory, no EOCD
+    damaged = tmp_path / "damaged.apk"
+    damaged.write_bytes(data[:cd_offset])
+    dest = tmp_path / "out.apk"
+
+    result = apkzip.rewrite(damaged, dest)
+
+    assert result["recovered"]
+    assert contents(dest) == contents(src)
+
+def test_rewrite_in_place_and_empty_input(tmp_path):
+    apk = make_apk(tmp_path / "in.apk")
+    before = contents(apk)
+    apkzip.rewrite_in_place(apk, apkzip.abi_filter(["arm64-v8a"]))
+    assert set(contents(apk)) == set(before) - {"lib/arm64-v8a/libfoo.so"}
+    assert [path.name for path in tmp_path.iterdir()] == ["in.apk"]
+
+    empty = tmp_path / "empty.apk"
+    empty.write_bytes(b"")
+    with pytest.raises(apkzip.ZipRewriteError):
+        apkzip.rewrite(empty, tmp_path / "out.apk")
+
+def test_check_accepts_intact_apk(tmp_path):
+    apk = make_apk(tmp_path / "in.apk")
+    assert apkzip.check(apk) is None
+    assert apkzip.check(apk, crc=True, workers=2) is None
+
+def test_check_reports_structural_damage(tmp_path):
+    apk = make_apk(tmp_path / "in.apk")
+    data = bytearray(apk.read_bytes())
+    apk.write_bytes(data[:len(data) - 10])
+    assert "central directory" in apkzip.check(apk).lower()
+
+    empty = tmp_path / "empty.apk"
+    empty.write_bytes(b"")
+    assert apkzip.check(empty).endswith("is empty")
+
+def test_check_crc_finds_corrupt_data(tmp_path):
+    apk = make_apk(tmp_path / "in.apk")
+    offset, _ = data_offsets(apk)["resources.arsc"]
+    data = bytearray(apk.read_bytes())
+    data[offset] ^= 0xFF
+    apk.write_bytes(data)
+
+    # Headers still agree, only the checksum gives it away
+    assert apkzip.check(apk) is None
+    assert apkzip.check(apk, crc=True) == "CRC mismatch for b'resources.arsc'"
+
+def test_check_compares_local_headers(tmp_path):
+    apk = make_apk(tmp_path / "in.apk")
+    with zipfile.ZipFile(apk) as archive:
+        header_offset = archive.getinfo("classes.dex").header_offset
+    data = bytearray(apk.read_bytes())
+    # Bump the uncompressed size in the local header only
+    usize, = struct.unpack_from("<I", data, header_offset + 22)
+    struct.pack_into("<I", data, header_offset + 22, usize + 1)
+    apk.write_bytes(data)
+
+    assert apkzip.check(apk) == "Local header sizes differ from central directory for b'classes.dex'"
+
+class Unseekable(io.RawIOBase):
+    """Write-only stream, so zipfile falls back to data descriptors"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, chunk):
+        self.data += chunk
+        return len(chunk)
+
+def stream(src, dest, drop=None, chunk=1000):
+    data = src.read_bytes()
+    with open(dest, "wb") as out:
+        rewriter = apkzip.StreamRewriter(out, drop)
+        for position in range(0, len(data), chunk):
+            rewriter.write(data[position:position + chunk])
+        return rewriter.finish()
+
+@pytest.mark.parametrize("chunk", [1, 7, 4096, 1 << 20])
+def test_stream_matches_rewrite(tmp_path, chunk):
+    src = make_apk(tmp_path / "in.apk")
+    drop = apkzip.abi_filter(["x86", "armeabi-v7a"])
+    expected = apkzip.rewrite(src, tmp_path / "rewrite.apk", drop)
+
+    assert stream(src, tmp_path / "stream.apk", drop, chunk) == expected
+    assert (tmp_path / "stream.apk").read_bytes() == (tmp_path / "rewrite.apk").read_bytes()
+
+def test_stream_fills_in_data_descriptors(tmp_path):
+    raw = Unseekable()
+    with zipfile.ZipFile(raw, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("classes.dex", os.urandom(5000))
+        archive.writestr("lib/x86/libfoo.so", b"x" * 3000)
+        archive.writestr("AndroidManifest.xml", b"<manifest/>")
+    src = tmp_path / "in.apk"
+    src.write_bytes(raw.data)
+    dest = tmp_path / "out.apk"
+
+    result = stream(src, dest, apkzip.abi_filter(["x86"]), chunk=333)
+
+    assert result["dropped"] == 1
+    assert contents(dest) == {name: data for name, data in contents(src).items() if not name.startswith("lib/")}
+    assert apkzip.check(dest, crc=True) is None
+
+def test_stream_rejects_truncated_archive(tmp_path):
+    src = make_apk(tmp_path / "in.apk")
+    data = src.read_bytes()
+    with open(tmp_path / "out.apk", "wb") as out:
+        rewriter = apkzip.StreamRewriter(out)
+        rewriter.write(data[:len(data) // 2])
+        with pytest.raises(apkzip.ZipRewriteError):
+            rewriter.finish()
+
+def test_stream_rejects_gap_between_entries(tmp_path):
+    src = tmp_path / "gapped.apk"
+    with zipfile.ZipFile(src, "w") as archive:
+        archive.writestr("a.txt", b"a" * 100)
+        # Bytes no local header claims; the central directory still lists every entry
+        archive.fp.write(b"\0" * 16)
+        archive.start_dir = archive.fp.tell()
+        archive.writestr("classes.dex", os.urandom(2000), zipfile.ZIP_DEFLATED)
+        archive.writestr("lib/x86/libfoo.so", os.urandom(1000))
+    assert apkzip.check(src, crc=True) is None
+    apkzip.rewrite(src, tmp_path / "rewrite.apk")
+    assert set(contents(tmp_path / "rewrite.apk")) == {"a.txt", "classes.dex", "lib/x86/libfoo.so"}
+
+    with pytest.raises(apkzip.ZipRewriteError, match="lists 3 entries, the stream had 1"):
+        stream(src, tmp_path / "stream.apk", apkzip.abi_filter(["x86"]))
@@ -0,0 +1,115 @@
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from src import aptoide
+from src.cache import JsonStore
+
+PACKAGE = "com.spotify.music"
+# Newest first, as listAppVersions returns them
+VERSIONS = [(f"8.9.{patch}", 900 - patch) for patch in range(120)]
+
+class FakeResponse:
+    def __init__(self, payload: dict):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+class FakeSession:
+    """Serves apps/search, paged listAppVersions and getAppMeta, recording each call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, url):
+        parts = urlsplit(url)
+        endpoint = parts.path.rsplit("/api/7/", 1)[1]
+        params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        self.calls.append((endpoint, params))
+
+        if endpoint == "apps/search":
+            vername, _ = VERSIONS[0]
+            return FakeResponse({"datalist": {"list": [{"file": {"vername": vername, "path": f"https://pool/{vername}.apk"}}]}})
+        if endpoint == "listAppVersions":
+            offset, limit = int(params["offset"]), int(params["limit"])
+            page = VERSIONS[offset:offset + limit]
+            datalist = {"list": [{"file": {"vername": vername, "vercode": vercode}} for vername, vercode in page]}
+            if offset + limit < len(VERSIONS):
+                datalist["next"] = offset + limit
+            return FakeResponse({"datalist": datalist})
+        if endpoint == "getAppMeta":
+            return FakeResponse({"data": {"file": {"path": f"https://pool/{params['vercode']}.apk"}}})
+        raise AssertionError(f"Unexpected endpoint {endpoint}")
+
+    def pages(self) -> list[int]:
+        return [int(params["offset"]) for endpoint, params in self.calls if endpoint == "listAppVersions"]
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(aptoide, "session", fake)
+    return fake
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(aptoide.time, "time", lambda: now[0])
+    return now
+
+def make_client(tmp_path, ttl=3600):
+    return aptoide.AptoideClient(JsonStore(tmp_path / "aptoide.json"), ttl=ttl)
+
+def test_pages_list_app_versions_only_as_far_as_needed(fake, tmp_path, clock):
+    client = make_client(tmp_path)
+
+    assert client.vercode(PACKAGE, "", "8.9.10") == 890
+    assert fake.pages() == [0]
+
+    assert client.vercode(PACKAGE, "", "8.9.110") == 790
+    assert fake.pages() == [0, 50, 100]
+
+    # Past the last page: nothing left to fetch
+    assert client.vercode(PACKAGE, "", "7.0.0") is None
+    assert client.vercode(PACKAGE, "", "7.0.0") is None
+    assert fake.pages() == [0, 50, 100]
+
+def test_download_path_is_cached_within_ttl(fake, tmp_path, clock):
+    client = make_client(tmp_path)
+    assert client.download_path(PACKAGE, "", "8.9.60") == "https://pool/840.apk"
+    assert client.latest(PACKAGE, "")["vername"] == "8.9.0"
+    calls = len(fake.calls)
+
+    # Same process and a later run sharing the store both answer from the cache
+    clock[0] += 1800
+    assert client.download_path(PACKAGE, "", "8.9.60") == "https://pool/840.apk"
+    assert make_client(tmp_path).download_path(PACKAGE, "", "8.9.60") == "https://pool/840.apk"
+    assert make_client(tmp_path).latest(PACKAGE, "")["vername"] == "8.9.0"
+    assert len(fake.calls) == calls
+
+def test_cache_expires_after_ttl(fake, tmp_path, clock):
+    client = make_client(tmp_path)
+    client.latest(PACKAGE, "")
+    clock[0] += 3601
+
+    client.latest(PACKAGE, "")
+    assert [endpoint for endpoint, _ in fake.calls] == ["apps/search", "apps/search"]
+
+def test_cpu_filters_are_cached_separately(fake, tmp_path, clock):
+    client = make_client(tmp_path)
+    arm64 = aptoide._get_q_param("arm64-v8a")
+    assert arm64.startswith("&q=") and aptoide._get_q_param("universal") == ""
+
+    client.vercode(PACKAGE, "", "8.9.10")
+    client.vercode(PACKAGE, arm64, "8.9.10")
+    client.vercode(PACKAGE, arm64, "8.9.10")
+
+    assert fake.pages() == [0, 0]
+    assert "q" in fake.calls[1][1] and "q" not in fake.calls[0][1]
+
+def test_unknown_version_raises(fake, tmp_path, clock):
+    with pytest.raises(ValueError):
+        make_client(tmp_path).download_path(PACKAGE, "", "1.0.0")
@@ -0,0 +1,110 @@
+import hashlib
+
+import pytest
+
+from src import cache, downloader
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Deterministic time.time() for last_used ordering"""
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    return now
+
+def put(store, tmp_path, url, data, validator="v1"):
+    filepath = tmp_path / "files" / url.rsplit("/", 1)[-1]
+    filepath.parent.mkdir(exist_ok=True)
+    filepath.write_bytes(data)
+    sha256 = hashlib.sha256(data).hexdigest()
+    store.store(url, validator, filepath, sha256)
+    return sha256
+
+def test_store_lookup_and_materialize(tmp_path):
+    store = cache.ArtifactCache(tmp_path / "artifacts", max_bytes=1 << 20)
+    sha256 = put(store, tmp_path, "https://example.com/a.jar", b"a" * 100)
+
+    assert store.lookup("https://example.com/a.jar", "v2") is None
+    entry = store.lookup("https://example.com/a.jar", "v1")
+    assert entry["sha256"] == sha256
+
+    dest = store.materialize(entry, tmp_path / "out.jar")
+    assert dest.read_bytes() == b"a" * 100
+    assert store.stats() == {"hits": 1, "misses": 1, "bytes_saved": 100}
+
+def test_same_bytes_share_one_blob(tmp_path):
+    store = cache.ArtifactCache(tmp_path / "artifacts", max_bytes=1 << 20)
+    first = put(store, tmp_path, "https://one.example/a.jar", b"same")
+    second = put(store, tmp_path, "https://two.example/b.jar", b"same")
+
+    assert first == second
+    assert len(list(store.blob_dir.rglob("*"))) == 2  # one prefix dir, one blob
+
+def test_evicts_least_recently_used_blob(tmp_path, clock):
+    store = cache.ArtifactCache(tmp_path / "artifacts", max_bytes=250)
+    old = put(store, tmp_path, "https://example.com/old.jar", b"o" * 100)
+    clock[0] += 1
+    recent = put(store, tmp_path, "https://example.com/recent.jar", b"r" * 100)
+    clock[0] += 1
+    # A lookup refreshes "old", so "recent" is now the least recently used
+    assert store.lookup("https://example.com/old.jar", "v1")
+    clock[0] += 1
+    new = put(store, tmp_path, "https://example.com/new.jar", b"n" * 100)
+
+    assert store.lookup("https://example.com/recent.jar", "v1") is None
+    assert not store._blob_path(recent).exists()
+    assert store._blob_path(old).exists() and store._blob_path(new).exists()
+
+def test_blob_shared_by_keys_evicts_as_its_newest_key(tmp_path, clock):
+    store = cache.ArtifactCache(tmp_path / "artifacts", max_bytes=250)
+    shared = put(store, tmp_path, "https://one.example/a.jar", b"s" * 100)
+    clock[0] += 1
+    other = put(store, tmp_path, "https://example.com/b.jar", b"b" * 100)
+    clock[0] += 1
+    put(store, tmp_path, "https://two.example/a.jar", b"s" * 100)
+    clock[0] += 1
+    put(store, tmp_path, "https://example.com/c.jar", b"c" * 100)
+
+    # The oldest key points at the shared blob, but its second key is newer
+    entries = store._load_index()["entries"].values()
+    assert not store._blob_path(other).exists()
+    assert store._blob_path(shared).exists()
+    assert sorted(entry["url"] for entry in entries if entry["sha256"] == shared) == [
+        "https://one.example/a.jar", "https://two.example/a.jar"]
+
+def test_excluded_and_disabled_urls_are_not_cached(tmp_path):
+    store = cache.ArtifactCache(tmp_path / "artifacts", max_bytes=1 << 20, exclude=("apk://",))
+    put(store, tmp_path, "apk://apkmirror/youtube", b"apk")
+    put(store, tmp_path, "https://example.com/a.jar", b"jar", validator=None)
+    assert store._load_index()["entries"] == {}
+    assert store.lookup("apk://apkmirror/youtube", "v1") is None
+
+    disabled = cache.ArtifactCache(tmp_path / "off", max_bytes=1 << 20, enabled=False)
+    put(disabled, tmp_path, "https://example.com/c.jar", b"jar")
+    assert not disabled.index_path.exists()
+
+def test_redownload_does_not_overwrite_cached_blob(tmp_path, monkeypatch):
+    store = cache.ArtifactCache(tmp_path / "artifacts", max_bytes=1 << 20)
+    monkeypatch.setattr(downloader, "artifacts", store)
+    monkeypatch.chdir(tmp_path)
+    sha256 = put(store, tmp_path, "https://example.com/v1/app.jar", b"old")
+    dest = store.materialize(store.lookup("https://example.com/v1/app.jar", "v1"), tmp_path / "app.jar")
+
+    class Response:
+        url = "https://example.com/v2/app.jar"
+        headers = {"content-length": "3"}
+
+        def raise_for_status(self):
+            pass
+
+        def iter_content(self, chunk_size):
+            yield b"new"
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(downloader.session, "get", lambda url, stream: Response())
+    downloader._download_resource("https://example.com/v2/app.jar", "app.jar", "v2", "https://example.com/v2/app.jar", None)
+
+    assert dest.read_bytes() == b"new"
+    assert store._blob_path(sha256).read_bytes() == b"old"
+    assert store.materialize(store.lookup("https://example.com/v1/app.jar", "v1"), tmp_path / "old.jar").read_bytes() == b"old"
@@ -0,0 +1,182 @@
+import time
+import hashlib
+import threading
+from pathlib import Path
+
+import pytest
+
+from src import apkzip, downloader, stats
+
+DATA = b"patched bytes"
+SHA256 = hashlib.sha256(DATA).hexdigest()
+PLATFORMS = ["apkmirror", "apkpure", "uptodown", "aptoide"]
+
+@pytest.fixture
+def download(tmp_path, monkeypatch):
+    monkeypatch.setattr(downloader, "verified_files", set())
+    filepath = tmp_path / "app.apk"
+    filepath.write_bytes(DATA)
+    return filepath
+
+def test_verify_accepts_matching_digest_and_size(download):
+    assert downloader._verify(download, len(DATA), len(DATA), SHA256, SHA256)
+    assert downloader.is_verified(download)
+
+def test_verify_without_anything_to_check(download):
+    assert not downloader._verify(download, len(DATA), 0, SHA256, None)
+    assert not downloader.is_verified(download)
+    assert download.exists()
+
+@pytest.mark.parametrize("size, total_size, expected, problem", [
+    (len(DATA), len(DATA), "0" * 64, "sha256 mismatch"),
+    (len(DATA) - 1, len(DATA), None, "size mismatch"),
+])
+def test_verify_rejects_and_removes_corrupt_download(download, size, total_size, expected, problem):
+    with pytest.raises(downloader.IntegrityError, match=problem):
+        downloader._verify(download, size, total_size, SHA256, expected)
+    assert not download.exists()
+    assert not downloader.is_verified(download)
+
+@pytest.mark.parametrize("digest, expected", [
+    (f"sha256:{SHA256.upper()}", SHA256),
+    ("md5:abc", None),
+    ("sha256:", None),
+    (None, None),
+])
+def test_parse_digest(digest, expected):
+    assert downloader._parse_digest(digest) == expected
+
+def test_download_resource_retries_integrity_error_once(monkeypatch, download):
+    calls = []
+
+    def flaky(url, name, validator, cache_key, expected_sha256, drop_abis=None):
+        calls.append(expected_sha256)
+        if len(calls) == 1:
+            raise downloader.IntegrityError("truncated")
+        return download
+
+    monkeypatch.setattr(downloader, "_download_resource", flaky)
+    assert downloader.download_resource("https://example.com/app.apk", digest=f"sha256:{SHA256}") == download
+    assert calls == [SHA256, SHA256]
+
+def test_download_resource_gives_up_after_second_integrity_error(monkeypatch):
+    def corrupt(*args, **kwargs):
+        raise downloader.IntegrityError("sha256 mismatch")
+
+    monkeypatch.setattr(downloader, "_download_resource", corrupt)
+    with pytest.raises(downloader.IntegrityError):
+        downloader.download_resource("https://example.com/app.apk")
+
+def test_download_resource_downloads_whole_when_stripping_fails(monkeypatch, download):
+    calls = []
+
+    def stripping(url, name, validator, cache_key, expected_sha256, drop_abis=None):
+        calls.append(drop_abis)
+        if drop_abis:
+            raise apkzip.ZipRewriteError("Stored entries with data descriptors cannot be streamed")
+        return download
+
+    monkeypatch.setattr(downloader, "_download_resource", stripping)
+    assert downloader.download_resource("https://example.com/app.apk", drop_abis=["x86"]) == download
+    assert calls == [["x86"], None]
+
+@pytest.fixture
+def mirrors(monkeypatch, tmp_path):
+    monkeypatch.setattr(stats, "mirrors", stats.MirrorStats(tmp_path / "mirror-stats.json", exploration=0))
+    return stats.mirrors
+
+@pytest.fixture
+def hedge(monkeypatch, mirrors):
+    """Fake resolvers: platform -> (seconds until it answers, resolves?, downloads?)"""
+    fetched = []
+    finished = []
+    release = threading.Event()
+
+    def install(behaviour: dict):
+        def resolve(app_name, platform, cli, patches, arch=None, drop_abis=None):
+            delay, resolves, _ = behaviour[platform]
+            if delay is None:
+                # Answers only once the test lets it, long after the hedge returned
+                release.wait(5)
+            else:
+                time.sleep(delay)
+            finished.append(platform)
+            if not resolves:
+                raise ValueError(f"No download link found on {platform}")
+            return {"platform": platform, "version": "1.0", "link": f"https://{platform}/app.apk"}
+
+        def fetch(app_name, resolution):
+            fetched.append(resolution["platform"])
+            if not behaviour[resolution["platform"]][2]:
+                raise IOError("connection reset")
+            return Path(f"{resolution['platform']}.apk")
+
+        monkeypatch.setattr(downloader, "resolve_platform", resolve)
+        monkeypatch.setattr(downloader, "_fetch_resolution", fetch)
+        return fetched, finished
+
+    yield install
+    release.set()
+
+def test_priority_wins_over_a_faster_lower_platform(hedge, mirrors):
+    fetched, finished = hedge({
+        "apkmirror": (0.3, True, True),
+        "apkpure": (0.0, True, True),
+        "uptodown": (0.0, True, True),
+        "aptoide": (0.0, False, True),
+    })
+
+    assert downloader.download_hedged("youtube", PLATFORMS, "cli", "patches") == (Path("apkmirror.apk"), "1.0")
+    # The others answered first, but only the preferred platform was downloaded from
+    assert finished[-1] == "apkmirror"
+    assert fetched == ["apkmirror"]
+    assert mirrors.store.read()["youtube"]["apkmirror"]["successes"] == 1
+
+def test_falls_through_failed_resolutions_and_downloads(hedge):
+    fetched, _ = hedge({
+        "apkmirror": (0.0, False, True),
+        "apkpure": (0.1, True, False),
+        "uptodown": (0.2, True, True),
+        "aptoide": (0.0, True, True),
+    })
+
+    assert downloader.download_hedged("youtube", PLATFORMS, "cli", "patches") == (Path("uptodown.apk"), "1.0")
+    assert fetched == ["apkpure", "uptodown"]
+
+def test_returns_without_waiting_for_lower_platforms(hedge):
+    fetched, finished = hedge({
+        "apkmirror": (0.0, True, True),
+        "apkpure": (None, True, True),
+        "uptodown": (None, True, True),
+        "aptoide": (None, True, True),
+    })
+
+    started = time.monotonic()
+    assert downloader.download_hedged("youtube", PLATFORMS, "cli", "patches") == (Path("apkmirror.apk"), "1.0")
+    assert time.monotonic() - started < 2
+    assert finished == ["apkmirror"] and fetched == ["apkmirror"]
+
+def test_losers_not_yet_started_are_cancelled(hedge, monkeypatch):
+    started = []
+    real_executor = downloader.ThreadPoolExecutor
+    timed_resolve = downloader._timed_resolve
+
+    def tracked_resolve(app_name, platform, *args):
+        started.append(platform)
+        return timed_resolve(app_name, platform, *args)
+
+    # One worker: every platform after the winner is still queued when it wins
+    monkeypatch.setattr(downloader, "ThreadPoolExecutor", lambda max_workers: real_executor(max_workers=1))
+    monkeypatch.setattr(downloader, "_timed_resolve", tracked_resolve)
+    # Losers hold the worker long enough for the winner to cancel what is still queued
+    fetched, _ = hedge({platform: (0.0 if platform == "apkmirror" else 0.3, True, True) for platform in PLATFORMS})
+
+    assert downloader.download_hedged("youtube", PLATFORMS, "cli", "patches") == (Path("apkmirror.apk"), "1.0")
+    time.sleep(0.5)
+    assert fetched == ["apkmirror"]
+    # apkpure may already have been picked up by the worker; the rest never run
+    assert started in (["apkmirror"], ["apkmirror", "apkpure"])
+
+def test_nothing_resolves(hedge):
+    hedge({platform: (0.0, False, True) for platform in PLATFORMS})
+    assert downloader.download_hedged("youtube", PLATFORMS, "cli", "patches") == (None, None)
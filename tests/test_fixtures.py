@@ -0,0 +1,86 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from curl_cffi.requests.exceptions import HTTPError
+
+from src import client
+from src.fixtures import FixtureMissing, FixtureResponse, HttpFixtures
+
+class PageHandler(BaseHTTPRequestHandler):
+    """Echoes the path and request body so fixtures can be told apart"""
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, body: bytes):
+        status = 404 if self.path == "/missing" else 200
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply(f"<html>{self.path}</html>".encode())
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self._reply(self.rfile.read(length))
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def http_client(hook):
+    http = client.HttpClient("chrome", connect_timeout=5, read_timeout=5, retries=0, backoff=0)
+    http.hooks.append(hook)
+    return http
+
+def test_record_then_replay_offline(server, tmp_path):
+    recording = http_client(HttpFixtures(tmp_path, "record"))
+    live = recording.get(f"{server.base}/apk/app")
+    recording.post(f"{server.base}/graphql", json={"query": "a"})
+    recording.post(f"{server.base}/graphql", json={"query": "b"})
+    recording.get(f"{server.base}/missing")
+    server.shutdown()
+
+    replaying = http_client(HttpFixtures(tmp_path, "replay"))
+    replayed = replaying.get(f"{server.base}/apk/app")
+    assert isinstance(replayed, FixtureResponse)
+    assert replayed.status_code == 200
+    assert replayed.text == live.text == "<html>/apk/app</html>"
+    assert replayed.headers["content-type"] == "text/html"
+
+    # Request bodies are part of the key
+    assert replaying.post(f"{server.base}/graphql", json={"query": "b"}).json() == {"query": "b"}
+    assert replaying.post(f"{server.base}/graphql", json={"query": "a"}).json() == {"query": "a"}
+
+    missing = replaying.get(f"{server.base}/missing")
+    assert not missing.ok
+    with pytest.raises(HTTPError):
+        missing.raise_for_status()
+
+def test_replay_without_fixture_raises(tmp_path):
+    replaying = http_client(HttpFixtures(tmp_path, "replay"))
+    with pytest.raises(FixtureMissing):
+        replaying.get("http://127.0.0.1:9/never-recorded")
+
+def test_streamed_downloads_are_not_recorded(server, tmp_path):
+    recording = http_client(HttpFixtures(tmp_path, "record"))
+    recording.get(f"{server.base}/app.apk", stream=True).close()
+    assert not any(tmp_path.iterdir())
+
+def test_fixture_response_iter_content():
+    response = FixtureResponse({"status": 200, "headers": {}, "url": "https://example.com"}, b"abcdefg")
+    assert list(response.iter_content(3)) == [b"abc", b"def", b"g"]
+
+def test_rejects_unknown_mode(tmp_path):
+    with pytest.raises(ValueError):
+        HttpFixtures(tmp_path, "refresh")
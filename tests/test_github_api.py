@@ -0,0 +1,99 @@
+import json
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from src import github_api
+
+PER_PAGE = 3
+
+def release(number: int, prerelease: bool = False) -> dict:
+    return {
+        "tag_name": f"v{number}.0.0" + ("-dev" if prerelease else ""),
+        "prerelease": prerelease,
+        "created_at": f"2025-01-{number:02d}T00:00:00Z",
+    }
+
+class ReleasesHandler(BaseHTTPRequestHandler):
+    """Paged /releases with ETags that answers If-None-Match with 304"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        page = int(parse_qs(parts.query).get("page", ["1"])[0])
+        body = json.dumps(server.releases[(page - 1) * PER_PAGE:page * PER_PAGE]).encode()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        server.requests.append(page)
+
+        if self.headers.get("If-None-Match") == etag:
+            server.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ReleasesHandler)
+    # Newest first, like the GitHub API: v12 down to v1, v9 and v4 are dev builds
+    httpd.releases = [release(number, number in (9, 4)) for number in range(12, 0, -1)]
+    httpd.requests = []
+    httpd.not_modified = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(github_api, "API_URL", f"http://127.0.0.1:{httpd.server_address[1]}")
+    monkeypatch.setattr(github_api, "RELEASES_PER_PAGE", PER_PAGE)
+    monkeypatch.setattr(github_api, "responses", github_api.ConditionalCache(tmp_path / "github"))
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def is_dev(release: dict) -> bool:
+    return release["prerelease"]
+
+def test_stops_paging_once_releases_are_older_than_the_match(server):
+    newest = github_api.find_newest_release("revanced", "revanced-patches", is_dev)
+    assert newest["tag_name"] == "v9.0.0-dev"
+    # v9 is on page 2, whose oldest release (v7) is older: page 3 onwards is never fetched
+    assert server.requests == [1, 2]
+
+def test_walks_every_page_without_a_match(server):
+    assert github_api.find_newest_release("revanced", "revanced-patches", lambda release: False) is None
+    assert server.requests == [1, 2, 3, 4, 5]
+
+def test_unchanged_pages_are_revalidated_with_etags(server, tmp_path):
+    github_api.find_newest_release("revanced", "revanced-patches", is_dev)
+    assert github_api.responses.fetched == 2
+
+    # Memoised for the rest of the process
+    github_api.find_newest_release("revanced", "revanced-patches", is_dev)
+    assert server.requests == [1, 2]
+
+    # A later run reuses the stored ETags and bodies
+    later = github_api.ConditionalCache(tmp_path / "github")
+    github_api.responses = later
+    assert github_api.find_newest_release("revanced", "revanced-patches", is_dev)["tag_name"] == "v9.0.0-dev"
+    assert server.not_modified == 2
+    assert (later.revalidated, later.fetched) == (2, 0)
+
+def test_changed_page_is_fetched_again(server, tmp_path):
+    github_api.find_newest_release("revanced", "revanced-patches", is_dev)
+    server.releases.insert(0, release(13, prerelease=True))
+
+    later = github_api.ConditionalCache(tmp_path / "github")
+    github_api.responses = later
+    assert github_api.find_newest_release("revanced", "revanced-patches", is_dev)["tag_name"] == "v13.0.0-dev"
+    assert (later.revalidated, later.fetched) == (0, 1)
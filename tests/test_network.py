@@ -0,0 +1,87 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src import client, throttle
+from src.network import NetworkRecorder
+from src.fixtures import FixtureResponse
+
+BODY_DELAY = 0.4
+
+class SlowBodyHandler(BaseHTTPRequestHandler):
+    """Sends headers and the first bytes at once, the rest of the body BODY_DELAY later"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "8")
+        self.send_header("CF-Cache-Status", "MISS")
+        self.end_headers()
+        self.wfile.write(b"abcd")
+        self.wfile.flush()
+        time.sleep(BODY_DELAY)
+        self.wfile.write(b"efgh")
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), SlowBodyHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/page"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def recorded_client(controller=None):
+    recorder = NetworkRecorder()
+    http = client.HttpClient("chrome", connect_timeout=5, read_timeout=5, retries=0, backoff=0, controller=controller)
+    http.hooks.append(recorder)
+    return http, recorder
+
+def test_ttfb_of_a_whole_response_excludes_the_body(server):
+    http, recorder = recorded_client()
+    assert http.get(server.url).content == b"abcdefgh"
+
+    record, = recorder.records
+    assert record["ttfb"] < BODY_DELAY / 2
+    assert record["total"] >= BODY_DELAY
+    assert (record["bytes"], record["cache"]) == (8, "miss")
+
+def test_streamed_body_is_timed_as_it_is_read(server):
+    http, recorder = recorded_client()
+    response = http.get(server.url, stream=True)
+    assert b"".join(response.iter_content()) == b"abcdefgh"
+    response.close()
+
+    record, = recorder.records
+    assert record["ttfb"] < BODY_DELAY / 2
+    assert record["total"] >= BODY_DELAY
+    assert record["bytes"] == 8
+
+def test_time_in_the_throttle_is_reported_as_queued(server):
+    controller = throttle.AimdController(initial=1, max_concurrency=1, max_interval=8)
+    host = f"127.0.0.1:{server.server_address[1]}"
+    controller._update(host, lambda state: state.update(next_start=time.time() + 0.3))
+    http, recorder = recorded_client(controller)
+    http.get(server.url)
+
+    record, = recorder.records
+    assert record["queued"] >= 0.25
+    assert record["ttfb"] < BODY_DELAY / 2
+    assert recorder.report()["queued_seconds"] == record["queued"]
+
+def test_replayed_response_has_no_ttfb():
+    recorder = NetworkRecorder()
+    response = FixtureResponse({"status": 200, "headers": {}, "url": "https://example.com"}, b"abc")
+    recorder.on_request("GET", "https://example.com", {})
+    recorder.on_response("GET", "https://example.com", {}, response)
+
+    record, = recorder.records
+    assert record["ttfb"] is None
+    assert record["cache"] == "fixture"
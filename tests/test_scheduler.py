@@ -0,0 +1,91 @@
+import os
+import subprocess
+
+import pytest
+
+from src import scheduler
+
+@pytest.fixture
+def memory(monkeypatch):
+    """MemAvailable and default heap the scheduler sees, in MiB"""
+    state = {"available": 10000, "heap": 2000}
+    monkeypatch.setattr(scheduler, "mem_available_mb", lambda: state["available"])
+    monkeypatch.setattr(scheduler, "default_heap_mb", lambda: state["heap"])
+    return state
+
+@pytest.fixture
+def jobs(tmp_path, memory):
+    return scheduler.JobScheduler(tmp_path / "jobs.json", memory_fraction=0.8, cores=3)
+
+def reservations(jobs):
+    return {
+        job_id: job["memory_mb"]
+        for process in jobs._load().values() for job_id, job in process["jobs"].items()
+    }
+
+def test_first_job_is_always_admitted(jobs):
+    assert jobs._try_admit("1", 50000) == 50000
+    assert reservations(jobs) == {"1": 50000}
+
+def test_admits_while_memory_fits(jobs):
+    assert jobs._try_admit("1", 3000) == 3000
+    assert jobs._try_admit("2", 3000) == 3000
+    # 8000 usable, 6000 reserved
+    assert jobs._try_admit("3", 3000) is None
+    assert jobs._try_admit("3", 3000, min_memory_mb=1500) == 2000
+
+    jobs._release("1")
+    assert reservations(jobs) == {"2": 3000, "3": 2000}
+
+def test_memory_running_jobs_already_use_is_not_counted_twice(jobs, memory):
+    assert jobs._try_admit("1", 4000) == 4000
+    # The first job has since taken 3000 MiB out of MemAvailable
+    memory["available"] = 7000
+    assert jobs._try_admit("2", 4000) == 4000
+
+def test_admits_no_more_jobs_than_cores(jobs):
+    for job_id in "123":
+        assert jobs._try_admit(job_id, 100) == 100
+    assert jobs._try_admit("4", 100, min_memory_mb=100) is None
+
+def test_prunes_reservations_of_dead_and_reused_pids(jobs):
+    finished = subprocess.Popen(["true"])
+    finished.wait()
+    scheduler.utils.save_json(jobs.state_path, {
+        str(finished.pid): {"started": None, "jobs": {"1": {"memory_mb": 8000, "available_mb": 10000}}},
+        # Our own pid, but started at another time: a previous owner of the pid
+        str(os.getpid()): {"started": -1, "jobs": {"2": {"memory_mb": 8000, "available_mb": 10000}}},
+    })
+
+    assert jobs._load() == {}
+    assert jobs._try_admit("3", 7000) == 7000
+
+def test_run_keeps_default_heap_when_it_fits(jobs, monkeypatch):
+    commands = []
+    monkeypatch.setattr(scheduler.utils, "run_process", lambda command, **kwargs: commands.append(command))
+
+    jobs.run(["java", "-jar", "cli.jar"])
+
+    assert commands == [["java", "-jar", "cli.jar"]]
+    assert reservations(jobs) == {}
+
+def test_run_caps_heap_next_to_running_jobs(jobs, monkeypatch, tmp_path):
+    commands = []
+    monkeypatch.setattr(scheduler.utils, "run_process", lambda command, **kwargs: commands.append(command))
+    apk = tmp_path / "app.apk"
+    apk.write_bytes(b"\0" * 1024)
+    # 8000 usable, 2000 left for a JVM whose default heap needs 2600 with overhead
+    assert jobs._try_admit("other", 6000) == 6000
+
+    jobs.run(["java", "-jar", "cli.jar"], input_apk=apk)
+
+    assert commands == [["java", f"-Xmx{int(2000 / scheduler.JVM_OVERHEAD)}m", "-jar", "cli.jar"]]
+    assert reservations(jobs) == {"other": 6000}
+
+def test_heap_for_scales_with_apk_size(tmp_path):
+    apk = tmp_path / "app.apk"
+    assert scheduler.heap_for(apk) == scheduler.MIN_HEAP_MB
+
+    with open(apk, "wb") as apk_file:
+        apk_file.truncate(200 * 1048576)
+    assert scheduler.heap_for(apk) == int(512 + 200 * scheduler.HEAP_PER_APK_MB)
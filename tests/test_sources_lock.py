@@ -0,0 +1,81 @@
+import json
+import logging
+from pathlib import Path
+
+import pytest
+
+from src import sources_lock
+
+FIXTURE = Path(__file__).parent / "fixtures" / "graphql_releases.json"
+REPOS = [
+    ("revanced", "revanced-cli", "latest"),
+    ("MorpheApp", "morphe-patches", "dev"),
+    ("gone", "missing", "latest"),
+]
+
+class FakeResponse:
+    def __init__(self, payload: dict):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+class FakeSession:
+    def __init__(self, *payloads):
+        self.payloads = list(payloads)
+        self.queries = []
+
+    def post(self, url, json=None, headers=None):
+        self.queries.append(json["query"])
+        return FakeResponse(self.payloads.pop(0))
+
+@pytest.fixture
+def graphql(monkeypatch):
+    def install(*payloads):
+        fake = FakeSession(*payloads)
+        monkeypatch.setattr(sources_lock, "session", fake)
+        monkeypatch.setattr(sources_lock, "github_token", "token")
+        return fake
+    return install
+
+def test_batch_returns_releases_with_assets(graphql, caplog):
+    fake = graphql(json.loads(FIXTURE.read_text()))
+    with caplog.at_level(logging.WARNING):
+        resolved = sources_lock._resolve_graphql_batch(REPOS)
+
+    cli = resolved["revanced/revanced-cli@latest"]
+    assert cli["tag_name"] == "v5.0.0"
+    assert cli["assets"][0]["id"] == 301234567
+    assert cli["assets"][0]["digest"].startswith("sha256:")
+    assert cli["assets"][0]["browser_download_url"].endswith("revanced-cli-5.0.0-all.jar")
+
+    # "dev" picks the newest dev release out of the window
+    assert resolved["MorpheApp/morphe-patches@dev"]["tag_name"] == "v3.1.0-dev.2"
+    assert resolved["MorpheApp/morphe-patches@dev"]["assets"][0]["name"] == "patches-3.1.0-dev.2.mpp"
+
+    assert "gone/missing@latest" not in resolved
+    assert "Could not resolve to a Repository" in caplog.text
+    assert "databaseId" in fake.queries[0]
+
+def test_unknown_asset_field_retries_with_basic_fields(graphql, monkeypatch):
+    rejected = {"errors": [{
+        "message": "Field 'digest' doesn't exist on type 'ReleaseAsset'",
+        "extensions": {"code": "undefinedField", "typeName": "ReleaseAsset", "fieldName": "digest"}
+    }]}
+    basic = json.loads(FIXTURE.read_text())
+    for node in [basic["data"]["r0"]["latestRelease"], *basic["data"]["r1"]["releases"]["nodes"]]:
+        for asset in node["releaseAssets"]["nodes"]:
+            asset["id"] = f"RA_{asset.pop('databaseId')}"
+            asset.pop("digest")
+    fake = graphql(rejected, basic)
+    monkeypatch.setattr(sources_lock.utils, "detect_github_release", lambda *repo: None)
+
+    resolved = sources_lock.resolve_releases(REPOS)
+
+    assert len(fake.queries) == 2
+    assert "digest" not in fake.queries[1]
+    assert resolved["revanced/revanced-cli@latest"]["assets"][0]["id"] == "RA_301234567"
+    assert resolved["revanced/revanced-cli@latest"]["assets"][0]["digest"] is None
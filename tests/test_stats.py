@@ -0,0 +1,55 @@
+import pytest
+
+from src import stats
+
+PLATFORMS = ["apkmirror", "apkpure", "uptodown", "aptoide"]
+
+@pytest.fixture
+def mirrors(tmp_path):
+    return stats.MirrorStats(tmp_path / "mirror-stats.json", exploration=0)
+
+def test_ewma_starts_at_first_sample_then_smooths():
+    assert stats._ewma(None, 10.0) == 10.0
+    assert stats._ewma(10.0, 20.0) == pytest.approx(13.0)
+
+    average = None
+    for _ in range(50):
+        average = stats._ewma(average, 4.0)
+    assert average == pytest.approx(4.0)
+
+def test_records_are_persisted(mirrors):
+    mirrors.record_resolution("youtube", "apkpure", True, 2.0)
+    mirrors.record_resolution("youtube", "apkpure", False, 4.0)
+    mirrors.record_download("youtube", "apkpure", 10_000_000, 2.0)
+
+    entry = mirrors.store.read()["youtube"]["apkpure"]
+    assert entry == {"attempts": 2, "successes": 1, "latency": pytest.approx(2.6), "throughput": 5_000_000}
+
+def test_order_without_history_keeps_configuration(mirrors):
+    assert mirrors.order("youtube", PLATFORMS) == PLATFORMS
+
+def test_order_prefers_reliable_then_fast_platforms(mirrors):
+    for _ in range(3):
+        mirrors.record_resolution("youtube", "apkmirror", False, 1.0)
+        mirrors.record_resolution("youtube", "uptodown", True, 5.0)
+        mirrors.record_resolution("youtube", "aptoide", True, 1.0)
+
+    # Unknown platforms (apkpure) sit between proven and failing ones
+    assert mirrors.order("youtube", PLATFORMS) == ["aptoide", "uptodown", "apkpure", "apkmirror"]
+    assert mirrors.order("music", PLATFORMS) == PLATFORMS
+
+def test_order_breaks_ties_by_throughput(mirrors):
+    for platform in ("apkmirror", "apkpure", "uptodown"):
+        mirrors.record_resolution("youtube", platform, True, 1.0)
+    mirrors.record_download("youtube", "apkpure", 50_000_000, 10.0)
+    mirrors.record_download("youtube", "uptodown", 50_000_000, 5.0)
+
+    # Never downloaded from apkmirror; aptoide has no history at all
+    assert mirrors.order("youtube", PLATFORMS) == ["uptodown", "apkpure", "apkmirror", "aptoide"]
+
+def test_exploration_promotes_a_non_leading_platform(tmp_path, monkeypatch):
+    mirrors = stats.MirrorStats(tmp_path / "mirror-stats.json", exploration=1)
+    mirrors.record_resolution("youtube", "apkmirror", True, 1.0)
+    monkeypatch.setattr(stats.random, "randrange", lambda start, stop: stop - 1)
+
+    assert mirrors.order("youtube", PLATFORMS) == ["aptoide", "apkmirror", "apkpure", "uptodown"]
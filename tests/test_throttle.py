@@ -0,0 +1,103 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from src import throttle
+
+HOST = "www.apkmirror.com"
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen time.time(); time.sleep() advances it instead of blocking"""
+    now = [1000.0]
+    monkeypatch.setattr(throttle.time, "time", lambda: now[0])
+    monkeypatch.setattr(throttle.time, "sleep", lambda seconds: now.__setitem__(0, now[0] + seconds))
+    return now
+
+@pytest.fixture(params=["memory", "shared"])
+def controller(request, tmp_path):
+    state_dir = tmp_path / "throttle" if request.param == "shared" else None
+    if state_dir:
+        state_dir.mkdir()
+    return throttle.AimdController(initial=4, max_concurrency=6, max_interval=8, state_dir=state_dir)
+
+def state(controller):
+    return controller._update(HOST, lambda state: None)
+
+def test_healthy_responses_grow_limit_additively(controller, clock):
+    for _ in range(4):
+        controller.acquire(HOST)
+        controller.release(HOST, throttled=False)
+    # Roughly one slot per window of `limit` responses
+    assert 4.9 < state(controller)["limit"] < 5.0
+
+    for _ in range(100):
+        controller.acquire(HOST)
+        controller.release(HOST, throttled=False)
+    assert state(controller)["limit"] == 6
+    assert state(controller)["interval"] == 0.0
+
+def test_throttled_response_halves_limit_and_backs_off(controller, clock):
+    controller.acquire(HOST)
+    controller.release(HOST, throttled=True)
+    assert state(controller) == {"limit": 2.0, "interval": 0.5, "next_start": 1000.5}
+
+    controller.acquire(HOST)
+    controller.release(HOST, throttled=True, retry_after=30)
+    current = state(controller)
+    assert current["limit"] == 1.0
+    assert current["interval"] == 1.0
+    assert current["next_start"] == clock[0] + 30
+
+    # Never below one slot, never beyond max_interval
+    for _ in range(10):
+        controller.acquire(HOST)
+        controller.release(HOST, throttled=True)
+    assert state(controller)["limit"] == 1.0
+    assert state(controller)["interval"] == 8
+
+def test_acquire_paces_requests_by_interval(controller, clock):
+    controller.acquire(HOST)
+    controller.release(HOST, throttled=True)
+    start = clock[0]
+
+    controller.acquire(HOST)
+    controller.release(HOST, throttled=False, failed=True)
+    controller.acquire(HOST)
+
+    # Both waited for their reserved slot half a second apart
+    assert clock[0] == start + 1.0
+    assert state(controller)["next_start"] == start + 1.5
+
+def test_failed_requests_leave_limits_alone(controller, clock):
+    controller.acquire(HOST)
+    controller.release(HOST, throttled=False, failed=True)
+    assert state(controller)["limit"] == 4
+
+def test_acquire_blocks_at_the_concurrency_limit(clock):
+    controller = throttle.AimdController(initial=1, max_concurrency=1, max_interval=8)
+    controller.acquire(HOST)
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (controller.acquire(HOST), acquired.set()))
+    waiter.start()
+
+    assert not acquired.wait(0.2)
+    controller.release(HOST, throttled=False)
+    assert acquired.wait(5)
+    waiter.join()
+
+def response(status_code=200, headers=None, content=b""):
+    return SimpleNamespace(status_code=status_code, headers=headers or {}, content=content)
+
+@pytest.mark.parametrize("resp, streamed, expected", [
+    (response(429), True, True),
+    (response(403), False, True),
+    (response(200, {"cf-mitigated": "challenge"}), True, True),
+    (response(503, content=b"<html>Just a moment...</html>"), False, True),
+    (response(503, content=b"<html>Just a moment...</html>"), True, False),
+    (response(503, content=b"maintenance"), False, False),
+    (response(200), False, False),
+])
+def test_is_throttled(resp, streamed, expected):
+    assert throttle.is_throttled(resp, streamed) is expected
@@ -0,0 +1,103 @@
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src import transfer, downloader
+
+SIZE = 256 * 1024
+DATA = os.urandom(SIZE)
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves DATA with Range support the server can switch off or cut short"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match and server.honor_ranges:
+            start = int(match.group(1))
+            end = int(match.group(2) or SIZE - 1)
+            server.ranges.append((start, end))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{SIZE}")
+        else:
+            start, end = 0, SIZE - 1
+            self.send_response(200)
+        body = DATA[start:end + 1]
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+        if match and server.truncate_once and start == server.truncate_once:
+            server.truncate_once = None
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    httpd.honor_ranges = True
+    httpd.truncate_once = None
+    httpd.ranges = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/app.apk"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture(autouse=True)
+def small_transfers(monkeypatch, tmp_path):
+    monkeypatch.setattr(transfer, "partial_dir", tmp_path / "partial")
+    monkeypatch.setattr(transfer, "chunk_size", 8 * 1024)
+    monkeypatch.setattr(transfer, "journal_interval", 16 * 1024)
+    monkeypatch.setattr(transfer, "segmented_min_size", 1)
+
+def test_segmented_download(server, tmp_path):
+    dest = tmp_path / "app.apk"
+    transfer.download_segmented(server.url, dest, SIZE, "v1", segments=4)
+
+    assert dest.read_bytes() == DATA
+    assert sorted(start for start, _ in server.ranges) == [0, SIZE // 4, SIZE // 2, 3 * SIZE // 4]
+    assert not any(transfer.partial_dir.iterdir())
+
+def test_server_ignoring_ranges_falls_back_to_one_stream(server, tmp_path, monkeypatch):
+    server.honor_ranges = False
+    dest = tmp_path / "app.apk"
+    with pytest.raises(transfer.RangeNotSupported):
+        transfer.download_segmented(server.url, dest, SIZE, "v1", segments=4)
+    assert not any(transfer.partial_dir.iterdir())
+
+    monkeypatch.chdir(tmp_path)
+    filepath = downloader.download_resource(server.url, name="fallback.apk")
+    assert filepath.read_bytes() == DATA
+    assert downloader.is_verified(filepath)
+
+def test_resume_after_truncated_segment(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "segment_retries", 0)
+    dest = tmp_path / "app.apk"
+    server.truncate_once = SIZE // 2
+
+    with pytest.raises(Exception):
+        transfer.download_segmented(server.url, dest, SIZE, "v1", segments=4)
+    assert not dest.exists()
+    partial, journal = transfer.partial_paths(dest, "v1")
+    assert journal.exists()
+
+    # A later run picks up where the journal left off instead of starting over
+    server.ranges.clear()
+    transfer.download_segmented(server.url, dest, SIZE, "v1", segments=4)
+
+    assert dest.read_bytes() == DATA
+    assert len(server.ranges) == 1
+    start, end = server.ranges[0]
+    assert SIZE // 2 < start < 3 * SIZE // 4 and end == 3 * SIZE // 4 - 1
+    assert not partial.exists() and not journal.exists()
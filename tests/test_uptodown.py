@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from src import uptodown
+from src.cache import JsonStore
+
+BASE_URL = "https://youtube.en.uptodown.com/android"
+DATA_CODE = "4711"
+PAGE_SIZE = 10
+
+def listing(version: str, version_id: str = None) -> dict:
+    """versionURL parts of one listing of version"""
+    return {"url": f"{BASE_URL}/download", "extraURL": version, "versionID": version_id or version.replace(".", "")}
+
+def entry(version: str, version_id: str = None) -> dict:
+    return {"version": version, "versionURL": listing(version, version_id)}
+
+class VersionsApi:
+    """Newest-first listings served PAGE_SIZE per page, counting requests"""
+
+    def __init__(self, versions: list[str]):
+        self.listings = [entry(version) for version in versions]
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def __call__(self, base_url: str, data_code: str, page: int) -> list[dict]:
+        assert (base_url, data_code) == (BASE_URL, DATA_CODE)
+        with self._lock:
+            self.requests.append(page)
+        start = (page - 1) * PAGE_SIZE
+        return self.listings[start:start + PAGE_SIZE]
+
+    def take_requests(self) -> list[int]:
+        requests, self.requests = sorted(self.requests), []
+        return requests
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    monkeypatch.setattr(uptodown, "version_indexes", JsonStore(tmp_path / "uptodown-versions.json"))
+    monkeypatch.setattr(uptodown, "readahead", 4)
+    # 3.34.0 down to 3.0.0: pages 1-3 are full, page 4 holds five, page 5 is empty
+    api = VersionsApi([f"3.{minor}.0" for minor in range(34, -1, -1)])
+    monkeypatch.setattr(uptodown, "_fetch_versions_page", api)
+    return api
+
+def find(version: str) -> list[dict]:
+    return uptodown.find_version(BASE_URL, DATA_CODE, version)
+
+def test_walk_pages_widens_readahead_window(api):
+    walked = []
+    for page, entries in uptodown._walk_pages(BASE_URL, DATA_CODE, 1):
+        walked.append((page, len(entries)))
+    assert walked == [(1, 10), (2, 10), (3, 10), (4, 5), (5, 0)]
+    # Windows of 1, 2 and 4 pages: 6 and 7 may be read ahead past the end before being cancelled
+    assert api.take_requests() in ([1, 2, 3, 4, 5], [1, 2, 3, 4, 5, 6], [1, 2, 3, 4, 5, 6, 7])
+
+def test_known_version_costs_one_request(api):
+    assert find("3.14.0") == [listing("3.14.0")]
+    assert api.take_requests() == [1, 2, 3]
+
+    assert find("3.14.0") == [listing("3.14.0")]
+    assert find("3.20.0") == [listing("3.20.0")]
+    assert api.take_requests() == [1, 1]
+
+def test_older_version_resumes_where_the_index_stopped(api):
+    find("3.14.0")
+    api.take_requests()
+
+    assert find("3.2.0") == [listing("3.2.0")]
+    # Page 1 to catch up on new releases, then straight to page 4
+    assert api.take_requests() == [1, 4]
+
+def test_new_release_is_merged_from_page_one(api):
+    find("3.30.0")
+    api.take_requests()
+    api.listings.insert(0, entry("3.35.0"))
+
+    assert find("3.35.0") == [listing("3.35.0")]
+    assert api.take_requests() == [1]
+
+def test_missing_version_stops_at_older_listings(api):
+    assert find("3.14.5") == []
+    assert api.take_requests() == [1, 2, 3]
+    assert uptodown.version_indexes.read()[DATA_CODE]["next_page"] == 4
+
+def test_exhausted_list_is_not_walked_again(api):
+    assert find("2.0.0") == []
+    assert api.take_requests()[:5] == [1, 2, 3, 4, 5]
+    assert uptodown.version_indexes.read()[DATA_CODE]["next_page"] is None
+
+    assert find("2.0.0") == []
+    assert api.take_requests() == [1]
+
+def test_every_listing_of_a_version_is_kept(api):
+    # Uptodown lists some versions twice (e.g. a re-upload); only one may have a download button
+    api.listings.insert(21, entry("3.14.0", "reupload"))
+
+    assert find("3.14.0") == [listing("3.14.0"), listing("3.14.0", "reupload")]
+    assert find("3.14.0") == [listing("3.14.0"), listing("3.14.0", "reupload")]
+
+def test_legacy_single_url_index_is_upgraded(api):
+    uptodown.version_indexes.update(lambda data: data.update({
+        DATA_CODE: {"versions": {"3.34.0": listing("3.34.0")}, "next_page": 2}
+    }))
+
+    assert find("3.34.0") == [listing("3.34.0")]
+    assert api.take_requests() == [1]
+    assert uptodown.version_indexes.read()[DATA_CODE]["versions"]["3.33.0"] == [listing("3.33.0")]